@@ -4,10 +4,20 @@ import os
 import pandas as pd
 import re
 from datetime import datetime
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QPushButton, 
-                             QTextEdit, QFileDialog, QLabel, QProgressBar, QMessageBox,QApplication)
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+                             QTextEdit, QFileDialog, QLabel, QProgressBar, QMessageBox,QApplication, QComboBox, QCheckBox)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import Qt, pyqtSignal
+from instrumentation import StageProfiler, ProfilingControls, profiled_stage
+from order_pipeline import (ABNORMAL_ORDER_COLUMNS, missing_columns, combine_orders, add_province, add_month,
+                            filter_warehouses, out_of_region_mask, pivot_inventory, merge_inventory, missing_inventory,
+                            exclude_merchant_codes, available_backends, run_job)
+from prefetch import ExcelPrefetcher
+from rule_export import EXPORT_FORMATS, write_table
+from summary_cube import update_cube
+
+# 处理步骤（方法名），用于性能记录和单步骤剖析
+PIPELINE_STAGES = ['data_clean_1', 'data_clean_2', 'abnormal_process', 'filter_merchant_codes']
 
 class OrderDataProcessor(QMainWindow):
 
@@ -18,6 +28,9 @@ class OrderDataProcessor(QMainWindow):
         self.order_files = []
         self.inventory_file = None
         self.output_dir = ""
+        self.profiler = StageProfiler()
+        # 选择文件后即在后台读取，运行处理时直接使用
+        self.prefetcher = ExcelPrefetcher()
         self.initUI()
 
     def initUI(self):
@@ -53,6 +66,27 @@ class OrderDataProcessor(QMainWindow):
         self.run_button.setEnabled(False)
         layout.addWidget(self.run_button)
 
+        # 执行方式：逐步处理（保存中间文件）或由 order_pipeline 的执行后端一次处理
+        backend_layout = QHBoxLayout()
+        backend_layout.addWidget(QLabel("执行方式：", self))
+        self.backend_combo = QComboBox(self)
+        self.backend_combo.addItem("逐步处理（保存中间文件）", None)
+        for backend in available_backends():
+            self.backend_combo.addItem(backend, backend)
+        backend_layout.addWidget(self.backend_combo)
+        self.validate_checkbox = QCheckBox("与 pandas 结果核对", self)
+        backend_layout.addWidget(self.validate_checkbox)
+        backend_layout.addWidget(QLabel("结果格式：", self))
+        self.format_combo = QComboBox(self)
+        for label, extension in EXPORT_FORMATS.items():
+            self.format_combo.addItem(label, extension.lstrip('.'))
+        backend_layout.addWidget(self.format_combo)
+        layout.addLayout(backend_layout)
+
+        # 性能记录
+        self.profiling_controls = ProfilingControls(self.profiler, PIPELINE_STAGES, self)
+        layout.addWidget(self.profiling_controls)
+
         # 返回按钮
         self.back_button = QPushButton("返回主菜单", self)
         self.back_button.clicked.connect(self.close)
@@ -75,6 +109,7 @@ class OrderDataProcessor(QMainWindow):
         layout.addWidget(self.output_text)
 
     def closeEvent(self, event):
+        self.prefetcher.shutdown(wait=False, cancel_futures=True)  # 取消尚未完成的预读取
         self.closed.emit()  # 发出关闭信号
         event.accept()
         
@@ -86,6 +121,7 @@ class OrderDataProcessor(QMainWindow):
         )
         if files:
             self.order_files = files
+            self.prefetcher.prefetch('orders', files)
             self.output_dir = os.path.dirname(files[0])
             self.output_text.append(f"已选择 {len(files)} 个订单文件：\n{chr(10).join([os.path.basename(f) for f in files])}")
             self.check_files_selected()
@@ -99,6 +135,7 @@ class OrderDataProcessor(QMainWindow):
         )
         if file:
             self.inventory_file = file
+            self.prefetcher.prefetch('inventory', file)
             if not self.output_dir:
                 self.output_dir = os.path.dirname(file)
             self.output_text.append(f"已选择库存文件：{os.path.basename(file)}")
@@ -122,7 +159,38 @@ class OrderDataProcessor(QMainWindow):
         self.status_label.setText("状态：正在处理...")
         self.progress_bar.setValue(0)
         self.output_text.append(f"\n=== 开始处理 ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
+        self.profiling_controls.start(self.output_dir)
+
+        backend = self.backend_combo.currentData()
+        if backend:
+            self.run_pipeline(backend)
+        else:
+            self.run_steps()
 
+        self.profiling_controls.finish(self.output_text.append)
+        self.output_text.append(f"\n=== 处理完成 ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
+        self.status_label.setText("状态：处理完成")
+        self.run_button.setEnabled(True)
+        QMessageBox.information(self, "完成", "数据处理已完成，请检查输出目录！")
+
+    def run_pipeline(self, backend):
+        """使用指定的执行后端一次完成全部步骤，只输出最终结果"""
+        self.output_text.append(f"\n=== 执行后端：{backend} ===")
+        inputs = {'orders': self.order_files, 'inventory': self.inventory_file, 'reader': self.prefetcher.read}
+        try:
+            outputs = run_job('abnormal', inputs, self.output_dir, log=self.output_text.append, profiler=self.profiler,
+                              backend=backend, validate=self.validate_checkbox.isChecked(),
+                              output_format=self.format_combo.currentData())
+        except Exception as e:
+            self.output_text.append(f"\n处理失败: {e}")
+            QMessageBox.critical(self, "错误", f"处理失败: {e}")
+            self.progress_bar.setValue(0)
+            return None
+        self.progress_bar.setValue(100)
+        return outputs
+
+    def run_steps(self):
+        """逐步处理，每一步的结果保存为中间文件"""
         # 总步骤数（数据清洗、省份提取、异常检测及库存合并、商家编码筛选）
         total_steps = 4
         step_value = 100 // total_steps
@@ -150,8 +218,10 @@ class OrderDataProcessor(QMainWindow):
                 if abnormal_file:
                     # 步骤 4：筛选商家编码
                     self.output_text.append("\n=== 步骤 4：筛选商家编码 ===")
-                    self.filter_merchant_codes(abnormal_file)
+                    result_df = self.filter_merchant_codes(abnormal_file)
                     self.progress_bar.setValue(100)
+                    if result_df is not None:
+                        self.update_summary_cube(result_df)
                     # QApplication.processEvents()
                 else:
                     self.output_text.append("\n异常数据处理失败，终止流程！")
@@ -166,14 +236,10 @@ class OrderDataProcessor(QMainWindow):
             QMessageBox.critical(self, "错误", "数据清洗失败，请检查输入文件！")
             self.progress_bar.setValue(0)
 
-        self.output_text.append(f"\n=== 处理完成 ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
-        self.status_label.setText("状态：处理完成")
-        self.run_button.setEnabled(True)
-        QMessageBox.information(self, "完成", "数据处理已完成，请检查输出目录！")
-
+    @profiled_stage()
     def data_clean_1(self):
         """数据清洗：合并多个订单 Excel 文件，保留指定字段"""
-        columns_to_keep = ["订单编号", "店铺", "仓库", "子单原始单号", "付款时间", "收货地区", "商家编码", "货品名称", "下单数量"]
+        columns_to_keep = ABNORMAL_ORDER_COLUMNS
         all_data = []
         total_records = 0
 
@@ -182,13 +248,14 @@ class OrderDataProcessor(QMainWindow):
                 self.output_text.append(f"\n正在读取订单文件: {os.path.basename(file)}")
                 # QApplication.processEvents()
                 try:
-                    df = pd.read_excel(file)
+                    with self.profiler.span('read_excel'):
+                        df = self.prefetcher.read(file)
                     total_records += len(df)
                     self.output_text.append(f"文件包含 {len(df)} 条记录")
                     self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
-                    missing_columns = [col for col in columns_to_keep if col not in df.columns]
-                    if missing_columns:
-                        self.output_text.append(f"警告: 缺少字段 {missing_columns}")
+                    missing = missing_columns(df, columns_to_keep)
+                    if missing:
+                        self.output_text.append(f"警告: 缺少字段 {missing}")
                     else:
                         df_cleaned = df[columns_to_keep].copy()
                         all_data.append(df_cleaned)
@@ -200,13 +267,16 @@ class OrderDataProcessor(QMainWindow):
                 QMessageBox.warning(self, "警告", f"文件 {os.path.basename(file)} 不存在！")
             # QApplication.processEvents()
 
+        self.profiler.rows(rows_in=total_records)
         if all_data:
-            combined_data = pd.concat(all_data, ignore_index=True)
+            combined_data = combine_orders(all_data)
             self.output_text.append(f"\n合并完成，共 {len(combined_data)} 条记录")
             self.output_text.append(f"合并后的数据前 5 行：\n{combined_data.head().to_string()}")
+            self.profiler.rows(rows_out=len(combined_data))
             output_file = os.path.join(self.output_dir, "中间处理过程_cleaned_order_data.xlsx")
             try:
-                combined_data.to_excel(output_file, index=False)
+                with self.profiler.span('to_excel'):
+                    combined_data.to_excel(output_file, index=False)
                 self.output_text.append(f"\n清洗后的数据已保存到: {os.path.basename(output_file)}")
                 return output_file
             except Exception as e:
@@ -217,31 +287,28 @@ class OrderDataProcessor(QMainWindow):
             self.output_text.append("\n没有成功读取任何订单数据！")
             return None
 
+    @profiled_stage()
     def data_clean_2(self, input_file):
         """提取省份信息"""
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
             # QApplication.processEvents()
             try:
-                df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    df = pd.read_excel(input_file)
+                self.profiler.rows(rows_in=len(df))
                 self.output_text.append(f"文件包含 {len(df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
 
-                def extract_province(address):
-                    if pd.isna(address):
-                        return None
-                    try:
-                        return str(address).split()[0]
-                    except IndexError:
-                        return None
-
-                df['省份'] = df['收货地区'].apply(extract_province)
+                df = add_province(df)
                 self.output_text.append(f"\n提取省份后的前 5 行数据：\n{df.head().to_string()}")
                 self.output_text.append(f"省份字段缺失值统计：{df['省份'].isna().sum()} 条记录未提取到省份")
 
+                self.profiler.rows(rows_out=len(df))
                 output_file = os.path.join(self.output_dir, "中间处理过程_processed_order_data.xlsx")
                 try:
-                    df.to_excel(output_file, index=False)
+                    with self.profiler.span('to_excel'):
+                        df.to_excel(output_file, index=False)
                     self.output_text.append(f"\n处理后的数据已保存到: {os.path.basename(output_file)}")
                     return output_file
                 except Exception as e:
@@ -257,50 +324,37 @@ class OrderDataProcessor(QMainWindow):
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    @profiled_stage()
     def abnormal_process(self, input_file):
         """检测异常数据，添加月份，合并库存数据"""
-        jinan_coverage = [
-            '北京', '天津', '河北省', '山西省', '内蒙古自治区', '辽宁省', '吉林省', '黑龙江省',
-            '上海', '江苏省', '浙江省', '安徽省', '山东省', '河南省', '湖北省', '北京市', '上海市', '天津市'
-        ]
-
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
             # QApplication.processEvents()
             try:
-                df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    df = pd.read_excel(input_file)
+                self.profiler.rows(rows_in=len(df))
                 self.output_text.append(f"文件包含 {len(df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
 
                 # 添加月份字段
-                df['付款时间'] = pd.to_datetime(df['付款时间'], errors='coerce')
-                df['月份'] = df['付款时间'].dt.strftime('%Y-%m')
+                with self.profiler.span('to_datetime'):
+                    df = add_month(df)
                 self.output_text.append(f"\n添加月份字段后的前 5 行数据：\n{df.head().to_string()}")
 
                 # 筛选指定仓库
-                df = df[df['仓库'].isin(['佛山-优赛-三水仓', '济南-优赛-市中'])]
+                df = filter_warehouses(df)
                 self.output_text.append(f"\n筛选后（仅包含指定仓库）的记录数: {len(df)}")
 
-                # 检测异常数据
-                abnormal_data = []
-                for index, row in df.iterrows():
-                    province = row['省份']
-                    warehouse = row['仓库']
-                    if pd.isna(province):
-                        abnormal_data.append(row)
-                    elif warehouse == '佛山-优赛-三水仓' and province in jinan_coverage:
-                        abnormal_data.append(row)
-                    elif warehouse == '济南-优赛-市中' and province not in jinan_coverage:
-                        abnormal_data.append(row)
-                    # QApplication.processEvents()
-
-                abnormal_df = pd.DataFrame(abnormal_data)
+                # 检测异常数据（省份缺失，或发货仓库与收货省份不对应）
+                abnormal_df = df[out_of_region_mask(df)]
                 if not abnormal_df.empty:
                     self.output_text.append(f"\n发现异常数据：\n{abnormal_df.head().to_string()}")
                     self.output_text.append(f"\n异常数据记录数: {len(abnormal_df)}")
                     output_file = os.path.join(self.output_dir, "中间处理过程_超区发货数据(不区分超区发货原因).xlsx")
                     try:
-                        abnormal_df.to_excel(output_file, index=False)
+                        with self.profiler.span('to_excel'):
+                            abnormal_df.to_excel(output_file, index=False)
                         self.output_text.append(f"\n异常数据已保存到: {os.path.basename(output_file)}")
                     except Exception as e:
                         self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
@@ -309,14 +363,16 @@ class OrderDataProcessor(QMainWindow):
                 else:
                     self.output_text.append("\n未发现异常数据！")
                     output_file = os.path.join(self.output_dir, "中间处理过程_超区发货数据(不区分超区发货原因).xlsx")
-                    abnormal_df.to_excel(output_file, index=False)  # 保存空文件以便后续处理
+                    with self.profiler.span('to_excel'):
+                        abnormal_df.to_excel(output_file, index=False)  # 保存空文件以便后续处理
                     self.output_text.append(f"\n无异常数据，保存空文件到: {os.path.basename(output_file)}")
 
                 # 合并库存数据
                 if os.path.exists(self.inventory_file):
                     self.output_text.append(f"\n正在读取库存数据: {os.path.basename(self.inventory_file)}")
                     try:
-                        inventory_df = pd.read_excel(self.inventory_file)
+                        with self.profiler.span('read_excel'):
+                            inventory_df = self.prefetcher.read(self.inventory_file)
                         self.output_text.append(f"库存数据前 5 行：\n{inventory_df.head().to_string()}")
                     except Exception as e:
                         self.output_text.append(f"读取库存数据错误: {e}")
@@ -327,63 +383,26 @@ class OrderDataProcessor(QMainWindow):
                     QMessageBox.critical(self, "错误", f"库存文件 {os.path.basename(self.inventory_file)} 不存在！")
                     return None
 
-                # 确保商家编码列为字符串类型
-                inventory_df['货品编号'] = inventory_df['货品编号'].astype(str)
-                abnormal_df['商家编码'] = abnormal_df['商家编码'].astype(str)
-
                 # 按仓库名称和货品编号透视库存数据
-                pivot_inventory = inventory_df.pivot_table(
-                    values=['期初库存', '期末库存'],
-                    index='货品编号',
-                    columns='仓库名称',
-                    aggfunc='sum',
-                    fill_value=0
-                )
-
-                # 重命名列名
-                pivot_inventory.columns = [
-                    '佛山仓期初库存' if '佛山-优赛-三水仓' in col and '期初库存' in col else
-                    '佛山仓期末库存' if '佛山-优赛-三水仓' in col and '期末库存' in col else
-                    '济南仓期初库存' if '济南-优赛-市中' in col and '期初库存' in col else
-                    '济南仓期末库存' if '济南-优赛-市中' in col and '期末库存' in col else col
-                    for col in pivot_inventory.columns
-                ]
-                pivot_inventory = pivot_inventory.reset_index()
+                with self.profiler.span('pivot_table'):
+                    pivot = pivot_inventory(inventory_df)
 
-                # 合并库存数据
-                merged_df = abnormal_df.merge(
-                    pivot_inventory,
-                    left_on='商家编码',
-                    right_on='货品编号',
-                    how='left'
-                )
-                merged_df = merged_df.drop(columns=['货品编号'], errors='ignore')
-
-                # 确保库存列存在并将NaN替换为0
-                expected_columns = [
-                    '佛山仓期初库存', '济南仓期初库存', '佛山仓期末库存', '济南仓期末库存'
-                ]
-                for col in expected_columns:
-                    if col not in merged_df.columns:
-                        merged_df[col] = 0
-                    else:
-                        merged_df[col] = merged_df[col].fillna(0)
+                # 合并库存数据（未匹配的库存记为 0）
+                with self.profiler.span('merge'):
+                    merged_df = merge_inventory(abnormal_df, pivot)
 
                 # 检查未匹配的商家编码
-                missing_inventory = merged_df[
-                    (merged_df['佛山仓期初库存'] == 0) &
-                    (merged_df['济南仓期初库存'] == 0) &
-                    (merged_df['佛山仓期末库存'] == 0) &
-                    (merged_df['济南仓期末库存'] == 0)
-                ]
-                if not missing_inventory.empty:
+                missing = missing_inventory(merged_df)
+                if not missing.empty:
                     self.output_text.append("\n警告：以下商家编码在库存数据中未找到对应的库存信息：")
-                    self.output_text.append(missing_inventory[['商家编码', '货品名称']].to_string())
+                    self.output_text.append(missing[['商家编码', '货品名称']].to_string())
 
                 # 保存合并后的数据
                 inventory_output_file = os.path.join(self.output_dir, "中间处理过程_abnormal_order_data_with_inventory.xlsx")
+                self.profiler.rows(rows_out=len(merged_df))
                 try:
-                    merged_df.to_excel(inventory_output_file, index=False)
+                    with self.profiler.span('to_excel'):
+                        merged_df.to_excel(inventory_output_file, index=False)
                     self.output_text.append(f"\n合并库存数据已保存到: {os.path.basename(inventory_output_file)}")
                     return inventory_output_file
                 except Exception as e:
@@ -399,38 +418,41 @@ class OrderDataProcessor(QMainWindow):
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    @profiled_stage()
     def filter_merchant_codes(self, input_file):
-        """筛选商家编码"""
+        """筛选商家编码，返回最终结果（失败时返回 None）"""
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
             # QApplication.processEvents()
             try:
-                df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    df = pd.read_excel(input_file)
+                self.profiler.rows(rows_in=len(df))
                 self.output_text.append(f"文件包含 {len(df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
 
                 # 筛选商家编码
-                exclude_patterns = [
-                    r'250g冰袋\*2\+500g干冰\*1',
-                    r'250g冰袋\*4',
-                    r'XDJXN',
-                    r'XDJLW'
-                ]
-                df['商家编码'] = df['商家编码'].astype(str)
-                mask = ~df['商家编码'].str.contains('|'.join(exclude_patterns), case=False, na=False, regex=True)
-                cleaned_df = df[mask]
+                with self.profiler.span('str.contains'):
+                    cleaned_df, excluded_df = exclude_merchant_codes(df)
 
                 # 检查被筛掉的记录
-                excluded_df = df[~mask]
                 if not excluded_df.empty:
                     self.output_text.append("\n被筛掉的记录（包含指定商家编码模式）：")
                     self.output_text.append(excluded_df[['订单编号', '商家编码', '货品名称']].to_string())
 
                 # 保存清洗后的数据
-                output_file = os.path.join(self.output_dir, "最终结果_缺货导致的超区发货数据.xlsx")
+                output_format = self.format_combo.currentData()
+                output_file = os.path.join(self.output_dir, f"最终结果_缺货导致的超区发货数据.{output_format}")
+                self.profiler.rows(rows_out=len(cleaned_df))
                 try:
-                    cleaned_df.to_excel(output_file, index=False)
+                    if output_format == 'xlsx':
+                        with self.profiler.span('to_excel'):
+                            cleaned_df.to_excel(output_file, index=False)
+                    else:
+                        with self.profiler.span('write_table'):
+                            write_table(cleaned_df, output_file)
                     self.output_text.append(f"\n清洗后的数据已保存到: {os.path.basename(output_file)}")
+                    return cleaned_df
                 except Exception as e:
                     self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
                     QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
@@ -439,4 +461,14 @@ class OrderDataProcessor(QMainWindow):
                 QMessageBox.critical(self, "错误", f"读取 {os.path.basename(input_file)} 失败: {e}")
         else:
             self.output_text.append(f"\n文件 {os.path.basename(input_file)} 不存在！")
-            QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
\ No newline at end of file
+            QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
+        return None
+
+    @profiled_stage()
+    def update_summary_cube(self, result_df):
+        """与 run_job 相同，用最终结果更新超区发货汇总"""
+        try:
+            update_cube({'abnormal': result_df}, self.order_files, self.output_dir, log=self.output_text.append)
+        except Exception as e:
+            self.output_text.append(f"\n更新超区发货汇总失败: {e}")
+            QMessageBox.warning(self, "警告", f"更新超区发货汇总失败: {e}")
\ No newline at end of file
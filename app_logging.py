@@ -0,0 +1,96 @@
+# app_logging.py
+"""app.log 的日志配置，由程序入口（main_app.py、fee.py 直接运行时）调用 setup_logging，导入模块时不做任何配置。
+
+处理线程只把日志记录放入队列（DeferredQueueHandler），由后台线程（QueueListener）格式化并写入文件，
+处理过程不等待格式化和磁盘写入；
+文件超过 LOG_MAX_BYTES 时轮转，保留 LOG_BACKUP_COUNT 个旧文件。
+
+日志级别默认为 DEBUG（与原来的 basicConfig 一致），可由环境变量 APP_LOG_LEVEL 指定，运行中用 set_log_level 修改（超区发货费用窗口的“日志级别”）。
+日志用 %s 占位符传参，低于当前级别的记录不会生成，也就不会格式化；DataFrame 等输出用 lazy 包装：
+
+    logging.debug("Inventory data head: %s", lazy(inventory_df.head().to_string))
+
+只有该级别启用时才会调用 to_string，并且在后台线程中调用，因此 lazy 只能包装记录后不再修改的对象
+（上例的 head() 返回新对象）。
+"""
+import atexit
+import copy
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = 'app.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+DEFAULT_LOG_LEVEL = 'DEBUG'
+
+_listener = None
+_queue_handler = None
+
+
+class lazy:
+    """日志参数：记录的级别启用、格式化消息时才调用 func(*args) 生成文本。
+
+    格式化在后台线程中进行，可能晚于记录日志的时刻，只能包装之后不再修改的对象（例如 head() 返回的新 DataFrame）；
+    会被重置或继续修改的对象（例如 StageProfiler）应在记录时直接生成文本。"""
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """放入队列前不格式化：标准 QueueHandler.prepare 会在发出日志的线程中调用 format，
+    这里只复制记录，msg/args/exc_info 原样交给 QueueListener 的处理器格式化"""
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+def setup_logging(log_file=LOG_FILE, level=None):
+    """根 logger 的输出改为队列，后台线程写入轮转的 log_file；重复调用时只修改级别"""
+    global _listener, _queue_handler
+    set_log_level(level or os.environ.get('APP_LOG_LEVEL') or DEFAULT_LOG_LEVEL)
+    if _listener is not None:
+        return _listener
+    file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding='utf-8', delay=True)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    logging.getLogger().addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, file_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def set_log_level(level):
+    """修改根 logger 的级别（'DEBUG'、'INFO' 等或 logging 的数值级别）"""
+    if isinstance(level, str):
+        if level.upper() not in LOG_LEVELS:
+            raise ValueError(f"未知的日志级别: {level}，可选 {', '.join(LOG_LEVELS)}")
+        level = getattr(logging, level.upper())
+    logging.getLogger().setLevel(level)
+
+
+def log_level():
+    """根 logger 当前级别的名称"""
+    return logging.getLevelName(logging.getLogger().level)
+
+
+def shutdown_logging():
+    """写完队列中剩余的记录后停止后台线程"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = _queue_handler = None
@@ -1,14 +1,35 @@
 # apriori_app.py
 import pandas as pd
 import os
-from mlxtend.frequent_patterns import apriori, association_rules
-from sklearn.preprocessing import MultiLabelBinarizer
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QPushButton,
-                             QTextEdit, QFileDialog, QLabel, QMessageBox, QLineEdit, QFormLayout,QApplication)
+from mlxtend.frequent_patterns import apriori, fpgrowth, association_rules
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+                             QTextEdit, QFileDialog, QLabel, QMessageBox, QLineEdit, QFormLayout,QApplication,
+                             QDialog, QComboBox, QCheckBox)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import Qt, pyqtSignal
 import io
 import contextlib
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from itemset_cache import ItemsetCache, fingerprint_files
+from threshold_explorer import ThresholdExplorer
+from topk_rules import mine_top_k_rules
+from apriori_core import (read_order_items, concat_order_items, keep_multi_row_orders, dedupe_order_items,
+                          build_item_name_mapping, one_hot_encode, annotate_itemsets,
+                          write_snapshot, mine_partition, PARTITION_COLUMNS, INVALID_CODE_MATCHER)
+from incremental_store import IncrementalItemsetStore, TRACKING_MARGIN
+from rule_export import compact_itemsets, compact_rules, write_table, EXPORT_FORMATS, EXCEL_MAX_ROWS
+from mining_preflight import plan_mining, memory_budget, format_bytes, ENGINE_NAMES
+from rule_index import RuleIndex, RULE_INDEX_FILE
+from instrumentation import StageProfiler, ProfilingControls, profiled_stage
+
+# 日志中最多显示的结果行数，完整结果见导出文件
+LOG_ROWS = 20
+# 阈值探索未输入支持度时使用的挖掘下限
+EXPLORER_FLOOR_SUPPORT = 0.005
+# 处理步骤（方法名），用于性能记录和单步骤剖析
+PIPELINE_STAGES = ['data_clean', 'data_clean2', 'mine_itemsets', 'preflight', 'generate_rules',
+                   'run_top_k', 'run_partitioned', 'run_incremental', 'run_from_cache']
 
 class AprioriApp(QMainWindow):
     closed = pyqtSignal()  # 自定义信号，用于窗口关闭时通知
@@ -17,6 +38,11 @@ class AprioriApp(QMainWindow):
         super().__init__(parent)
         self.file_paths = []
         self.data_dir = None
+        self.itemset_cache = ItemsetCache()
+        self.last_exported_itemsets = None  # (指纹, 支持度)，避免命中缓存时重复导出频繁项集
+        self.snapshot_executor = ThreadPoolExecutor(max_workers=1)  # 后台写出中间数据快照
+        self.snapshot_futures = []
+        self.profiler = StageProfiler()
         self.initUI()
 
     def initUI(self):
@@ -53,6 +79,45 @@ class AprioriApp(QMainWindow):
         self.confidence_input.setPlaceholderText('请输入置信度（0到1，例如 0.6）')
         form_layout.addRow('最小支持度：', self.support_input)
         form_layout.addRow('最小置信度：', self.confidence_input)
+        # Top-K 模式：不设支持度，直接返回指标最高的 K 条规则
+        self.top_k_input = QLineEdit(self)
+        self.top_k_input.setPlaceholderText('留空则按支持度/置信度挖掘；填写 K（例如 100）启用 Top-K 模式')
+        self.top_k_metric_combo = QComboBox(self)
+        self.top_k_metric_combo.addItem('置信度', 'confidence')
+        self.top_k_metric_combo.addItem('提升度', 'lift')
+        self.min_count_input = QLineEdit(self)
+        self.min_count_input.setPlaceholderText('Top-K 模式下规则的最小单量（默认 2）')
+        form_layout.addRow('Top-K 规则数：', self.top_k_input)
+        form_layout.addRow('Top-K 排序指标：', self.top_k_metric_combo)
+        form_layout.addRow('最小单量：', self.min_count_input)
+        # 增量模式：新选择的文件累加到 Data/incremental_store.pkl，规则由累计计数生成
+        self.incremental_checkbox = QCheckBox('增量模式（累加到历史计数，仅处理新文件）', self)
+        self.incremental_checkbox.setToolTip('单商品和商品对精确累加；3 个及以上商品的项集只累加上次全量挖掘时跟踪的项集，'
+                                             '新增数据可能使未跟踪的项集达到最小支持度时自动全量重新挖掘所有历史文件')
+        form_layout.addRow('', self.incremental_checkbox)
+        # 分区挖掘：按店铺等字段拆分事务，在进程池中并行挖掘，避免跨店铺的噪声规则
+        self.partition_combo = QComboBox(self)
+        self.partition_combo.addItem('不分区（全部数据一起挖掘）', None)
+        for column in PARTITION_COLUMNS:
+            self.partition_combo.addItem(f'按{column}分区并行挖掘', column)
+        form_layout.addRow('分区挖掘：', self.partition_combo)
+        # 内存保护：挖掘前预估内存，超出预算时自动提高支持度或切换为 FP-Growth；不勾选则只给出警告
+        self.memory_guard_checkbox = QCheckBox('内存保护（预估超出内存时自动提高支持度或改用 FP-Growth）', self)
+        self.memory_guard_checkbox.setChecked(True)
+        form_layout.addRow('', self.memory_guard_checkbox)
+        # 中间数据默认只在内存中传递，勾选后在后台写出快照
+        self.snapshot_checkbox = QCheckBox('导出中间数据快照（后台写出，不影响分析速度）', self)
+        self.snapshot_format_combo = QComboBox(self)
+        self.snapshot_format_combo.addItem('CSV', '.csv')
+        self.snapshot_format_combo.addItem('Parquet', '.parquet')
+        snapshot_layout = QHBoxLayout()
+        snapshot_layout.addWidget(self.snapshot_checkbox)
+        snapshot_layout.addWidget(self.snapshot_format_combo)
+        form_layout.addRow('', snapshot_layout)
+        self.export_format_combo = QComboBox(self)
+        for label, extension in EXPORT_FORMATS.items():
+            self.export_format_combo.addItem(label, extension)
+        form_layout.addRow('结果导出格式：', self.export_format_combo)
         layout.addLayout(form_layout)
 
         # 运行按钮
@@ -60,6 +125,15 @@ class AprioriApp(QMainWindow):
         self.run_button.clicked.connect(self.run_analysis)
         layout.addWidget(self.run_button)
 
+        # 阈值探索按钮
+        self.explore_button = QPushButton('阈值探索', self)
+        self.explore_button.clicked.connect(self.open_explorer)
+        layout.addWidget(self.explore_button)
+
+        # 性能记录
+        self.profiling_controls = ProfilingControls(self.profiler, PIPELINE_STAGES, self)
+        layout.addWidget(self.profiling_controls)
+
         # 返回按钮
         self.back_button = QPushButton('返回主菜单', self)
         self.back_button.clicked.connect(self.close)
@@ -86,6 +160,7 @@ class AprioriApp(QMainWindow):
             # 设置 data_dir 为第一个文件的父目录下的 Data 文件夹
             self.data_dir = os.path.join(os.path.dirname(files[0]), 'Data')
             os.makedirs(self.data_dir, exist_ok=True)  # 自动创建 Data 文件夹
+            self.itemset_cache.cache_dir = os.path.join(self.data_dir, 'itemset_cache')
             self.file_label.setText(f'已选择 {len(files)} 个文件: {", ".join([os.path.basename(f) for f in files])}')
             self.statusBar().showMessage('文件已选择，点击“运行分析”开始处理')
         else:
@@ -108,6 +183,16 @@ class AprioriApp(QMainWindow):
         except ValueError:
             raise ValueError(f"请输入有效的 {param_name}（0到1之间的数字，例如 0.01）")
 
+    def validate_positive_int(self, value, param_name):
+        """验证输入是否为正整数"""
+        try:
+            val = int(value)
+        except ValueError:
+            raise ValueError(f"请输入有效的 {param_name}（正整数，例如 100）")
+        if val < 1:
+            raise ValueError(f"{param_name} 必须大于 0")
+        return val
+
     def run_analysis(self):
         if not self.file_paths or not self.data_dir:
             QMessageBox.warning(self, '错误', '请先选择 Excel 文件！')
@@ -116,13 +201,12 @@ class AprioriApp(QMainWindow):
         self.log_text.clear()
         self.statusBar().showMessage('正在运行分析...')
         self.run_button.setEnabled(False)
+        self.profiling_controls.start(self.data_dir)
 
         # 重定向 print 到 GUI 日志窗口
         output = io.StringIO()
         with contextlib.redirect_stdout(output):
             try:
-                self.data_clean()
-                self.data_clean2()
                 # 获取用户输入的支持度和置信度
                 support_text = self.support_input.text().strip()
                 confidence_text = self.confidence_input.text().strip()
@@ -132,17 +216,294 @@ class AprioriApp(QMainWindow):
                     min_support = self.validate_input(support_text, "支持度")
                 if confidence_text:
                     min_confidence = self.validate_input(confidence_text, "置信度")
-                self.run_apriori(min_support, min_confidence)
+
+                top_k_text = self.top_k_input.text().strip()
+                if top_k_text:
+                    top_k = self.validate_positive_int(top_k_text, "Top-K 规则数")
+                    min_count_text = self.min_count_input.text().strip()
+                    min_count = self.validate_positive_int(min_count_text, "最小单量") if min_count_text else 2
+                    df_cleaned = self.prepare_data()
+                    if df_cleaned is not None:
+                        self.run_top_k(df_cleaned, top_k, self.top_k_metric_combo.currentData(), min_count)
+                elif self.incremental_checkbox.isChecked():
+                    self.run_incremental(min_support, min_confidence)
+                elif self.partition_combo.currentData():
+                    df_cleaned = self.prepare_data()
+                    if df_cleaned is not None:
+                        self.run_partitioned(df_cleaned, self.partition_combo.currentData(), min_support, min_confidence)
+                else:
+                    # 输入文件和支持度不变时复用已挖掘的频繁项集，只重新生成关联规则
+                    fingerprint = fingerprint_files(self.file_paths, INVALID_CODE_MATCHER)
+                    if min_support is None:
+                        cached_transactions = self.itemset_cache.n_transactions(fingerprint)
+                        if cached_transactions:
+                            min_support = max(1 / cached_transactions, 0.01)
+                    cached = (self.itemset_cache.get(fingerprint, min_support, self.memory_guard_checkbox.isChecked())
+                              if min_support is not None else None)
+                    if cached is not None:
+                        self.run_from_cache(cached, fingerprint, min_support, min_confidence)
+                    else:
+                        df_cleaned = self.prepare_data()
+                        if df_cleaned is not None:
+                            self.run_apriori(df_cleaned, min_support, min_confidence, fingerprint)
                 self.statusBar().showMessage('分析完成！')
             except Exception as e:
                 self.log(f"错误：{str(e)}")
                 self.statusBar().showMessage('分析失败！')
         self.log(output.getvalue())
+        self.report_snapshots()
+        self.profiling_controls.finish(self.log)
         self.run_button.setEnabled(True)
 
+    def open_explorer(self):
+        """以输入的支持度（或默认下限）挖掘一次，然后打开阈值探索窗口"""
+        if not self.file_paths or not self.data_dir:
+            QMessageBox.warning(self, '错误', '请先选择 Excel 文件！')
+            return
+
+        self.log_text.clear()
+        self.statusBar().showMessage('正在挖掘频繁项集（探索模式）...')
+        self.explore_button.setEnabled(False)
+        self.profiling_controls.start(self.data_dir)
+        mined = None
+        floor_support = EXPLORER_FLOOR_SUPPORT
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                support_text = self.support_input.text().strip()
+                if support_text:
+                    floor_support = self.validate_input(support_text, "支持度")
+                self.log(f"\n=== 阈值探索：以最小支持度 {floor_support:.4f} 挖掘一次 ===")
+                fingerprint = fingerprint_files(self.file_paths, INVALID_CODE_MATCHER)
+                mined = self.itemset_cache.get(fingerprint, floor_support, self.memory_guard_checkbox.isChecked())
+                if mined is not None:
+                    self.log("命中频繁项集缓存，跳过数据清洗和 Apriori 挖掘。")
+                    floor_support = mined.get('adjusted_support', floor_support)
+                else:
+                    df_cleaned = self.prepare_data()
+                    if df_cleaned is not None:
+                        mined = self.mine_itemsets(df_cleaned, floor_support, fingerprint, export=False)
+                        if mined is not None:
+                            floor_support = mined['min_support']  # 预检可能提高了支持度
+            except Exception as e:
+                self.log(f"错误：{str(e)}")
+        self.log(output.getvalue())
+        self.profiling_controls.finish(self.log)
+        self.explore_button.setEnabled(True)
+
+        if mined is None or mined['frequent_itemsets'].empty:
+            self.statusBar().showMessage('探索失败：没有频繁项集')
+            QMessageBox.warning(self, '错误', '没有挖掘到频繁项集，请降低支持度后重试！')
+            return
+        self.statusBar().showMessage('就绪')
+        explorer = ThresholdExplorer(mined['frequent_itemsets'], mined['item_name_mapping'],
+                                     mined['n_transactions'], floor_support, self)
+        if explorer.exec_() == QDialog.Accepted:
+            support, confidence, _ = explorer.current_thresholds()
+            self.support_input.setText(f'{support:.4f}')
+            self.confidence_input.setText(f'{confidence:.2f}')
+            self.statusBar().showMessage('已应用探索得到的阈值，点击“运行分析”导出结果')
+
+    @profiled_stage()
+    def run_top_k(self, df_cleaned, k, metric, min_count):
+        """Top-K 模式：返回指标最高的 K 条规则，内部阈值随结果动态抬升"""
+        metric_name = '置信度' if metric == 'confidence' else '提升度'
+        self.log(f"\n=== 3. Top-K 关联规则挖掘（K={k}，按{metric_name}排序，最小单量={min_count}）===")
+        self.log("说明：不设最小支持度，按商品频次从高到低扩展规则前件，第 K 条规则的指标作为动态内部阈值剪枝。")
+        self.log("规则形式为 X→Y，后件为单个商品，规则最多包含 3 个商品。")
+        item_name_mapping = build_item_name_mapping(df_cleaned)
+        start = time.perf_counter()
+        self.profiler.rows(rows_in=len(df_cleaned))
+        with self.profiler.span('mine_top_k_rules'):
+            rules, stats = mine_top_k_rules(df_cleaned['订单编号'], df_cleaned['商家编码'],
+                                            k=k, metric=metric, min_count=min_count)
+        self.profiler.rows(rows_out=len(rules))
+        self.log(f"总事务数：{stats['n_transactions']}，商品种类数：{stats['n_items']}，"
+                 f"搜索前件节点数：{stats['nodes_visited']}，耗时 {time.perf_counter() - start:.2f} 秒")
+        if rules.empty:
+            self.log(f"没有找到单量≥{min_count} 的关联规则，请尝试降低最小单量！")
+            return
+        if stats['final_threshold'] is not None:
+            self.log(f"最终内部阈值：{metric_name} {stats['final_threshold']:.4f}，单量 {stats['final_threshold_count']}")
+
+        rules = compact_rules(rules, item_name_mapping)
+        self.log(f"\nTop-K 关联规则结果（前 {min(LOG_ROWS, len(rules))} 条）：")
+        self.log(str(rules[['antecedents', 'consequents', 'support', 'confidence', 'lift', '前件商品名称', '后件商品名称', '单量']].head(LOG_ROWS)))
+        with self.profiler.span('export'):
+            rules_output_file = self.export_table(rules, '最终结果_topk_association_rules')
+        self.log(f"\nTop-K 关联规则已保存到：{rules_output_file}")
+        self.log("\n" + "="*50)
+
+    @profiled_stage()
+    def run_partitioned(self, df_cleaned, column, min_support, min_confidence):
+        """按指定字段分区，在进程池中并行挖掘每个分区，合并为一个带分区列的规则表"""
+        partitions = [(value, group[['订单编号', '商家编码']])
+                      for value, group in df_cleaned.groupby(column, observed=True, sort=True)
+                      if group['订单编号'].nunique() >= 2]
+        self.log(f"\n=== 3. 按{column}分区并行挖掘 ===")
+        self.log(f"说明：共 {len(partitions)} 个分区，每个分区单独计算支持度和置信度，不生成跨分区的规则。")
+        if not partitions:
+            self.log(f"错误：没有包含至少 2 个订单的{column}分区！")
+            return
+
+        self.profiler.rows(rows_in=len(df_cleaned))
+        item_name_mapping = build_item_name_mapping(df_cleaned)
+        start = time.perf_counter()
+        all_rules = []
+        max_workers = min(len(partitions), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # 内存预算由各进程平分
+            budget = memory_budget() // max_workers if self.memory_guard_checkbox.isChecked() else None
+            futures = [executor.submit(mine_partition, value, group, min_support, min_confidence, budget)
+                       for value, group in partitions]
+            for future in as_completed(futures):
+                try:
+                    partition, n_transactions, partition_support, n_itemsets, rules = future.result()
+                except Exception as e:
+                    self.log(f"分区挖掘失败: {str(e)}")
+                    continue
+                self.log(f"{column} {partition}: 事务数 {n_transactions}，最小支持度 {partition_support:.4f}，"
+                         f"频繁项集 {n_itemsets} 个，关联规则 {len(rules)} 条")
+                if rules.empty:
+                    continue
+                rules = rules.copy()
+                rules.insert(0, column, partition)
+                rules['单量'] = (rules['support'] * n_transactions).round().astype(int)
+                all_rules.append(rules)
+        self.log(f"\n分区挖掘耗时：{time.perf_counter() - start:.2f} 秒（{max_workers} 个进程）")
+
+        if not all_rules:
+            self.log(f"没有分区找到满足最小置信度（{min_confidence:.2f}）的关联规则！")
+            return
+        combined = pd.concat(all_rules, ignore_index=True).sort_values(
+            by=[column, 'confidence'], ascending=[True, False], ignore_index=True)
+        combined = compact_rules(combined, item_name_mapping)
+        self.log(f"合计关联规则 {len(combined)} 条")
+        self.profiler.rows(rows_out=len(combined))
+        with self.profiler.span('export'):
+            rules_output_file = self.export_table(combined, f'最终结果_按{column}分区_association_rules')
+        self.log(f"\n分区关联规则已保存到：{rules_output_file}")
+        self.log("\n" + "="*50)
+
+    @profiled_stage()
+    def run_incremental(self, min_support, min_confidence):
+        """增量模式：只清洗新文件并累加计数，由累计计数生成关联规则"""
+        store = IncrementalItemsetStore(os.path.join(self.data_dir, 'incremental_store.pkl'))
+        self.log("\n=== 增量模式：更新累计计数库 ===")
+        self.log(f"说明：计数库已包含 {len(store.batches)} 个批次、{store.n_transactions} 个事务，已处理过的文件会被跳过。")
+        new_batches = {}
+        for file in self.file_paths:
+            batch_fingerprint = fingerprint_files([file])
+            if batch_fingerprint in store.batches:
+                self.log(f"跳过已累加的文件: {os.path.basename(file)}")
+            else:
+                new_batches[batch_fingerprint] = os.path.abspath(file)
+
+        if min_support is None:
+            min_support = max(1 / store.n_transactions, 0.01) if store.n_transactions else 0.01
+        if store.needs_full_remine(min_support):
+            if store.support_floor is None or min_support < store.support_floor:
+                self.log(f"\n最小支持度 {min_support:.4f} 低于跟踪项集的支持度下限"
+                         f"（{store.support_floor if store.support_floor is not None else '未挖掘'}），对所有历史批次全量重新挖掘。")
+            else:
+                self.log(f"\n上次全量挖掘后新增的数据可能使未跟踪的高阶项集达到最小支持度 {min_support:.4f}，"
+                         f"对所有历史批次全量重新挖掘。")
+            store.batches.update(new_batches)
+            n_tracked = store.full_remine(min_support)
+            self.log(f"全量重新挖掘完成：{store.n_transactions} 个事务，跟踪 {n_tracked} 个高阶项集。")
+        elif new_batches:
+            frames = []
+            for file in new_batches.values():
+                self.log(f"正在读取新文件: {file}")
+                with self.profiler.span('read_excel'):
+                    frames.append(read_order_items(file))
+            added, skipped = store.add_batch(frames, new_batches)
+            if skipped:
+                self.log(f"跳过 {skipped} 个已累加过的订单（文件重新保存或与已累加的文件重叠）。")
+            self.log(f"新增 {added} 个事务，累计 {store.n_transactions} 个事务。")
+            if store.needs_full_remine(min_support):
+                self.log(f"新增数据超出跟踪余量：上次全量挖掘时未跟踪的高阶项集可能已达到最小支持度 {min_support:.4f}，"
+                         f"对所有历史批次全量重新挖掘。")
+                n_tracked = store.full_remine(min_support)
+                self.log(f"全量重新挖掘完成：{store.n_transactions} 个事务，跟踪 {n_tracked} 个高阶项集。")
+        else:
+            self.log("没有新文件需要累加，直接使用累计计数。")
+        store.save()
+
+        self.log("\n=== 由累计计数生成频繁项集 ===")
+        with self.profiler.span('frequent_itemsets'):
+            frequent_itemsets = store.frequent_itemsets(min_support)
+            frequent_itemsets = annotate_itemsets(frequent_itemsets, store.item_names, store.n_transactions)
+        self.log(f"最小支持度设置为：{min_support:.4f}，频繁项集数：{len(frequent_itemsets)}")
+        if store.n_transactions:
+            self.log(f"说明：单商品和商品对为精确计数；3 个及以上商品的项集只累加全量挖掘时跟踪的项集"
+                     f"（跟踪支持度 ≥ {store.support_floor * TRACKING_MARGIN:.4f}），其余高阶项集当前支持度低于 "
+                     f"{store.untracked_count_bound() / store.n_transactions:.4f}，不会达到最小支持度，结果与全量挖掘一致。"
+                     f"新增数据使该上限超过最小支持度时会自动全量重新挖掘。")
+        if not frequent_itemsets.empty:
+            output_file = self.export_table(compact_itemsets(frequent_itemsets, store.item_names), 'frequent_itemsets')
+            self.log(f"\n频繁项集已保存到：{output_file}")
+        self.generate_rules(frequent_itemsets, store.item_names, store.n_transactions, min_confidence)
+
+    @profiled_stage()
+    def run_from_cache(self, cached, fingerprint, min_support, min_confidence):
+        """命中频繁项集缓存：跳过读取、清洗和挖掘，直接生成关联规则"""
+        start = time.perf_counter()
+        frequent_itemsets = cached['frequent_itemsets']
+        self.log("\n=== 命中频繁项集缓存 ===")
+        if 'adjusted_support' in cached:
+            self.log(f"说明：上次以最小支持度 {min_support:.6f} 挖掘时，预检按内存预算提高到了 "
+                     f"{cached['adjusted_support']:.6f}，本次沿用提高后的支持度。")
+            min_support = cached['adjusted_support']
+        self.log(f"说明：输入文件未变化，复用最小支持度 {cached['cached_support']:.4f} 时挖掘的频繁项集，"
+                 f"按最小支持度 {min_support:.4f} 过滤后共 {len(frequent_itemsets)} 个项集，跳过数据清洗和 Apriori 挖掘。")
+        if (fingerprint, min_support) != self.last_exported_itemsets and not frequent_itemsets.empty:
+            output_file = self.export_table(compact_itemsets(frequent_itemsets, cached['item_name_mapping']),
+                                            'frequent_itemsets')
+            self.last_exported_itemsets = (fingerprint, min_support)
+            self.log(f"\n频繁项集已保存到：{output_file}")
+        self.generate_rules(frequent_itemsets, cached['item_name_mapping'], cached['n_transactions'], min_confidence)
+        self.log(f"\n基于缓存生成关联规则耗时：{time.perf_counter() - start:.2f} 秒")
+
+    def prepare_data(self):
+        """在内存中依次执行数据清洗的两个步骤，返回清洗后的数据；失败时返回 None"""
+        merged_df = self.data_clean()
+        if merged_df is None:
+            return None
+        return self.data_clean2(merged_df)
+
+    def export_table(self, df, base_name):
+        """按选择的格式导出结果表，超过 Excel 行数上限时改为 CSV，返回保存路径"""
+        extension = self.export_format_combo.currentData()
+        if extension == '.xlsx' and len(df) > EXCEL_MAX_ROWS:
+            self.log(f"结果共 {len(df)} 行，超过 Excel 上限 {EXCEL_MAX_ROWS} 行，改为导出 CSV。")
+            extension = '.csv'
+        return write_table(df, os.path.join(self.data_dir, base_name + extension))
+
+    def save_snapshot(self, df, name):
+        """勾选导出快照时，在后台线程写出中间数据"""
+        if not self.snapshot_checkbox.isChecked():
+            return
+        output_file = os.path.join(self.data_dir, name + self.snapshot_format_combo.currentData())
+        self.snapshot_futures.append((output_file, self.snapshot_executor.submit(write_snapshot, df, output_file)))
+        self.log(f"\n已提交后台写出快照: {output_file}")
+
+    def report_snapshots(self):
+        """汇报已完成的快照写出结果，未完成的留到下次汇报"""
+        pending = []
+        for output_file, future in self.snapshot_futures:
+            if not future.done():
+                pending.append((output_file, future))
+            elif future.exception() is not None:
+                self.log(f"写出快照 {output_file} 失败: {future.exception()}")
+            else:
+                self.log(f"快照已保存到: {output_file}")
+        if pending:
+            self.log(f"{len(pending)} 个快照仍在后台写出中。")
+        self.snapshot_futures = pending
+
+    @profiled_stage()
     def data_clean(self):
-        required_columns = ['订单编号', '店铺', '客户编号', '商家编码', '货品名称']
-        invalid_codes = ['250g冰袋*2+500g干冰*1', '250g冰袋*4', 'XDJXN', 'XDJLW']
         all_valid_data = []
 
         # 确保 data_dir 存在
@@ -152,8 +513,8 @@ class AprioriApp(QMainWindow):
 
         for file in self.file_paths:
             try:
-                df = pd.read_excel(file, usecols=required_columns)
-                df_valid = df[~df['商家编码'].isin(invalid_codes)]
+                with self.profiler.span('read_excel'):
+                    df_valid = read_order_items(file)
                 all_valid_data.append(df_valid)
                 self.log(f"\n=== 正在处理文件: {file} ===")
                 self.log("表头字段:")
@@ -169,37 +530,33 @@ class AprioriApp(QMainWindow):
                 self.log(f"读取文件 {file} 时发生错误: {str(e)}")
 
         if all_valid_data:
+            self.profiler.rows(rows_in=sum(len(df) for df in all_valid_data))
             try:
-                merged_df = pd.concat(all_valid_data, ignore_index=True)
-                order_counts = merged_df['订单编号'].value_counts()
-                valid_orders = order_counts[order_counts > 1].index
-                merged_df = merged_df[merged_df['订单编号'].isin(valid_orders)]
+                merged_df = concat_order_items(all_valid_data)
+                merged_df = keep_multi_row_orders(merged_df)
+                self.profiler.rows(rows_out=len(merged_df))
                 if merged_df.empty:
                     self.log("错误：过滤后没有包含多件商品的订单数据！")
-                    return
-                output_file = os.path.join(self.data_dir, 'merged_data.csv')
-                merged_df.to_csv(output_file, index=False, encoding='utf-8-sig')
-                self.log(f"\n=== 合并后的数据已保存到: {output_file} ===")
+                    return None
+                self.log("\n=== 合并完成 ===")
                 self.log("合并数据表头:")
                 self.log(str(list(merged_df.columns)))
                 self.log("\n合并数据内容:")
                 self.log(str(merged_df))
                 self.log("\n" + "="*50)
+                self.save_snapshot(merged_df, 'merged_data')
+                return merged_df
             except Exception as e:
-                self.log(f"合并或保存CSV文件时发生错误: {str(e)}")
+                self.log(f"合并数据时发生错误: {str(e)}")
         else:
             self.log("错误：没有有效数据可合并！")
+        return None
 
-    def data_clean2(self):
-        required_columns = ['订单编号', '店铺', '客户编号', '商家编码', '货品名称']
-        merged_file = os.path.join(self.data_dir, 'merged_data.csv')
-
-        # 确保 data_dir 存在
-        os.makedirs(self.data_dir, exist_ok=True)
+    @profiled_stage()
+    def data_clean2(self, df_merged):
         try:
-            self.log("\n=== 2. 读取合并数据并去重 ===")
-            self.log(f"说明：读取 {merged_file}，包含订单编号、商家编码等字段。")
-            df_merged = pd.read_csv(merged_file, usecols=required_columns, encoding='utf-8-sig')
+            self.log("\n=== 2. 合并数据去重 ===")
+            self.log("说明：使用上一步合并的数据，包含订单编号、商家编码等字段。")
             self.log("\n数据表头（字段名）：")
             self.log(str(list(df_merged.columns)))
             self.log("\n数据内容（前几行）：")
@@ -210,21 +567,16 @@ class AprioriApp(QMainWindow):
             self.log("\n=== 清洗数据：对每个订单的商家编码去重 ===")
             self.log("说明：在每个订单编号内，移除重复的商家编码，保留第一条记录的完整信息。")
 
-            def deduplicate_items(group):
-                return group.drop_duplicates(subset=['商家编码'], keep='first')
-
-            df_cleaned = df_merged.groupby('订单编号').apply(deduplicate_items).reset_index(drop=True)
-            order_item_counts = df_cleaned.groupby('订单编号')['商家编码'].nunique()
-            valid_orders = order_item_counts[order_item_counts > 1].index
-            df_cleaned = df_cleaned[df_cleaned['订单编号'].isin(valid_orders)]
+            self.profiler.rows(rows_in=len(df_merged))
+            with self.profiler.span('dedupe_order_items'):
+                df_cleaned, order_item_counts = dedupe_order_items(df_merged)
+            self.profiler.rows(rows_out=len(df_cleaned))
 
             if df_cleaned.empty:
                 self.log("错误：去重并过滤后没有包含多种商品的订单数据！")
-                return
+                return None
 
-            cleaned_output_file = os.path.join(self.data_dir, 'cleaned_merged_data.csv')
-            df_cleaned.to_csv(cleaned_output_file, index=False, encoding='utf-8-sig')
-            self.log(f"\n=== 清洗后的数据已保存到: {cleaned_output_file} ===")
+            self.log("\n=== 清洗完成 ===")
             self.log("说明：仅保留去重后包含多种商品（商家编码数量 > 1）的订单。")
             self.log("\n清洗后数据表头：")
             self.log(str(list(df_cleaned.columns)))
@@ -237,29 +589,36 @@ class AprioriApp(QMainWindow):
             self.log("订单编号与商品种类数：")
             self.log(str(order_item_counts[order_item_counts > 1]))
             self.log("\n" + "="*50)
+            self.save_snapshot(df_cleaned, 'cleaned_merged_data')
+            return df_cleaned
 
         except Exception as e:
-            self.log(f"合并或保存CSV文件时发生错误: {str(e)}")
+            self.log(f"清洗数据时发生错误: {str(e)}")
+            return None
 
-    def run_apriori(self, min_support=None, min_confidence=0.6):
-        required_columns = ['订单编号', '店铺', '客户编号', '商家编码', '货品名称']
-        merged_file = os.path.join(self.data_dir, 'cleaned_merged_data.csv')
+    def run_apriori(self, df_merged, min_support=None, min_confidence=0.6, fingerprint=None):
+        mined = self.mine_itemsets(df_merged, min_support, fingerprint)
+        if mined is not None:
+            self.generate_rules(mined['frequent_itemsets'], mined['item_name_mapping'], mined['n_transactions'], min_confidence)
 
+    @profiled_stage()
+    def mine_itemsets(self, df_merged, min_support=None, fingerprint=None, export=True):
+        """对清洗后的数据挖掘频繁项集，返回项集、事务数和商品名称映射"""
         # 确保 data_dir 存在
         os.makedirs(self.data_dir, exist_ok=True)
         try:
-            self.log("\n=== 3. 读取清洗后的数据并运行 Apriori 算法 ===")
-            self.log(f"说明：从 {merged_file} 读取数据，包含订单编号、商家编码等字段。")
-            df_merged = pd.read_csv(merged_file, usecols=required_columns, encoding='utf-8-sig')
+            self.log("\n=== 3. 对清洗后的数据运行 Apriori 算法 ===")
+            self.log("说明：使用上一步清洗后的数据，包含订单编号、商家编码等字段。")
 
+            self.profiler.rows(rows_in=len(df_merged))
             # 检查数据是否为空
             if df_merged.empty:
-                self.log("错误：数据文件为空，请检查 'cleaned_merged_data.csv' 是否包含有效数据！")
-                return
+                self.log("错误：清洗后的数据为空，请检查输入文件是否包含有效数据！")
+                return None
 
             self.log("\n=== 4. 创建商家编码到货品名称的映射 ===")
             self.log("说明：从数据中提取商家编码和货品名称的对应关系，用于后续显示商品名称。")
-            item_name_mapping = df_merged[['商家编码', '货品名称']].drop_duplicates(subset=['商家编码']).set_index('商家编码')['货品名称'].to_dict()
+            item_name_mapping = build_item_name_mapping(df_merged)
             self.log("商家编码到货品名称的映射（部分）：")
             for code, name in list(item_name_mapping.items())[:5]:
                 self.log(f"商家编码: {code}, 货品名称: {name}")
@@ -279,41 +638,46 @@ class AprioriApp(QMainWindow):
             self.log("\n=== 6. 生成事务数据 ===")
             self.log("说明：将相同订单编号的记录视为一个事务，事务内容为该订单购买的所有商品（商家编码）。")
             self.log("注意：仅保留包含多个商品（商家编码数≥2）的事务，用于商品关联性分析。")
-            transactions = df_merged.groupby('订单编号')['商家编码'].apply(list).reset_index()
-            transactions = transactions[transactions['商家编码'].map(len) >= 2]
+            with self.profiler.span('groupby'):
+                transactions = df_merged.groupby('订单编号')['商家编码'].apply(list).reset_index()
+                transactions = transactions[transactions['商家编码'].map(len) >= 2]
             if transactions.empty:
                 self.log("错误：没有包含多个商品（商家编码数≥2）的事务，无法进行关联性分析！")
                 return
-            self.log("\n事务数据内容（每个订单的商品列表，仅包含多个商品的订单）：")
-            for _, row in transactions.iterrows():
-                self.log(f"订单编号: {row['订单编号']}, 商品（商家编码）: {row['商家编码']}")
+            self.log(f"\n事务数据内容（前 {LOG_ROWS} 个订单的商品列表，仅包含多个商品的订单）：")
+            self.log("\n".join(f"订单编号: {order_id}, 商品（商家编码）: {codes}"
+                               for order_id, codes in transactions.head(LOG_ROWS).itertuples(index=False)))
             self.log(f"\n总事务数（订单数，仅包含多个商品的订单）：{len(transactions)}")
             self.log("\n" + "="*50)
 
-            self.log("\n=== 7. 转换为 one-hot 编码 ===")
-            self.log("说明：将事务数据转换为矩阵，每列为一个商品（商家编码），1表示订单包含该商品，0表示不包含。")
-            mlb = MultiLabelBinarizer()
-            one_hot_data = mlb.fit_transform(transactions['商家编码'])
-            one_hot_df = pd.DataFrame(one_hot_data, columns=mlb.classes_)
+            # 使用用户输入的支持度，若未输入则使用默认值
+            if min_support is None:
+                min_support = max(1 / len(transactions), 0.01)
+            plan = self.preflight(df_merged, min_support)
+            requested_support, min_support = min_support, plan['min_support']
+
+            self.log("\n=== 8. 转换为 one-hot 编码 ===")
+            self.log("说明：将事务数据转换为矩阵，每列为一个商品（商家编码），True表示订单包含该商品，False表示不包含。")
+            with self.profiler.span('one_hot_encode'):
+                one_hot_df = one_hot_encode(df_merged, sparse=plan['sparse'])
             self.log("\none-hot 编码数据（前几行）：")
-            self.log("说明：每行为一个订单，每列为一个商品（商家编码），值为1表示订单包含该商品，值为0表示不包含。")
+            self.log("说明：每行为一个订单，每列为一个商品（商家编码），值为True表示订单包含该商品，值为False表示不包含。")
             self.log(str(one_hot_df.head()))
-            self.log(f"\n商品种类数（唯一商家编码）：{len(mlb.classes_)}")
+            self.log(f"\n商品种类数（唯一商家编码）：{one_hot_df.shape[1]}")
             self.log("\n" + "="*50)
 
-            self.log("\n=== 8. 生成频繁项集 ===")
+            self.log("\n=== 9. 生成频繁项集 ===")
             self.log("说明：频繁项集是支持度≥最小支持度的商品组合，包含所有项集大小（包括单商品项集）。")
             self.log("支持度=包含该商品组合的订单数/总订单数，表示订单占比。")
-            # 使用用户输入的支持度，若未输入则使用默认值
-            if min_support is None:
-                min_support = max(1 / len(transactions), 0.01)
-            self.log(f"最小支持度设置为：{min_support:.4f}")
-            frequent_itemsets = apriori(one_hot_df, min_support=min_support, use_colnames=True)
-            frequent_itemsets['项集大小'] = frequent_itemsets['itemsets'].apply(len)
-            frequent_itemsets['商品名称'] = frequent_itemsets['itemsets'].apply(
-                lambda x: tuple(item_name_mapping.get(item, f"未知商品({item})") for item in x)
-            )
-            frequent_itemsets['单量'] = (frequent_itemsets['support'] * len(transactions)).round().astype(int)
+            self.log(f"最小支持度设置为：{min_support:.4f}，挖掘算法：{ENGINE_NAMES[plan['engine']]}")
+            engine = fpgrowth if plan['engine'] == 'fpgrowth' else apriori
+            with self.profiler.span(plan['engine']):
+                frequent_itemsets = engine(one_hot_df, min_support=min_support, use_colnames=True)
+            frequent_itemsets = annotate_itemsets(frequent_itemsets, item_name_mapping, len(transactions))
+            self.profiler.rows(rows_out=len(frequent_itemsets))
+            if fingerprint is not None:
+                self.itemset_cache.put(fingerprint, min_support, frequent_itemsets, len(transactions), item_name_mapping,
+                                       requested_support)
 
             self.log("\n频繁项集结果（包含所有项集大小）：")
             self.log("字段说明：")
@@ -323,62 +687,97 @@ class AprioriApp(QMainWindow):
             self.log("- 商品名称: 商品组合的货品名称")
             self.log("- 单量: 购买该商品组合的订单数（支持度×总订单数）")
             if not frequent_itemsets.empty:
-                self.log(str(frequent_itemsets[['support', 'itemsets', '项集大小', '商品名称', '单量']].sort_values(by='support', ascending=False)))
-                output_file = os.path.join(self.data_dir, 'frequent_itemsets.xlsx')
-                frequent_itemsets.to_excel(output_file, index=False, engine='openpyxl')
+                self.log(f"共 {len(frequent_itemsets)} 个频繁项集，支持度最高的 {min(LOG_ROWS, len(frequent_itemsets))} 个：")
+                self.log(str(frequent_itemsets[['support', 'itemsets', '项集大小', '商品名称', '单量']].nlargest(LOG_ROWS, 'support')))
+            if not frequent_itemsets.empty and export:
+                with self.profiler.span('export'):
+                    output_file = self.export_table(compact_itemsets(frequent_itemsets, item_name_mapping), 'frequent_itemsets')
+                self.last_exported_itemsets = (fingerprint, min_support)
                 self.log(f"\n频繁项集已保存到：{output_file}")
-            else:
+            elif frequent_itemsets.empty:
                 self.log(f"没有找到满足最小支持度（{min_support:.4f}）的频繁项集，请尝试降低最小支持度或检查数据！")
                 self.log("建议：检查事务数据是否包含足够的多商品订单，或降低 min_support（例如 0.005）。")
             self.log("\n" + "="*50)
 
-            self.log("\n=== 9. 生成关联规则 ===")
-            self.log("说明：关联规则表示商品组合间的关联关系，例如X→Y表示购买X后可能购买Y。")
-            self.log("置信度=包含X和Y的订单数/包含X的订单数，表示规则的可靠性。")
-            self.log(f"最小置信度设置为：{min_confidence:.2f}")
-            if not frequent_itemsets.empty:
-                try:
-                    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
-                    # 添加商品名称列到规则
-                    rules['前件商品名称'] = rules['antecedents'].apply(
-                        lambda x: tuple(item_name_mapping.get(item, f"未知商品({item})") for item in x)
-                    )
-                    rules['后件商品名称'] = rules['consequents'].apply(
-                        lambda x: tuple(item_name_mapping.get(item, f"未知商品({item})") for item in x)
-                    )
-                    # 添加单量列
-                    rules['单量'] = (rules['support'] * len(transactions)).round().astype(int)
-                    # 打印关联规则
-                    self.log("\n关联规则结果：")
-                    self.log("字段说明：")
-                    self.log("- antecedents: 前件（规则的X部分，商家编码）")
-                    self.log("- consequents: 后件（规则的Y部分，商家编码）")
-                    self.log("- support: 支持度（规则出现的订单占比）")
-                    self.log("- confidence: 置信度（规则的可靠性）")
-                    self.log("- lift: 提升度（规则的强度，>1表示正相关）")
-                    self.log("- 前件商品名称: 前件的货品名称")
-                    self.log("- 后件商品名称: 后件的货品名称")
-                    self.log("- 单量: 购买该规则组合的订单数（支持度×总订单数）")
-                    if not rules.empty:
-                        self.log(str(rules[['antecedents', 'consequents', 'support', 'confidence', 'lift', '前件商品名称', '后件商品名称', '单量']].sort_values(by='confidence', ascending=False)))
-                        # 保存关联规则到Excel
-                        rules_output_file = os.path.join(self.data_dir, '最终结果_association_rules.xlsx')
-                        rules.to_excel(rules_output_file, index=False, engine='openpyxl')
-                        self.log(f"\n关联规则已保存到：{rules_output_file}")
-                    else:
-                        self.log(f"没有找到满足最小置信度（{min_confidence:.2f}）的关联规则，请尝试降低 min_confidence（例如 0.5）或检查频繁项集！")
-                        self.log("建议：检查频繁项集是否包含足够的多商品组合（项集大小≥2）。")
-                except Exception as e:
-                    self.log(f"生成关联规则时发生错误: {str(e)}")
-                    self.log("建议：检查频繁项集是否为空或只包含单商品项集。尝试降低 min_support（例如 0.005）或 min_confidence（例如 0.5）。")
-            else:
-                self.log("无法生成关联规则，因为没有频繁项集。")
-                self.log("建议：降低 min_support（例如 0.005）或检查数据清洗步骤，确保事务包含多种商品。")
-            self.log("\n" + "="*50)
+            return {
+                'frequent_itemsets': frequent_itemsets,
+                'n_transactions': len(transactions),
+                'item_name_mapping': item_name_mapping,
+                'min_support': min_support,
+            }
 
-        except FileNotFoundError:
-            self.log(f"错误：文件 {merged_file} 未找到，请确保 'Data/cleaned_merged_data.csv' 存在！")
         except ValueError as e:
             self.log(f"错误：{str(e)}")
         except Exception as e:
-            self.log(f"处理文件 {merged_file} 时发生错误: {str(e)}")
\ No newline at end of file
+            self.log(f"运行 Apriori 算法时发生错误: {str(e)}")
+        return None
+
+    @profiled_stage()
+    def preflight(self, df_merged, min_support):
+        """挖掘前预检：由单商品和商品对计数估计候选项集数和内存峰值，返回挖掘计划"""
+        self.log("\n=== 7. 挖掘前预检 ===")
+        self.log("说明：统计单商品支持度和频繁商品对数量，估计 Apriori 候选项集数和内存峰值，避免支持度过低导致内存耗尽。")
+        start = time.perf_counter()
+        plan = plan_mining(df_merged['订单编号'], df_merged['商家编码'], min_support,
+                           auto_adjust=self.memory_guard_checkbox.isChecked())
+        estimate = plan['estimate']
+        self.log(f"频繁商品数：{estimate['n_frequent_items']}，频繁商品对数：{estimate['n_frequent_pairs']}，"
+                 f"2 项候选数：{estimate['candidates'][2]:.0f}，3 项候选数上限：{estimate['candidates'][3]:.0f}")
+        self.log(f"预计 Apriori 内存峰值：{format_bytes(estimate['apriori_bytes'])}，内存预算：{format_bytes(plan['budget'])}"
+                 f"（预检耗时 {time.perf_counter() - start:.2f} 秒）")
+        for message in plan['messages']:
+            self.log(message)
+        self.log("\n" + "="*50)
+        return plan
+
+    @profiled_stage()
+    def generate_rules(self, frequent_itemsets, item_name_mapping, n_transactions, min_confidence):
+        """根据频繁项集生成关联规则并导出"""
+        self.log("\n=== 10. 生成关联规则 ===")
+        self.log("说明：关联规则表示商品组合间的关联关系，例如X→Y表示购买X后可能购买Y。")
+        self.log("置信度=包含X和Y的订单数/包含X的订单数，表示规则的可靠性。")
+        self.log(f"最小置信度设置为：{min_confidence:.2f}")
+        if not frequent_itemsets.empty:
+            try:
+                self.profiler.rows(rows_in=len(frequent_itemsets))
+                with self.profiler.span('association_rules'):
+                    rules = association_rules(frequent_itemsets[['support', 'itemsets']], metric="confidence", min_threshold=min_confidence)
+                # 添加单量列
+                rules['单量'] = (rules['support'] * n_transactions).round().astype(int)
+                # 前件、后件转为分隔字符串并添加商品名称列
+                rules = compact_rules(rules, item_name_mapping)
+                self.profiler.rows(rows_out=len(rules))
+                # 打印关联规则
+                self.log("\n关联规则结果：")
+                self.log("字段说明：")
+                self.log("- antecedents: 前件（规则的X部分，商家编码）")
+                self.log("- consequents: 后件（规则的Y部分，商家编码）")
+                self.log("- support: 支持度（规则出现的订单占比）")
+                self.log("- confidence: 置信度（规则的可靠性）")
+                self.log("- lift: 提升度（规则的强度，>1表示正相关）")
+                self.log("- 前件商品名称: 前件的货品名称")
+                self.log("- 后件商品名称: 后件的货品名称")
+                self.log("- 单量: 购买该规则组合的订单数（支持度×总订单数）")
+                if not rules.empty:
+                    self.log(f"共 {len(rules)} 条关联规则，置信度最高的 {min(LOG_ROWS, len(rules))} 条：")
+                    self.log(str(rules[['antecedents', 'consequents', 'support', 'confidence', 'lift', '前件商品名称', '后件商品名称', '单量']].nlargest(LOG_ROWS, 'confidence')))
+                    # 保存关联规则
+                    with self.profiler.span('export'):
+                        rules_output_file = self.export_table(rules, '最终结果_association_rules')
+                    self.log(f"\n关联规则已保存到：{rules_output_file}")
+                    # 更新推荐索引，正在运行的 rule_index.py serve 会自动加载新索引
+                    with self.profiler.span('rule_index'):
+                        index = RuleIndex.from_rules(rules, item_name_mapping)
+                        index_file = index.save(os.path.join(self.data_dir, RULE_INDEX_FILE))
+                    self.log(f"推荐索引已更新：{index_file}（{len(index.entries)} 个前件），"
+                             f"可用 python rule_index.py query --index \"{index_file}\" 商家编码 查询")
+                else:
+                    self.log(f"没有找到满足最小置信度（{min_confidence:.2f}）的关联规则，请尝试降低 min_confidence（例如 0.5）或检查频繁项集！")
+                    self.log("建议：检查频繁项集是否包含足够的多商品组合（项集大小≥2）。")
+            except Exception as e:
+                self.log(f"生成关联规则时发生错误: {str(e)}")
+                self.log("建议：检查频繁项集是否为空或只包含单商品项集。尝试降低 min_support（例如 0.005）或 min_confidence（例如 0.5）。")
+        else:
+            self.log("无法生成关联规则，因为没有频繁项集。")
+            self.log("建议：降低 min_support（例如 0.005）或检查数据清洗步骤，确保事务包含多种商品。")
+        self.log("\n" + "="*50)
@@ -0,0 +1,122 @@
+# apriori_core.py
+"""商品关联性分析的数据清洗与编码函数，不依赖界面，供 AprioriApp 和增量计数库共用。"""
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import apriori, fpgrowth, association_rules
+from scipy.sparse import csr_matrix
+
+from rule_export import itemset_strings
+from exclusion_rules import EXCLUSION_RULES, ExclusionMatcher
+from mining_preflight import plan_mining
+
+REQUIRED_COLUMNS = ['订单编号', '店铺', '客户编号', '商家编码', '货品名称']
+# 无效商家编码：与 exclusion_rules.EXCLUSION_RULES 中的某条完全相同
+INVALID_CODE_MATCHER = ExclusionMatcher(EXCLUSION_RULES, mode='exact', case_sensitive=True)
+# 可用于分区挖掘的字段
+PARTITION_COLUMNS = ['店铺', '客户编号']
+# 编号和名称统一为字符串，避免同一编码在不同文件中被推断为数字或文本
+TEXT_COLUMNS = ['订单编号', '客户编号', '商家编码', '货品名称']
+
+
+def read_order_items(file):
+    """读取单个订单文件的必需字段，统一字段类型并过滤无效商家编码"""
+    # 读取时直接按文本解析：先解析为数字再转换时，含空值的列已变成浮点数，编号会变成 '123.0'
+    df = pd.read_excel(file, usecols=REQUIRED_COLUMNS, dtype={col: str for col in TEXT_COLUMNS})
+    return df[~INVALID_CODE_MATCHER.mask(df['商家编码'])]
+
+
+def concat_order_items(frames):
+    """合并多个订单数据，店铺字段转为分类类型"""
+    merged_df = pd.concat(frames, ignore_index=True)
+    merged_df['店铺'] = merged_df['店铺'].astype('category')
+    return merged_df
+
+
+def keep_multi_row_orders(df):
+    """仅保留包含多条记录的订单"""
+    order_counts = df['订单编号'].value_counts()
+    valid_orders = order_counts[order_counts > 1].index
+    return df[df['订单编号'].isin(valid_orders)]
+
+
+def dedupe_order_items(df):
+    """在每个订单内对商家编码去重（保留第一条），并仅保留去重后包含多种商品的订单。
+
+    返回 (清洗后的数据, 每个订单的商品种类数)。结果按订单编号排序，订单内保持原有顺序。
+    """
+    df_cleaned = df.sort_values('订单编号', kind='stable').drop_duplicates(subset=['订单编号', '商家编码'], keep='first')
+    order_item_counts = df_cleaned.groupby('订单编号')['商家编码'].nunique()
+    valid_orders = order_item_counts[order_item_counts > 1].index
+    df_cleaned = df_cleaned[df_cleaned['订单编号'].isin(valid_orders)].reset_index(drop=True)
+    return df_cleaned, order_item_counts
+
+
+def clean_order_items(frames):
+    """按 data_clean / data_clean2 的规则合并并清洗多个订单数据"""
+    if not frames:
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    merged_df = keep_multi_row_orders(concat_order_items(frames))
+    df_cleaned, _ = dedupe_order_items(merged_df)
+    return df_cleaned
+
+
+def build_item_name_mapping(df):
+    """商家编码到货品名称的映射（取每个编码第一次出现的名称）"""
+    return df[['商家编码', '货品名称']].drop_duplicates(subset=['商家编码']).set_index('商家编码')['货品名称'].to_dict()
+
+
+def one_hot_encode(df, sparse=False):
+    """将（订单编号，商家编码）明细转换为布尔 one-hot 矩阵，每行一个订单，每列一个商家编码（按编码排序）。
+
+    sparse 为 True 时返回稀疏 DataFrame，内存只与非零元素数有关（供 FP-Growth 使用）。
+    """
+    pairs = df[['订单编号', '商家编码']].drop_duplicates()
+    order_idx, _ = pd.factorize(pairs['订单编号'], sort=True)
+    item_idx, items = pd.factorize(pairs['商家编码'], sort=True)
+    shape = (order_idx.max() + 1 if len(order_idx) else 0, len(items))
+    if sparse:
+        matrix = csr_matrix((np.ones(len(pairs), dtype=np.int8), (order_idx, item_idx)), shape=shape)
+        return pd.DataFrame.sparse.from_spmatrix(matrix, columns=items).astype(pd.SparseDtype(bool, False))
+    matrix = np.zeros(shape, dtype=bool)
+    matrix[order_idx, item_idx] = True
+    return pd.DataFrame(matrix, columns=items)
+
+
+def annotate_itemsets(frequent_itemsets, item_name_mapping, n_transactions):
+    """为频繁项集添加项集大小、商品名称和单量列"""
+    frequent_itemsets['项集大小'] = frequent_itemsets['itemsets'].apply(len)
+    frequent_itemsets['商品名称'] = itemset_strings(frequent_itemsets['itemsets'], item_name_mapping)[1]
+    frequent_itemsets['单量'] = (frequent_itemsets['support'] * n_transactions).round().astype(int)
+    return frequent_itemsets
+
+
+def mine_partition(partition, df, min_support=None, min_confidence=0.6, budget=None):
+    """挖掘单个分区的频繁项集和关联规则（供进程池调用）。
+
+    budget 不为 None 时先做挖掘前预检，超出内存预算时自动提高支持度或改用 FP-Growth。
+    返回 (分区值, 事务数, 最小支持度, 频繁项集数, 关联规则)。
+    """
+    n_transactions = df['订单编号'].nunique()
+    if min_support is None:
+        min_support = max(1 / n_transactions, 0.01)
+    engine, sparse = apriori, False
+    if budget is not None:
+        plan = plan_mining(df['订单编号'], df['商家编码'], min_support, budget=budget)
+        min_support, sparse = plan['min_support'], plan['sparse']
+        if plan['engine'] == 'fpgrowth':
+            engine = fpgrowth
+    frequent_itemsets = engine(one_hot_encode(df, sparse=sparse), min_support=min_support, use_colnames=True)
+    if (frequent_itemsets['itemsets'].map(len) >= 2).any():
+        rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
+    else:
+        rules = pd.DataFrame(columns=['antecedents', 'consequents', 'support', 'confidence', 'lift'])
+    return partition, n_transactions, min_support, len(frequent_itemsets), rules
+
+
+def write_snapshot(df, path):
+    """按扩展名将数据快照写为 Parquet 或 CSV"""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
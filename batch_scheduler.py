@@ -0,0 +1,339 @@
+# batch_scheduler.py
+"""多个月份的批量处理（补跑历史数据）。
+
+清单（JSON）列出每个月的任务，在进程池中并发运行 order_pipeline.run_job，同时运行的任务数不超过 --workers：
+
+    {
+        "out": "补跑结果",
+        "backend": "pandas",
+        "jobs": [
+            {"name": "2025-05", "job": "combined", "orders": ["5月订单1.xlsx", "5月订单2.xlsx"],
+             "inventory": "5月库存.xlsx", "shipping": "发货数据.xlsx",
+             "foshan_sheet": "5月佛山", "jinan_sheet": "5月济南"},
+            {"name": "2025-06", "orders": ["6月订单.xlsx"], "inventory": "6月库存.xlsx", "shipping": "发货数据.xlsx",
+             "foshan_sheet": "6月佛山", "jinan_sheet": "6月济南", "backend": "duckdb"}
+        ]
+    }
+
+job 默认为 fee，backend、partition_by_month（按月份拆分结果）、format（结果格式 xlsx/csv/parquet）
+默认为清单顶层的设置（pandas、不拆分、xlsx），
+sheet 名称默认为佛山发货数据、济南发货数据；
+相对路径相对于清单文件所在目录。每个任务的结果和日志（batch.log）保存在 输出目录/任务名称/ 下。
+
+多个任务共用的库存文件、发货数据文件（各任务用到的 sheet）只解析一次，保存为输出目录下 .batch_cache/ 中的
+pickle（按文件路径、大小和修改时间命名，文件不变时下次运行直接复用），任务读取 pickle 而不再解析 Excel；
+解析也在进程池中进行，某个任务用到的文件解析完成后该任务即可开始。
+
+各任务的状态（pending/running/done/failed）、用时、输出文件和错误信息保存在 输出目录/batch_status.json，
+每次状态变化都会更新。再次运行同一清单时，已完成且输入文件和参数都没有变化的任务直接跳过，
+只运行失败、中断或输入有变化的任务；--force 全部重新运行。
+
+每个任务完成后，其目录下的超区发货汇总（summary_cube.py）合并到 输出目录/超区发货汇总.pkl（同时导出 Excel），
+合并在主进程中依次进行，各月份的汇总可以在同一个文件中上卷、下钻。
+
+命令行用法：
+    python batch_scheduler.py 补跑清单.json --workers 4
+    python batch_scheduler.py 补跑清单.json --status    # 只显示各任务状态
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from itemset_cache import fingerprint_files
+from order_pipeline import (JOB_TYPES, BACKENDS, OUTPUT_FORMATS, FOSHAN_SHEET, JINAN_SHEET, PARSED_SUFFIX,
+                            MERCHANT_CODE_EXCLUSION, PipelineError, read_sheet, run_job)
+from summary_cube import CUBE_FILE, CUBE_EXPORT_FILE, SummaryCube
+
+STATUS_FILE = 'batch_status.json'
+CACHE_DIR = '.batch_cache'
+JOB_LOG_FILE = 'batch.log'
+
+
+def load_manifest(path, out=None):
+    """读取清单，返回 (输出目录, [任务])；任务中的路径转换为绝对路径并补全默认值"""
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def resolve(file):
+        return os.path.normpath(os.path.join(base_dir, file))
+
+    output_dir = os.path.abspath(out) if out else resolve(manifest.get('out', 'batch_output'))
+    default_backend = manifest.get('backend', 'pandas')
+    default_partition = bool(manifest.get('partition_by_month', False))
+    default_format = manifest.get('format', 'xlsx')
+    jobs, names = [], set()
+    for i, entry in enumerate(manifest.get('jobs', []), 1):
+        name = str(entry.get('name') or entry.get('month') or f'job{i}')
+        if name in names:
+            raise PipelineError(f"清单中的任务名称重复: {name}")
+        names.add(name)
+        job = {
+            'name': name,
+            'job': entry.get('job', 'fee'),
+            'backend': entry.get('backend', default_backend),
+            'orders': [resolve(file) for file in entry.get('orders', [])],
+            'inventory': resolve(entry['inventory']) if entry.get('inventory') else None,
+            'shipping': resolve(entry['shipping']) if entry.get('shipping') else None,
+            'foshan_sheet': entry.get('foshan_sheet', FOSHAN_SHEET),
+            'jinan_sheet': entry.get('jinan_sheet', JINAN_SHEET),
+            'partition_by_month': bool(entry.get('partition_by_month', default_partition)),
+            'format': entry.get('format', default_format),
+        }
+        if job['job'] not in JOB_TYPES:
+            raise PipelineError(f"任务 {name}: 未知的任务类型 {job['job']}，可选 {', '.join(JOB_TYPES)}")
+        if job['backend'] not in BACKENDS:
+            raise PipelineError(f"任务 {name}: 未知的执行后端 {job['backend']}，可选 {', '.join(BACKENDS)}")
+        if job['format'] not in OUTPUT_FORMATS:
+            raise PipelineError(f"任务 {name}: 未知的结果格式 {job['format']}，可选 {', '.join(OUTPUT_FORMATS)}")
+        if not job['orders'] or not job['inventory']:
+            raise PipelineError(f"任务 {name}: 需要订单文件和库存文件")
+        if job['job'] != 'abnormal' and not job['shipping']:
+            raise PipelineError(f"任务 {name}: 费用数据需要发货数据文件")
+        jobs.append(job)
+    if not jobs:
+        raise PipelineError("清单中没有任务！")
+    return output_dir, jobs
+
+
+def input_files(job):
+    files = job['orders'] + [job['inventory']]
+    if job['job'] != 'abnormal':
+        files.append(job['shipping'])
+    return files
+
+
+def job_fingerprint(job):
+    """任务参数、输入文件（路径、大小、修改时间）和排除规则的指纹；输入文件缺失时返回 None"""
+    try:
+        files = fingerprint_files(input_files(job), MERCHANT_CODE_EXCLUSION)
+    except OSError:
+        return None
+    return hashlib.sha1(json.dumps([job, files], sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def shared_inputs(jobs):
+    """多个任务共用的输入：返回 {(类型, 文件): 用到的 sheet 名称（库存为空）}"""
+    users = {}
+    for job in jobs:
+        users.setdefault(('inventory', job['inventory']), []).append(job)
+        if job['job'] != 'abnormal':
+            users.setdefault(('shipping', job['shipping']), []).append(job)
+    shared = {}
+    for (kind, path), using in users.items():
+        if len(using) > 1:
+            sheets = set()
+            if kind == 'shipping':
+                for job in using:
+                    sheets.update([job['foshan_sheet'], job['jinan_sheet']])
+            shared[(kind, path)] = sorted(sheets)
+    return shared
+
+
+def parsed_path(cache_dir, kind, path, sheets):
+    digest = hashlib.sha1(json.dumps([kind, fingerprint_files([path]), sheets], ensure_ascii=False).encode('utf-8'))
+    return os.path.join(cache_dir, f"{kind}_{digest.hexdigest()[:16]}{PARSED_SUFFIX}")
+
+
+def parse_input(kind, path, sheets, target):
+    """进程池中执行：解析库存文件或发货数据的各 sheet，保存为 pickle（先写临时文件，完成后改名）"""
+    if kind == 'inventory':
+        parsed = pd.read_excel(path)
+    else:
+        parsed = {sheet: read_sheet(path, sheet) for sheet in sheets}
+    temp = f"{target}.{os.getpid()}.tmp"
+    pd.to_pickle(parsed, temp)
+    os.replace(temp, target)
+    return target
+
+
+def merge_cube(output_dir, job_cube):
+    """任务的汇总合并到输出目录的汇总文件"""
+    cube = SummaryCube(os.path.join(output_dir, CUBE_FILE))
+    cube.merge(SummaryCube(job_cube))
+    cube.save()
+    cube.export(os.path.join(output_dir, CUBE_EXPORT_FILE))
+
+
+def run_batch_job(job, inputs, output_dir):
+    """进程池中执行：运行一个任务，日志写入任务目录下的 batch.log，返回 {结果类型: 文件}"""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, JOB_LOG_FILE), 'w', encoding='utf-8') as log_file:
+        def log(message):
+            log_file.write(f"{time.strftime('%H:%M:%S')} {message}\n")
+            log_file.flush()
+        try:
+            return run_job(job['job'], inputs, output_dir, log=log, backend=job['backend'],
+                           partition_by_month=job['partition_by_month'], output_format=job['format'])
+        except Exception:
+            log_file.write(traceback.format_exc())
+            raise
+
+
+class BatchStatus:
+    """batch_status.json：{任务名称: {status, fingerprint, outputs, error, seconds, finished_at}}"""
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.jobs = json.load(f).get('jobs', {})
+            except (OSError, ValueError):
+                self.jobs = {}
+
+    def save(self):
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'updated_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'jobs': self.jobs}, f,
+                      ensure_ascii=False, indent=2)
+        os.replace(temp, self.path)
+
+    def get(self, name):
+        return self.jobs.get(name, {'status': 'pending'})
+
+    def update(self, name, **fields):
+        self.jobs[name] = {**self.get(name), **fields}
+        self.save()
+
+    def is_done(self, job, fingerprint):
+        entry = self.get(job['name'])
+        return (entry['status'] == 'done' and fingerprint is not None and entry.get('fingerprint') == fingerprint
+                and all(os.path.exists(path) for path in entry.get('outputs', {}).values()))
+
+    def format_table(self, jobs):
+        lines = [f"{'任务':<16}{'状态':<10}{'用时(s)':>10}  说明"]
+        for job in jobs:
+            entry = self.get(job['name'])
+            seconds = f"{entry['seconds']:.1f}" if entry.get('seconds') is not None else '-'
+            note = entry.get('error') or ', '.join(entry.get('outputs', {}).values())
+            lines.append(f"{job['name']:<16}{entry['status']:<10}{seconds:>10}  {note.splitlines()[0] if note else ''}")
+        return '\n'.join(lines)
+
+
+def run_batch(output_dir, jobs, workers=None, force=False, log=print):
+    """运行清单中的任务，返回 BatchStatus；已完成且输入没有变化的任务跳过（force 时全部重新运行）"""
+    os.makedirs(output_dir, exist_ok=True)
+    status = BatchStatus(os.path.join(output_dir, STATUS_FILE))
+    fingerprints = {job['name']: job_fingerprint(job) for job in jobs}
+    todo = []
+    for job in jobs:
+        if not force and status.is_done(job, fingerprints[job['name']]):
+            log(f"[{job['name']}] 已完成，跳过")
+        else:
+            status.update(job['name'], status='pending', error=None)
+            todo.append(job)
+    if not todo:
+        return status
+
+    cache_dir = os.path.join(output_dir, CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    shared, sheets_needed = {}, {}
+    for (kind, path), sheets in shared_inputs(todo).items():
+        if os.path.exists(path):
+            shared[(kind, path)] = parsed_path(cache_dir, kind, path, sheets)
+            sheets_needed[(kind, path)] = sheets
+
+    def needs(job):
+        keys = [('inventory', job['inventory'])]
+        if job['job'] != 'abnormal':
+            keys.append(('shipping', job['shipping']))
+        return [key for key in keys if key in shared]
+
+    workers = workers or min(len(todo), os.cpu_count() or 1)
+    log(f"运行 {len(todo)} 个任务（共 {len(jobs)} 个），进程数 {workers}，共用输入 {len(shared)} 个")
+    ready, failed_inputs = set(), {}
+    waiting = list(todo)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (kind, path), target in shared.items():
+            if os.path.exists(target):
+                ready.add((kind, path))
+                log(f"复用已解析的 {os.path.basename(path)}")
+            else:
+                running[pool.submit(parse_input, kind, path, sheets_needed[(kind, path)], target)] = ('parse', (kind, path))
+
+        def submit_ready():
+            for job in list(waiting):
+                keys = needs(job)
+                broken = [key for key in keys if key in failed_inputs]
+                if broken:
+                    waiting.remove(job)
+                    error = f"读取 {os.path.basename(broken[0][1])} 失败: {failed_inputs[broken[0]]}"
+                    status.update(job['name'], status='failed', error=error, seconds=None)
+                    log(f"[{job['name']}] 失败: {error}")
+                elif all(key in ready for key in keys):
+                    waiting.remove(job)
+                    inputs = {'orders': job['orders'], 'inventory': job['inventory'], 'shipping': job['shipping'],
+                              'foshan_sheet': job['foshan_sheet'], 'jinan_sheet': job['jinan_sheet']}
+                    for kind, path in keys:
+                        inputs[kind] = shared[(kind, path)]
+                    future = pool.submit(run_batch_job, job, inputs, os.path.join(output_dir, job['name']))
+                    running[future] = ('job', (job, time.time()))
+                    status.update(job['name'], status='running', started_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+                    log(f"[{job['name']}] 开始运行")
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, payload = running.pop(future)
+                error = future.exception()
+                if kind == 'parse':
+                    if error:
+                        failed_inputs[payload] = error
+                    else:
+                        ready.add(payload)
+                        log(f"已解析 {os.path.basename(payload[1])}")
+                    continue
+                job, started = payload
+                seconds = round(time.time() - started, 2)
+                finished_at = time.strftime('%Y-%m-%d %H:%M:%S')
+                if error:
+                    status.update(job['name'], status='failed', error=str(error), seconds=seconds, finished_at=finished_at)
+                    log(f"[{job['name']}] 失败（{seconds:.1f}s）: {error}")
+                else:
+                    outputs = future.result()
+                    if 'cube' in outputs:
+                        merge_cube(output_dir, outputs['cube'])
+                    status.update(job['name'], status='done', error=None, outputs=outputs, seconds=seconds,
+                                  finished_at=finished_at, fingerprint=fingerprints[job['name']])
+                    log(f"[{job['name']}] 完成（{seconds:.1f}s）")
+            submit_ready()
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多个月份的超区发货订单批量处理')
+    parser.add_argument('manifest', help='任务清单（JSON）')
+    parser.add_argument('--out', help='输出目录（默认为清单中的 out）')
+    parser.add_argument('--workers', type=int, help='同时运行的任务数（默认为 CPU 核数）')
+    parser.add_argument('--force', action='store_true', help='已完成的任务也重新运行')
+    parser.add_argument('--status', action='store_true', help='只显示各任务状态')
+    args = parser.parse_args(argv)
+
+    try:
+        output_dir, jobs = load_manifest(args.manifest, args.out)
+    except (OSError, ValueError, KeyError, PipelineError) as e:
+        print(f"错误：读取清单失败: {e}")
+        return 1
+    if args.status:
+        status = BatchStatus(os.path.join(output_dir, STATUS_FILE))
+    else:
+        status = run_batch(output_dir, jobs, workers=args.workers, force=args.force)
+    print(status.format_table(jobs))
+    return 1 if any(status.get(job['name'])['status'] == 'failed' for job in jobs) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,365 @@
+# benchmark.py
+"""各处理流程的性能基准测试（无界面运行）。
+
+用 synthetic_data 生成（或复用）指定行数的模拟数据，依次调用各窗口的处理步骤方法（combined 调用 order_pipeline.run_job），
+记录每个步骤的耗时、CPU 时间、吞吐量（输入订单行数/秒）和峰值内存，以及窗口自身的分步骤性能记录
+（read_excel、iterrows、to_excel 等子操作的耗时，见 instrumentation.py），
+结果保存为 benchmark_results/ 下的 JSON 文件，并与上一次（或指定的）结果对比，耗时变慢超过阈值的步骤标记为回退。
+
+命令行用法：
+    python benchmark.py --rows 10000 100000 --pipelines fee abnormal apriori
+    python benchmark.py --rows 100000 --pipelines fee abnormal combined   # 对比分开运行与合并运行（order_pipeline）
+    python benchmark.py --rows 1000000 --pipelines combined --backends pandas duckdb polars   # 对比 order_pipeline 的执行后端
+    python benchmark.py --rows 100000 --compare benchmark_results/20250601_120000_abc1234.json
+    python benchmark.py --rows 10000 --memory tracemalloc   # 按 Python 分配统计内存，耗时会明显偏高
+    python benchmark.py --startup 5 --pipelines              # 只测主菜单启动和各模块首次打开的耗时
+
+峰值内存默认在后台线程中每 20 毫秒采样一次进程内存（RSS），对耗时几乎没有影响；
+tracemalloc 能精确统计每个步骤的 Python/numpy 分配峰值，但会使耗时增加数倍。
+只有内存统计方式相同的结果之间才对比耗时。
+
+--startup N 在全新的子进程中测量主菜单显示耗时（从启动 Python 解释器算起）和每个模块首次打开的耗时，
+分别测量冷启动（点击时才导入模块）和后台预加载完成后打开两种情况，各重复 N 次取中位数。
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# 无界面运行：必须在导入 PyQt5 之前设置
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pandas as pd
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+from synthetic_data import generate_dataset, FOSHAN_SHEET, JINAN_SHEET
+from instrumentation import RssSampler
+from order_pipeline import BACKENDS
+
+PIPELINES = ('fee', 'abnormal', 'apriori', 'combined')
+RESULTS_DIR = 'benchmark_results'
+DATA_DIR = 'benchmark_data'
+# 步骤耗时超过对比结果的该倍数时标记为回退
+REGRESSION_THRESHOLD = 1.10
+# 耗时低于该值（秒）的步骤波动较大，只显示不判定回退
+MIN_REGRESSION_SECONDS = 0.5
+APRIORI_MIN_SUPPORT = 0.01
+MEMORY_MODES = ('rss', 'tracemalloc', 'none')
+# 主菜单中打开各模块的方法
+STARTUP_ACTIONS = ('open_order_processor', 'open_apriori', 'open_fee')
+# 启动测量在子进程中运行（本进程已导入 pandas 等模块，无法测量冷启动）；
+# 参数：打开模块的方法名、父进程启动子进程的时间戳、是否等待后台预加载完成
+STARTUP_PROBE = '''
+import json, sys, time
+method, launched_at, warm = sys.argv[1], float(sys.argv[2]), sys.argv[3] == '1'
+from PyQt5.QtWidgets import QApplication
+import main_app
+app = QApplication(sys.argv[:1])
+window = main_app.MainApp()
+window.show()
+app.processEvents()
+menu_shown = time.time() - launched_at
+if warm:
+    main_app.warm_up_modules().join()
+start = time.perf_counter()
+getattr(window, method)()
+app.processEvents()
+print(json.dumps({'menu_shown': menu_shown, 'open': time.perf_counter() - start}))
+'''
+
+
+def _suppress_message_boxes(messages):
+    """弹窗会阻塞无界面运行：记录弹窗内容并直接返回"""
+    def record(kind):
+        def show(parent, title, text, *args, **kwargs):
+            messages.append(f"{kind}: {title}: {text}")
+            return QMessageBox.Ok
+        return staticmethod(show)
+    for kind in ('information', 'warning', 'critical'):
+        setattr(QMessageBox, kind, record(kind))
+
+
+class StageTimer:
+    """依次运行流程步骤，记录每个步骤的耗时、CPU 时间和峰值内存"""
+
+    def __init__(self, pipeline, n_rows, memory_mode):
+        self.pipeline = pipeline
+        self.n_rows = n_rows
+        self.memory_mode = memory_mode
+        self.stages = []
+        self.failed = False
+
+    def _measure(self, func, *args, **kwargs):
+        """运行 func，返回 (结果, 峰值内存字节数)"""
+        if self.memory_mode == 'tracemalloc':
+            tracemalloc.reset_peak()
+            result = func(*args, **kwargs)
+            return result, tracemalloc.get_traced_memory()[1]
+        if self.memory_mode == 'rss':
+            with RssSampler() as sampler:
+                result = func(*args, **kwargs)
+            return result, sampler.peak
+        return func(*args, **kwargs), None
+
+    def run(self, name, func, *args, **kwargs):
+        if self.failed:
+            return None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result, peak = self._measure(func, *args, **kwargs)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        ok = result is not None
+        self.stages.append({
+            'stage': name,
+            'seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'rows_per_second': round(self.n_rows / wall, 1) if wall > 0 else None,
+            'peak_memory_mb': round(peak / 1024 ** 2, 2) if peak is not None else None,
+            'ok': ok,
+        })
+        print(f"  {self.pipeline}.{name}: {wall:.2f} 秒"
+              + (f"，峰值内存 {peak / 1024 ** 2:.1f} MB" if peak is not None else "")
+              + ("" if ok else "（失败）"), flush=True)
+        self.failed = not ok
+        return result
+
+
+def bench_fee(dataset, work_dir, timer, args):
+    import fee
+    window = fee.OrderDataProcessor()
+    window.order_files = dataset['orders']
+    window.inventory_file = dataset['inventory']
+    window.shipping_file = dataset['shipping']
+    window.foshan_sheet, window.jinan_sheet = FOSHAN_SHEET, JINAN_SHEET
+    window.output_dir = work_dir
+    path = timer.run('data_clean_1', window.data_clean_1)
+    path = timer.run('data_clean_2', window.data_clean_2, path)
+    path = timer.run('abnormal_process', window.abnormal_process, path)
+    path = timer.run('filter_merchant_codes', window.filter_merchant_codes, path)
+    path = timer.run('append_shipping_data', window.append_shipping_data, path)
+    timer.run('process_final_shipping_data', window.process_final_shipping_data, path)
+    window.deleteLater()
+    return window.profiler
+
+
+def bench_abnormal(dataset, work_dir, timer, args):
+    import abnormal_order_data
+    window = abnormal_order_data.OrderDataProcessor()
+    window.order_files = dataset['orders']
+    window.inventory_file = dataset['inventory']
+    window.output_dir = work_dir
+    path = timer.run('data_clean_1', window.data_clean_1)
+    path = timer.run('data_clean_2', window.data_clean_2, path)
+    path = timer.run('abnormal_process', window.abnormal_process, path)
+    # filter_merchant_codes 没有返回值，以输出文件是否生成判断成功
+    output_file = os.path.join(work_dir, "最终结果_缺货导致的超区发货数据.xlsx")
+    timer.run('filter_merchant_codes', lambda: window.filter_merchant_codes(path) or
+              (output_file if os.path.exists(output_file) else None))
+    window.deleteLater()
+    return window.profiler
+
+
+def bench_combined(dataset, work_dir, timer, args):
+    import order_pipeline
+    from instrumentation import StageProfiler
+    profiler = StageProfiler()
+    inputs = {'orders': dataset['orders'], 'inventory': dataset['inventory'], 'shipping': dataset['shipping'],
+              'foshan_sheet': FOSHAN_SHEET, 'jinan_sheet': JINAN_SHEET}
+
+    def run(backend):
+        try:
+            with profiler.stage(backend):
+                return order_pipeline.run_job('combined', inputs, work_dir, log=lambda message: None,
+                                              profiler=profiler, backend=backend)
+        except order_pipeline.PipelineError as e:
+            print(f"  combined: {e}")
+            return None
+    # 每个后端为一个步骤，步骤名为后端名称（只测一个后端时与之前的结果一样为 combined）
+    for backend in args.backends:
+        timer.run('combined' if args.backends == ['pandas'] else backend, run, backend)
+    return profiler
+
+
+def bench_apriori(dataset, work_dir, timer, args):
+    import apriori_app
+    window = apriori_app.AprioriApp()
+    window.file_paths = dataset['orders']
+    window.data_dir = work_dir
+    window.itemset_cache.cache_dir = os.path.join(work_dir, 'itemset_cache')
+    merged = timer.run('data_clean', window.data_clean)
+    cleaned = timer.run('data_clean2', window.data_clean2, merged)
+    mined = timer.run('mine_itemsets', window.mine_itemsets, cleaned, args.min_support)
+    if mined is not None:
+        timer.run('generate_rules', lambda: window.generate_rules(
+            mined['frequent_itemsets'], mined['item_name_mapping'], mined['n_transactions'], 0.3) or True)
+    window.deleteLater()
+    return window.profiler
+
+
+BENCHMARKS = {'fee': bench_fee, 'abnormal': bench_abnormal, 'apriori': bench_apriori, 'combined': bench_combined}
+
+
+def profile_breakdown(profiler):
+    """窗口性能记录中的步骤和子操作耗时"""
+    return [{'name': record['name'], 'kind': record['kind'], 'depth': record['depth'],
+             'seconds': round(record['seconds'], 4), 'cpu_seconds': round(record['cpu_seconds'], 4),
+             'rows_in': record['rows_in'], 'rows_out': record['rows_out']}
+            for record in profiler.summary_rows()]
+
+
+def measure_startup(repeats):
+    """测量主菜单显示和各模块首次打开的耗时（中位数），返回与流程步骤相同格式的记录"""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    menu_samples, stages = [], []
+    for method in STARTUP_ACTIONS:
+        for warm in (False, True):
+            samples = []
+            for _ in range(repeats):
+                launched_at = time.time()
+                completed = subprocess.run([sys.executable, '-c', STARTUP_PROBE, method, str(launched_at), '1' if warm else '0'],
+                                           capture_output=True, text=True, cwd=repo_dir, env=env, timeout=600)
+                if completed.returncode != 0:
+                    raise RuntimeError(f"启动测量失败（{method}）：{completed.stderr.strip()[-500:]}")
+                sample = json.loads(completed.stdout.strip().splitlines()[-1])
+                menu_samples.append(sample['menu_shown'])
+                samples.append(sample['open'])
+            name = f"{method}_{'warm' if warm else 'cold'}"
+            seconds = statistics.median(samples)
+            stages.append({'stage': name, 'seconds': round(seconds, 4), 'cpu_seconds': None,
+                           'rows_per_second': None, 'peak_memory_mb': None, 'ok': True})
+            print(f"  startup.{name}: {seconds:.2f} 秒", flush=True)
+    seconds = statistics.median(menu_samples)
+    print(f"  startup.menu_shown: {seconds:.2f} 秒", flush=True)
+    stages.insert(0, {'stage': 'menu_shown', 'seconds': round(seconds, 4), 'cpu_seconds': None,
+                      'rows_per_second': None, 'peak_memory_mb': None, 'ok': True})
+    return stages
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+
+def environment_info():
+    import numpy
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def find_previous_result(results_dir, exclude=None):
+    files = sorted(glob.glob(os.path.join(results_dir, '*.json')))
+    files = [f for f in files if os.path.abspath(f) != os.path.abspath(exclude or '')]
+    return files[-1] if files else None
+
+
+def compare_results(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """逐步骤对比耗时，返回回退的步骤列表"""
+    if baseline.get('memory_mode') != current['memory_mode']:
+        print(f"\n对比结果的内存统计方式为 {baseline.get('memory_mode')}，与本次（{current['memory_mode']}）不同，耗时不可比，跳过对比。")
+        return []
+    baseline_stages = {(run['pipeline'], run['rows'], stage['stage']): stage
+                       for run in baseline['runs'] for stage in run['stages'] if stage['ok']}
+    regressions = []
+    print(f"\n与 {baseline['revision']}（{baseline['timestamp']}）对比：")
+    for run in current['runs']:
+        for stage in run['stages']:
+            previous = baseline_stages.get((run['pipeline'], run['rows'], stage['stage']))
+            if previous is None or not previous['seconds']:
+                continue
+            ratio = stage['seconds'] / previous['seconds']
+            flag = ''
+            if ratio > threshold and stage['seconds'] >= MIN_REGRESSION_SECONDS:
+                flag = '  <-- 回退'
+                regressions.append((run['pipeline'], run['rows'], stage['stage'], ratio))
+            print(f"  {run['pipeline']}.{stage['stage']} @ {run['rows']} 行: "
+                  f"{previous['seconds']:.2f} → {stage['seconds']:.2f} 秒（×{ratio:.2f}）{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='各处理流程的性能基准测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='订单明细行数，可指定多个（10000 ~ 10000000）')
+    parser.add_argument('--pipelines', nargs='*', choices=PIPELINES, default=list(PIPELINES))
+    parser.add_argument('--data-dir', default=DATA_DIR, help='模拟数据目录（已生成的数据会复用）')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='结果保存目录')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['pandas'],
+                        help='combined 流程使用的执行后端（order_pipeline），可指定多个依次运行')
+    parser.add_argument('--min-support', type=float, default=APRIORI_MIN_SUPPORT, help='商品关联分析的最小支持度')
+    parser.add_argument('--memory', choices=MEMORY_MODES, default='rss',
+                        help='峰值内存统计方式：rss 采样进程内存（默认），tracemalloc 精确但耗时偏高，none 不统计')
+    parser.add_argument('--compare', default='latest', help='对比的结果文件，默认对比结果目录中最近一次的结果')
+    parser.add_argument('--startup', type=int, default=0, metavar='N',
+                        help='测量主菜单启动和各模块首次打开的耗时，重复 N 次取中位数（默认不测量）')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    messages = []
+    _suppress_message_boxes(messages)
+    if args.memory == 'tracemalloc':
+        tracemalloc.start()
+
+    result = {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'revision': git_revision(),
+        'environment': environment_info(),
+        'memory_mode': args.memory,
+        'runs': [],
+    }
+    if args.startup > 0:
+        print(f"\n=== startup：重复 {args.startup} 次 ===", flush=True)
+        result['runs'].append({'pipeline': 'startup', 'rows': 0, 'stages': measure_startup(args.startup), 'ok': True})
+    for n_rows in args.rows if args.pipelines else []:
+        dataset = generate_dataset(args.data_dir, n_rows, args.seed)
+        for pipeline in args.pipelines:
+            # fee.py 的 resource_path 会把相对路径拼到程序目录下，因此使用绝对路径
+            work_dir = os.path.abspath(os.path.join(args.data_dir, f"output_rows{n_rows}_{pipeline}"))
+            shutil.rmtree(work_dir, ignore_errors=True)
+            os.makedirs(work_dir)
+            print(f"\n=== {pipeline}：{dataset['rows']} 行 ===", flush=True)
+            timer = StageTimer(pipeline, dataset['rows'], args.memory)
+            start = time.perf_counter()
+            profiler = BENCHMARKS[pipeline](dataset, work_dir, timer, args)
+            app.processEvents()
+            total = time.perf_counter() - start
+            result['runs'].append({'pipeline': pipeline, 'rows': dataset['rows'], 'total_seconds': round(total, 4),
+                                   'stages': timer.stages, 'breakdown': profile_breakdown(profiler),
+                                   'ok': not timer.failed})
+            print(f"  合计 {total:.2f} 秒，{dataset['rows'] / total:.0f} 行/秒", flush=True)
+    if args.memory == 'tracemalloc':
+        tracemalloc.stop()
+    result['messages'] = messages
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    result_file = os.path.join(args.results_dir, f"{time.strftime('%Y%m%d_%H%M%S')}_{result['revision']}.json")
+    baseline_file = find_previous_result(args.results_dir) if args.compare == 'latest' else args.compare
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到: {result_file}")
+
+    if baseline_file and os.path.exists(baseline_file):
+        with open(baseline_file, encoding='utf-8') as f:
+            regressions = compare_results(result, json.load(f))
+        if regressions:
+            print(f"\n{len(regressions)} 个步骤耗时增加超过 {REGRESSION_THRESHOLD - 1:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
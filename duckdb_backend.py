@@ -0,0 +1,151 @@
+# duckdb_backend.py
+"""order_pipeline 的 DuckDB 执行后端。
+
+仓库筛选、超区判断、库存透视与合并、商家编码筛选、发货数据合并和按订单编号去重，都在嵌入式 DuckDB 中以 SQL 执行：
+每一步只把参与计算的列（连同行号）注册给 DuckDB，查询返回行号、筛选标记或库存数值，
+再按行号从原 DataFrame 取出其余字段，因此字段类型、行顺序和索引都与 pandas 后端相同。
+
+DuckDB 按 CPU 核数多线程执行；中间结果超出内存上限时写入输出目录下的临时目录，运行结束后删除。
+省份提取和付款时间解析仍由 pandas 完成（Python 的 split() 和 parse_datetime 的格式检测在 SQL 中无法完全一致）。
+"""
+import shutil
+import tempfile
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from order_pipeline import (PandasBackend, FOSHAN_WAREHOUSE, JINAN_WAREHOUSE, JINAN_COVERAGE, MERCHANT_CODE_EXCLUSION,
+                            FOSHAN_SHEET, JINAN_SHEET, inventory_column_names, fill_inventory_columns)
+
+ROW = '__row'
+INVENTORY_VALUES = ['期初库存', '期末库存']
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class DuckDBBackend(PandasBackend):
+    """重写 order_pipeline.PandasBackend 的各个步骤方法，返回相同的 DataFrame"""
+
+    name = 'duckdb'
+
+    def __init__(self, work_dir=None, memory_limit=None, threads=None):
+        self.temp_dir = tempfile.mkdtemp(prefix='duckdb_tmp_', dir=work_dir)
+        config = {'temp_directory': self.temp_dir, 'preserve_insertion_order': False}
+        if memory_limit:
+            config['memory_limit'] = memory_limit
+        if threads:
+            config['threads'] = threads
+        self.con = duckdb.connect(config=config)
+
+    def close(self):
+        self.con.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _register(self, name, df, columns):
+        """注册只包含 columns 和行号（0..n-1）的视图"""
+        view = pd.DataFrame({col: df[col].to_numpy() for col in columns})
+        view.insert(0, ROW, np.arange(len(df)))
+        self.con.register(name, view)
+
+    def _query(self, sql, params=None, tables=()):
+        try:
+            return self.con.execute(sql, params or []).df()
+        finally:
+            for table in tables:
+                self.con.unregister(table)
+
+    def _mask(self, df, columns, condition, params=None):
+        """按 SQL 条件计算 df 每一行的筛选标记，返回与 df 索引对齐的布尔 Series（NULL 视为 False）"""
+        self._register('t', df, columns)
+        flags = self._query(f"SELECT coalesce({condition}, false) AS keep FROM t ORDER BY {ROW}", params, ['t'])
+        return pd.Series(flags['keep'].to_numpy(dtype=bool), index=df.index)
+
+    def filter_warehouses(self, df):
+        return df[self._mask(df, ['仓库'], '"仓库" IN (?, ?)', [FOSHAN_WAREHOUSE, JINAN_WAREHOUSE])]
+
+    def out_of_region(self, df):
+        condition = ('"省份" IS NULL'
+                     ' OR ("仓库" = $foshan AND list_contains($coverage, "省份"))'
+                     ' OR ("仓库" = $jinan AND NOT list_contains($coverage, "省份"))')
+        params = {'foshan': FOSHAN_WAREHOUSE, 'jinan': JINAN_WAREHOUSE, 'coverage': JINAN_COVERAGE}
+        return df[self._mask(df, ['仓库', '省份'], condition, params)]
+
+    def merge_inventory(self, abnormal_df, inventory_df):
+        abnormal_df = abnormal_df.assign(商家编码=abnormal_df['商家编码'].astype(str))
+        inventory_df = inventory_df.assign(货品编号=inventory_df['货品编号'].astype(str))
+        # 与 pivot_table 相同：列为（库存字段, 仓库名称）的全部组合，仓库名称排序，缺少的组合填 0
+        warehouses = sorted(inventory_df['仓库名称'].dropna().unique())
+        pivot_columns = [(value, warehouse) for value in INVENTORY_VALUES for warehouse in warehouses]
+        value_types = {value: 'BIGINT' if pd.api.types.is_integer_dtype(inventory_df[value]) else 'DOUBLE'
+                       for value in INVENTORY_VALUES}
+        sums = ', '.join(
+            f"CAST(coalesce(sum(CASE WHEN \"仓库名称\" = $w{i} THEN {_quote(value)} END), 0) AS {value_types[value]}) AS c{i}"
+            for i, (value, _) in enumerate(pivot_columns))
+        params = {f'w{i}': warehouse for i, (_, warehouse) in enumerate(pivot_columns)}
+        self._register('abnormal', abnormal_df, ['商家编码'])
+        self._register('inventory', inventory_df, ['货品编号', '仓库名称'] + INVENTORY_VALUES)
+        stock = self._query(f"""
+            WITH stock AS (
+                SELECT "货品编号", {sums} FROM inventory WHERE "仓库名称" IS NOT NULL GROUP BY "货品编号"
+            )
+            SELECT abnormal.{ROW}, {', '.join(f'stock.c{i}' for i in range(len(pivot_columns)))}
+            FROM abnormal LEFT JOIN stock ON abnormal."商家编码" = stock."货品编号"
+            ORDER BY abnormal.{ROW}
+        """, params, ['abnormal', 'inventory'])
+
+        merged_df = abnormal_df.reset_index(drop=True)
+        for i, name in enumerate(inventory_column_names(pivot_columns)):
+            # 与 merge 相同：有未匹配的行时整数列变为浮点数
+            column = stock[f'c{i}']
+            dtype = 'float64' if column.isna().any() or value_types[pivot_columns[i][0]] == 'DOUBLE' else 'int64'
+            merged_df[name] = column.astype(dtype).to_numpy()
+        return fill_inventory_columns(merged_df)
+
+    def exclude_merchant_codes(self, df):
+        df = df.assign(商家编码=df['商家编码'].astype(str))
+        pattern = MERCHANT_CODE_EXCLUSION.regex()
+        if pattern is None:
+            return df, df.iloc[:0]
+        excluded = self._mask(df, ['商家编码'], 'regexp_matches("商家编码", ?)', [pattern])
+        return df[~excluded], df[excluded]
+
+    def drop_untracked_orders(self, df):
+        return df[self._mask(df, ['物流单号'], '"物流单号" IS NOT NULL AND CAST("物流单号" AS VARCHAR) <> \'\'')]
+
+    def merge_shipping(self, df, shipping_df, prefix, jinan):
+        """按子单原始单号左连接发货数据，jinan 为 True 时只保留济南仓的记录、否则只保留非济南仓的记录"""
+        df = df.assign(子单原始单号=df['子单原始单号'].astype(str))
+        shipping_df = shipping_df.assign(原始单号=shipping_df['原始单号'].astype(str))
+        columns = [col for col in shipping_df.columns if col != '原始单号']
+        renamed = [f"{prefix}_{col}" for col in columns]
+        self._register('orders', df, ['子单原始单号', '仓库'])
+        self._register('shipping', shipping_df, ['原始单号'])
+        jinan_condition = 'coalesce(contains(CAST(orders."仓库" AS VARCHAR), \'济南\'), false)'
+        pairs = self._query(f"""
+            SELECT orders.{ROW} AS order_row, coalesce(shipping.{ROW}, -1) AS shipping_row,
+                   {'' if jinan else 'NOT '}{jinan_condition} AS keep
+            FROM orders LEFT JOIN shipping ON orders."子单原始单号" = shipping."原始单号"
+            ORDER BY orders.{ROW}, shipping.{ROW}
+        """, tables=['orders', 'shipping'])
+
+        # 先拼出完整的合并结果（未匹配的行为空值，字段类型与 merge 相同），再按标记筛选
+        left = df.iloc[pairs['order_row'].to_numpy()].reset_index(drop=True)
+        right = shipping_df[columns].set_axis(renamed, axis=1).reset_index(drop=True)
+        right = right.reindex(pairs['shipping_row'].to_numpy()).reset_index(drop=True)
+        merged = pd.concat([left, right], axis=1)
+        return merged[pairs['keep'].to_numpy(dtype=bool)], renamed
+
+    def split_shipping(self, df, foshan_df, jinan_df):
+        return {
+            FOSHAN_SHEET: self.merge_shipping(df, foshan_df, '佛山', jinan=False),
+            JINAN_SHEET: self.merge_shipping(df, jinan_df, '济南', jinan=True),
+        }
+
+    def dedupe_shipping_sheet(self, df):
+        first = self._mask(df, ['订单编号'], f'row_number() OVER (PARTITION BY "订单编号" ORDER BY {ROW}) = 1')
+        df = df[first]
+        columns_to_drop = [col for col in df.columns if '货品' in str(col) or '商家编码' in str(col)]
+        return df.drop(columns=columns_to_drop), columns_to_drop
@@ -0,0 +1,119 @@
+# exclusion_rules.py
+"""辅料商家编码（冰袋、干冰等）的排除规则，超区发货处理和商品关联性分析共用同一份规则列表。
+
+匹配方式：
+- substring：商家编码包含任意一条规则即排除（超区发货处理，默认不区分大小写）；
+- exact：商家编码与某条规则完全相同才排除（商品关联性分析）。
+
+规则是普通文本（不是正则表达式）。ExclusionMatcher.mask 对每个不同的商家编码只判断一次，再映射回各行，
+耗时与商家编码的种类数成正比、与行数无关；包含匹配用 Aho–Corasick 自动机，一次扫描同时匹配全部规则，
+规则增加到几百条时单个编码的判断耗时基本不变。
+
+ExclusionMatcher.signature() 包含规则列表和匹配方式，频繁项集缓存和批量任务的指纹都包含它，修改规则后旧缓存自动失效。
+"""
+import json
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+EXCLUSION_RULES = [
+    '250g冰袋*2+500g干冰*1',
+    '250g冰袋*4',
+    'XDJXN',
+    'XDJLW',
+]
+MATCH_MODES = ('substring', 'exact')
+# 正则表达式中需要转义的字符（DuckDB 的 RE2 和 Polars 的 regex 都不接受多余的转义，不能直接用 re.escape）
+REGEX_SPECIAL = set('\\.^$|?*+()[]{}')
+
+
+class AhoCorasick:
+    """多模式包含匹配：contains(text) 判断 text 是否包含任意一个模式"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [False]
+        for pattern in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(False)
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state] = True
+
+        # 按广度优先计算失败指针；某个状态的失败链上有模式结尾时，该状态也算匹配
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, target in self.goto[state].items():
+                queue.append(target)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[target] = self.goto[fallback].get(char, 0)
+                self.output[target] = self.output[target] or self.output[self.fail[target]]
+
+    def contains(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+class ExclusionMatcher:
+    """按规则判断商家编码是否应排除"""
+
+    def __init__(self, rules=None, mode='substring', case_sensitive=False):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"未知的匹配方式: {mode}，可选 {', '.join(MATCH_MODES)}")
+        self.rules = list(EXCLUSION_RULES if rules is None else rules)
+        self.mode = mode
+        self.case_sensitive = case_sensitive
+        normalized = [self._normalize(rule) for rule in self.rules]
+        self._automaton = AhoCorasick(normalized) if mode == 'substring' else None
+        self._exact = set(normalized)
+
+    def _normalize(self, text):
+        return text if self.case_sensitive else text.lower()
+
+    def matches(self, code):
+        text = self._normalize(code if isinstance(code, str) else str(code))
+        if self.mode == 'exact':
+            return text in self._exact
+        return self._automaton.contains(text)
+
+    def mask(self, values):
+        """values 中每个值是否应排除（空值不排除），返回与 values 索引对齐的布尔 Series"""
+        codes, uniques = pd.factorize(values)
+        flags = np.fromiter((self.matches(value) for value in uniques), dtype=bool, count=len(uniques))
+        result = np.zeros(len(codes), dtype=bool)
+        present = codes >= 0
+        result[present] = flags[codes[present]]
+        return pd.Series(result, index=values.index)
+
+    def signature(self):
+        """规则列表和匹配方式的文本表示，用于缓存指纹"""
+        return json.dumps([self.mode, self.case_sensitive, self.rules], ensure_ascii=False)
+
+    def regex(self):
+        """与 matches 等价的正则表达式（给 DuckDB、Polars 后端使用），没有规则时为 None。
+        不区分大小写时带 (?i) 前缀，完全匹配时整体锚定，调用方不需要再加匹配选项"""
+        if not self.rules:
+            return None
+        pattern = '|'.join(''.join('\\' + char if char in REGEX_SPECIAL else char for char in rule)
+                           for rule in self.rules)
+        if self.mode == 'exact':
+            pattern = f'^(?:{pattern})$'
+        return pattern if self.case_sensitive else '(?i)' + pattern
@@ -3,14 +3,25 @@ import os
 import pandas as pd
 import re
 from datetime import datetime
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, 
-                             QTextEdit, QFileDialog, QLabel, QProgressBar, QMessageBox, QInputDialog)
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+                             QTextEdit, QFileDialog, QLabel, QProgressBar, QMessageBox, QInputDialog, QCheckBox, QComboBox)
 from PyQt5.QtCore import Qt, pyqtSignal
 import logging
-
-# 设置日志记录
-logging.basicConfig(filename='app.log', level=logging.DEBUG, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from app_logging import lazy, setup_logging, set_log_level, log_level, LOG_LEVELS
+from instrumentation import StageProfiler, ProfilingControls, profiled_stage
+from order_pipeline import (FEE_ORDER_COLUMNS, missing_columns, combine_orders, drop_untracked_orders,
+                            add_province, add_month, filter_warehouses, out_of_region_mask, pivot_inventory,
+                            merge_inventory, missing_inventory, exclude_merchant_codes, merge_shipping, ships_from_jinan,
+                            unmatched_shipping, process_shipping_sheet, dedupe_shipping_sheet, available_backends, run_job,
+                            FOSHAN_WAREHOUSE, JINAN_WAREHOUSE, JINAN_COVERAGE, MERCHANT_CODE_EXCLUSION)
+from prefetch import ExcelPrefetcher
+from rule_export import EXPORT_FORMATS
+from summary_cube import update_cube
+from step_checkpoint import (StepCheckpoints, CHECKPOINT_DIR, INTERMEDIATE_SUFFIX, write_intermediate, read_intermediate,
+                             intermediate_sheet_names, export_excel)
+from workbook_probe import probe_workbook, describe_sheet
 
 def resource_path(relative_path):
     """获取打包后的资源路径"""
@@ -18,6 +29,19 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.dirname(__file__), relative_path)
 
+# 处理步骤（方法名），用于性能记录和单步骤剖析
+PIPELINE_STAGES = ['data_clean_1', 'data_clean_2', 'abnormal_process', 'filter_merchant_codes',
+                   'append_shipping_data', 'process_final_shipping_data']
+# 步骤失败时的提示：(失败说明, 日志, 建议)
+STEP_FAILURES = {
+    'data_clean_1': ("数据清洗失败", "Failed to clean data", "请检查输入文件"),
+    'data_clean_2': ("省份提取失败", "Failed to extract provinces", "请检查输入文件"),
+    'abnormal_process': ("异常数据处理失败", "Failed to process abnormal data", "请检查输入文件"),
+    'filter_merchant_codes': ("筛选商家编码失败", "Failed to filter merchant codes", "请检查输入文件"),
+    'append_shipping_data': ("追加发货数据失败", "Failed to append shipping data", "请检查输入文件"),
+    'process_final_shipping_data': ("去重及删除货品字段失败", "Failed to process final shipping data", "请检查输出文件"),
+}
+
 class OrderDataProcessor(QMainWindow):
     closed = pyqtSignal()
 
@@ -29,6 +53,9 @@ class OrderDataProcessor(QMainWindow):
         self.foshan_sheet = "佛山发货数据"
         self.jinan_sheet = "济南发货数据"
         self.output_dir = ""
+        self.profiler = StageProfiler()
+        # 选择文件后即在后台读取，运行处理时直接使用
+        self.prefetcher = ExcelPrefetcher()
         self.initUI()
         logging.debug("OrderDataProcessor initialized")
 
@@ -56,6 +83,50 @@ class OrderDataProcessor(QMainWindow):
         self.run_button.setEnabled(False)
         layout.addWidget(self.run_button)
 
+        self.combined_checkbox = QCheckBox("同时生成缺货导致的超区发货数据（与异常订单处理共用数据清洗结果，不输出中间文件）", self)
+        layout.addWidget(self.combined_checkbox)
+
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("结果格式：", self))
+        self.format_combo = QComboBox(self)
+        for label, extension in EXPORT_FORMATS.items():
+            self.format_combo.addItem(label, extension.lstrip('.'))
+        self.format_combo.setToolTip("最终结果的格式；CSV、Parquet 不能包含多个 sheet，每个 sheet 单独保存为一个文件")
+        format_layout.addWidget(self.format_combo)
+        self.per_sheet_checkbox = QCheckBox("逐步处理时，超区发货费用数据的每个 sheet 单独保存为一个文件", self)
+        format_layout.addWidget(self.per_sheet_checkbox)
+        layout.addLayout(format_layout)
+
+        backend_layout = QHBoxLayout()
+        backend_layout.addWidget(QLabel("执行方式：", self))
+        self.backend_combo = QComboBox(self)
+        self.backend_combo.addItem("逐步处理（保存中间文件）", None)
+        for backend in available_backends():
+            self.backend_combo.addItem(backend, backend)
+        backend_layout.addWidget(self.backend_combo)
+        self.validate_checkbox = QCheckBox("与 pandas 结果核对", self)
+        backend_layout.addWidget(self.validate_checkbox)
+        self.reuse_checkbox = QCheckBox("跳过未变化的步骤", self)
+        self.reuse_checkbox.setToolTip("逐步处理时，输入文件和参数都没有变化的步骤沿用上次的中间文件")
+        self.reuse_checkbox.setChecked(True)
+        backend_layout.addWidget(self.reuse_checkbox)
+        self.export_intermediate_checkbox = QCheckBox("保存中间过程 Excel", self)
+        self.export_intermediate_checkbox.setToolTip("逐步处理时每个步骤的结果另存为 中间过程处理_*.xlsx 以便核对；"
+                                                     "步骤之间读取同名 .pkl，取消勾选可省去写 Excel 的时间")
+        self.export_intermediate_checkbox.setChecked(True)
+        backend_layout.addWidget(self.export_intermediate_checkbox)
+        backend_layout.addWidget(QLabel("日志级别：", self))
+        self.log_level_combo = QComboBox(self)
+        self.log_level_combo.addItems(LOG_LEVELS)
+        self.log_level_combo.setCurrentText(log_level())
+        self.log_level_combo.setToolTip("写入 app.log 的最低级别，DEBUG 会记录各步骤的数据预览")
+        self.log_level_combo.currentTextChanged.connect(set_log_level)
+        backend_layout.addWidget(self.log_level_combo)
+        layout.addLayout(backend_layout)
+
+        self.profiling_controls = ProfilingControls(self.profiler, PIPELINE_STAGES, self)
+        layout.addWidget(self.profiling_controls)
+
         self.back_button = QPushButton("返回主菜单", self)
         self.back_button.clicked.connect(self.close)
         layout.addWidget(self.back_button)
@@ -74,6 +145,7 @@ class OrderDataProcessor(QMainWindow):
         layout.addWidget(self.output_text)
 
     def closeEvent(self, event):
+        self.prefetcher.shutdown(wait=False, cancel_futures=True)  # 取消尚未完成的预读取
         self.closed.emit()
         event.accept()
 
@@ -84,9 +156,10 @@ class OrderDataProcessor(QMainWindow):
         )
         if files:
             self.order_files = files
+            self.prefetcher.prefetch('orders', files)
             self.output_dir = os.path.dirname(files[0])
             self.output_text.append(f"已选择 {len(files)} 个订单文件：\n{chr(10).join([os.path.basename(f) for f in files])}")
-            logging.debug(f"Selected order files: {files}")
+            logging.debug("Selected order files: %s", files)
             self.check_files_selected()
             QApplication.processEvents()
 
@@ -97,10 +170,11 @@ class OrderDataProcessor(QMainWindow):
         )
         if file:
             self.inventory_file = file
+            self.prefetcher.prefetch('inventory', file)
             if not self.output_dir:
                 self.output_dir = os.path.dirname(file)
             self.output_text.append(f"已选择库存文件：{os.path.basename(file)}")
-            logging.debug(f"Selected inventory file: {file}")
+            logging.debug("Selected inventory file: %s", file)
             self.check_files_selected()
             QApplication.processEvents()
 
@@ -114,59 +188,75 @@ class OrderDataProcessor(QMainWindow):
             if not self.output_dir:
                 self.output_dir = os.path.dirname(file)
             self.output_text.append(f"已选择发货数据文件：{os.path.basename(file)}")
-            logging.debug(f"Selected shipping file: {file}")
+            logging.debug("Selected shipping file: %s", file)
             
             try:
-                xl = pd.ExcelFile(file)
-                available_sheets = xl.sheet_names
-                xl.close()
-                logging.debug(f"Available sheets in shipping file: {available_sheets}")
+                # 只读取工作簿目录和各 sheet 的表头，不加载整个工作簿
+                sheet_infos = probe_workbook(file)
+                available_sheets = [info['name'] for info in sheet_infos]
+                details = '\n'.join(describe_sheet(info) for info in sheet_infos)
+                self.output_text.append(f"发货数据包含的 sheet：\n{details}")
+                logging.debug("Available sheets in shipping file: %s", available_sheets)
+                # 选择 sheet 期间先按当前的 sheet 名称在后台读取，确认后再按选择的名称调整
+                self.prefetcher.prefetch('shipping', file, [sheet for sheet in (self.foshan_sheet, self.jinan_sheet)
+                                                            if sheet in available_sheets])
                 
-                foshan_sheet, ok1 = QInputDialog.getText(
-                    self, "输入 sheet 名称", 
-                    f"请输入佛山发货数据的 sheet 名称（可用 sheet: {', '.join(available_sheets)}）:",
-                    text=self.foshan_sheet
+                foshan_sheet, ok1 = QInputDialog.getItem(
+                    self, "选择 sheet",
+                    f"请选择佛山发货数据的 sheet：\n{details}",
+                    available_sheets, self.default_sheet_index(available_sheets, self.foshan_sheet, 0), False
                 )
                 if ok1 and foshan_sheet:
                     self.foshan_sheet = foshan_sheet
                     self.output_text.append(f"佛山发货数据 sheet 名称：{foshan_sheet}")
-                    logging.debug(f"Foshan sheet name: {foshan_sheet}")
+                    logging.debug("Foshan sheet name: %s", foshan_sheet)
                 
-                jinan_sheet, ok2 = QInputDialog.getText(
-                    self, "输入 sheet 名称", 
-                    f"请输入济南发货数据的 sheet 名称（可用 sheet: {', '.join(available_sheets)}）:",
-                    text=self.jinan_sheet
+                jinan_sheet, ok2 = QInputDialog.getItem(
+                    self, "选择 sheet",
+                    f"请选择济南发货数据的 sheet：\n{details}",
+                    available_sheets, self.default_sheet_index(available_sheets, self.jinan_sheet, 1), False
                 )
                 if ok2 and jinan_sheet:
                     self.jinan_sheet = jinan_sheet
                     self.output_text.append(f"济南发货数据 sheet 名称：{jinan_sheet}")
-                    logging.debug(f"Jinan sheet name: {jinan_sheet}")
+                    logging.debug("Jinan sheet name: %s", jinan_sheet)
                 
                 if not (ok1 and ok2):
-                    self.output_text.append("未输入有效的 sheet 名称，取消选择！")
+                    self.output_text.append("未选择 sheet，取消选择！")
                     logging.warning("Invalid sheet names provided, resetting shipping file")
                     self.shipping_file = None
                     self.foshan_sheet = "佛山发货数据"
                     self.jinan_sheet = "济南发货数据"
+                    self.prefetcher.clear('shipping')
+                else:
+                    self.prefetcher.prefetch('shipping', file, [self.foshan_sheet, self.jinan_sheet])
                 
             except Exception as e:
                 self.output_text.append(f"读取 sheet 名称错误: {e}")
-                logging.error(f"Failed to read sheet names from {file}: {e}")
+                logging.error("Failed to read sheet names from %s: %s", file, e)
                 QMessageBox.critical(self, "错误", f"读取 {os.path.basename(file)} 的 sheet 名称失败: {e}")
                 self.shipping_file = None
+                self.prefetcher.clear('shipping')
                 
             self.check_files_selected()
             QApplication.processEvents()
 
+    @staticmethod
+    def default_sheet_index(available_sheets, current, fallback):
+        """下拉框默认选中当前的 sheet 名称，不存在时选中第 fallback 个"""
+        if current in available_sheets:
+            return available_sheets.index(current)
+        return min(fallback, max(len(available_sheets) - 1, 0))
+
     def check_files_selected(self):
         if self.order_files and self.inventory_file and self.shipping_file and self.foshan_sheet and self.jinan_sheet:
             self.output_text.append(f"输出目录：{self.output_dir}")
             self.status_label.setText("状态：订单、库存和发货数据文件及 sheet 名称已选择，点击运行处理")
             self.run_button.setEnabled(True)
             self.progress_bar.setValue(0)
-            logging.debug(f"Output directory: {self.output_dir}")
+            logging.debug("Output directory: %s", self.output_dir)
         else:
-            self.status_label.setText("状态：请同时选择订单、库存和发货数据文件并输入 sheet 名称")
+            self.status_label.setText("状态：请同时选择订单、库存和发货数据文件及 sheet")
             self.run_button.setEnabled(False)
 
     def run_processing(self):
@@ -175,84 +265,125 @@ class OrderDataProcessor(QMainWindow):
         self.progress_bar.setValue(0)
         self.output_text.append(f"\n=== 开始处理 ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
         logging.debug("Starting data processing")
+        self.profiling_controls.start(self.output_dir)
 
-        total_steps = 6
-        step_value = 100 // total_steps
-
-        self.output_text.append("\n=== 步骤 1：数据清洗 ===")
-        cleaned_file = self.data_clean_1()
-        self.progress_bar.setValue(step_value)
-        QApplication.processEvents()
-
-        if cleaned_file:
-            self.output_text.append("\n=== 步骤 2：提取省份 ===")
-            processed_file = self.data_clean_2(cleaned_file)
-            self.progress_bar.setValue(step_value * 2)
-            QApplication.processEvents()
-
-            if processed_file:
-                self.output_text.append("\n=== 步骤 3：检测异常数据及库存合并 ===")
-                abnormal_file = self.abnormal_process(processed_file)
-                self.progress_bar.setValue(step_value * 3)
-                QApplication.processEvents()
-
-                if abnormal_file:
-                    self.output_text.append("\n=== 步骤 4：筛选商家编码 ===")
-                    cleaned_abnormal_file = self.filter_merchant_codes(abnormal_file)
-                    self.progress_bar.setValue(step_value * 4)
-                    QApplication.processEvents()
-
-                    if cleaned_abnormal_file:
-                        self.output_text.append("\n=== 步骤 5：追加佛山及济南发货数据 ===")
-                        shipping_file = self.append_shipping_data(cleaned_abnormal_file)
-                        self.progress_bar.setValue(step_value * 5)
-                        QApplication.processEvents()
-
-                        if shipping_file:
-                            self.output_text.append("\n=== 步骤 6：订单编号去重及删除货品字段 ===")
-                            final_file = self.process_final_shipping_data(shipping_file)
-                            self.progress_bar.setValue(100)
-                            QApplication.processEvents()
-
-                            if not final_file:
-                                self.output_text.append("\n去重及删除货品字段失败，终止流程！")
-                                logging.error("Failed to process final shipping data")
-                                QMessageBox.critical(self, "错误", "去重及删除货品字段失败，请检查输出文件！")
-                                self.progress_bar.setValue(0)
-                        else:
-                            self.output_text.append("\n追加发货数据失败，终止流程！")
-                            logging.error("Failed to append shipping data")
-                            QMessageBox.critical(self, "错误", "追加发货数据失败，请检查输入文件！")
-                            self.progress_bar.setValue(0)
-                    else:
-                        self.output_text.append("\n筛选商家编码失败，终止流程！")
-                        logging.error("Failed to filter merchant codes")
-                        QMessageBox.critical(self, "错误", "筛选商家编码失败，请检查输入文件！")
-                        self.progress_bar.setValue(0)
-                else:
-                    self.output_text.append("\n异常数据处理失败，终止流程！")
-                    logging.error("Failed to process abnormal data")
-                    QMessageBox.critical(self, "错误", "异常数据处理失败，请检查输入文件！")
-                    self.progress_bar.setValue(0)
-            else:
-                self.output_text.append("\n省份提取失败，终止流程！")
-                logging.error("Failed to extract provinces")
-                QMessageBox.critical(self, "错误", "省份提取失败，请检查输入文件！")
-                self.progress_bar.setValue(0)
+        backend = self.backend_combo.currentData()
+        if self.combined_checkbox.isChecked():
+            self.run_pipeline('combined', backend or 'pandas')
+        elif backend:
+            self.run_pipeline('fee', backend)
         else:
-            self.output_text.append("\n数据清洗失败，终止流程！")
-            logging.error("Failed to clean data")
-            QMessageBox.critical(self, "错误", "数据清洗失败，请检查输入文件！")
-            self.progress_bar.setValue(0)
+            self.run_steps()
 
+        self.profiling_controls.finish(self.output_text.append)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # profiler 在下次运行开始时被重置，必须在这里生成文本，不能交给后台线程
+            logging.debug("Stage profile:\n%s", self.profiler.format_summary())
         self.output_text.append(f"\n=== 处理完成 ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
         self.status_label.setText("状态：处理完成")
         self.run_button.setEnabled(True)
         QMessageBox.information(self, "完成", "数据处理已完成，请检查输出目录！")
         logging.debug("Data processing completed")
 
+    def run_pipeline(self, job, backend):
+        """使用 order_pipeline 一次完成全部步骤，只输出最终结果；
+        combined 一次读取和清洗订单，同时输出缺货导致的超区发货数据和超区发货费用数据"""
+        if job == 'combined':
+            self.output_text.append(f"\n=== 合并运行：缺货导致的超区发货数据 + 超区发货费用数据（执行后端：{backend}）===")
+        else:
+            self.output_text.append(f"\n=== 执行后端：{backend} ===")
+        inputs = {'orders': self.order_files, 'inventory': self.inventory_file, 'shipping': self.shipping_file,
+                  'foshan_sheet': self.foshan_sheet, 'jinan_sheet': self.jinan_sheet, 'reader': self.prefetcher.read}
+        try:
+            outputs = run_job(job, inputs, self.output_dir, log=self.output_text.append, profiler=self.profiler,
+                              backend=backend, validate=self.validate_checkbox.isChecked(),
+                              output_format=self.format_combo.currentData())
+        except Exception as e:
+            self.output_text.append(f"\n处理失败: {e}")
+            logging.error("Pipeline run (%s, %s) failed: %s", job, backend, e)
+            QMessageBox.critical(self, "错误", f"处理失败: {e}")
+            self.progress_bar.setValue(0)
+            return None
+        self.progress_bar.setValue(100)
+        logging.debug("Pipeline run (%s, %s) outputs: %s", job, backend, outputs)
+        return outputs
+
+    def step_plan(self):
+        """步骤 DAG（按执行顺序）：(方法名, 步骤标题, 上游步骤, 外部输入文件, 参数)。
+        方法的参数为上游步骤的输出文件；指纹由外部输入文件、参数和上游步骤的指纹计算"""
+        return [
+            ('data_clean_1', '数据清洗', None, self.order_files, FEE_ORDER_COLUMNS),
+            ('data_clean_2', '提取省份', 'data_clean_1', [], None),
+            ('abnormal_process', '检测异常数据及库存合并', 'data_clean_2', [self.inventory_file],
+             [FOSHAN_WAREHOUSE, JINAN_WAREHOUSE, JINAN_COVERAGE]),
+            ('filter_merchant_codes', '筛选商家编码', 'abnormal_process', [],
+             [MERCHANT_CODE_EXCLUSION.mode, MERCHANT_CODE_EXCLUSION.rules]),
+            ('append_shipping_data', '追加佛山及济南发货数据', 'filter_merchant_codes', [self.shipping_file],
+             [self.foshan_sheet, self.jinan_sheet]),
+            ('process_final_shipping_data', '订单编号去重及删除货品字段', 'append_shipping_data', [],
+             [self.per_sheet_checkbox.isChecked(), self.format_combo.currentData()]),
+        ]
+
+    def run_steps(self):
+        plan = self.step_plan()
+        step_value = 100 // len(plan)
+        checkpoints = StepCheckpoints(os.path.join(self.output_dir, CHECKPOINT_DIR))
+        outputs, fingerprints = {}, {}
+
+        for index, (step, title, upstream, files, params) in enumerate(plan, 1):
+            self.output_text.append(f"\n=== 步骤 {index}：{title} ===")
+            fingerprint = checkpoints.fingerprint(step, fingerprints.get(upstream), files, params)
+            output = checkpoints.lookup(step, fingerprint) if self.reuse_checkbox.isChecked() else None
+            if output:
+                self.output_text.append(f"输入文件和参数均未变化，沿用上次的结果: {os.path.basename(output)}")
+                logging.debug("Step %s unchanged, reusing %s", step, output)
+                if output.endswith(INTERMEDIATE_SUFFIX) and self.export_intermediate_checkbox.isChecked():
+                    export_excel(output)
+            else:
+                output = getattr(self, step)(*([outputs[upstream]] if upstream else []))
+                if output:
+                    checkpoints.record(step, fingerprint, output)
+            outputs[step], fingerprints[step] = output, fingerprint
+            self.progress_bar.setValue(100 if index == len(plan) else step_value * index)
+            QApplication.processEvents()
+
+            if not output:
+                failure, log_message, hint = STEP_FAILURES[step]
+                self.output_text.append(f"\n{failure}，终止流程！")
+                logging.error(log_message)
+                QMessageBox.critical(self, "错误", f"{failure}，{hint}！")
+                self.progress_bar.setValue(0)
+                return
+
+        self.update_summary_cube(outputs['append_shipping_data'])
+
+    @profiled_stage()
+    def update_summary_cube(self, shipping_file):
+        """与 run_job 相同，用按订单编号去重后的各发货 sheet 更新超区发货汇总（步骤沿用上次结果时也更新）"""
+        try:
+            sheets = {sheet: dedupe_shipping_sheet(df)[0]
+                      for sheet, df in self.read_intermediate(shipping_file, sheet_name=None).items()}
+            update_cube({'fee': sheets}, self.order_files, self.output_dir, log=self.output_text.append)
+        except Exception as e:
+            self.output_text.append(f"\n更新超区发货汇总失败: {e}")
+            logging.error("Failed to update summary cube: %s", e)
+            QMessageBox.warning(self, "警告", f"更新超区发货汇总失败: {e}")
+
+    def read_intermediate(self, path, sheet_name=0):
+        """读取上一步骤保存的中间文件（pickle）"""
+        return read_intermediate(path, sheet_name=sheet_name)
+
+    def save_intermediate(self, data, output_file):
+        """中间结果保存为 pickle（供下游步骤读取）；勾选“保存中间过程 Excel”（默认）时另存同名 .xlsx"""
+        with self.profiler.span('to_pickle'):
+            write_intermediate(data, output_file)
+        if self.export_intermediate_checkbox.isChecked():
+            with self.profiler.span('to_excel'):
+                export_excel(output_file)
+
+    @profiled_stage()
     def data_clean_1(self):
-        columns_to_keep = ["订单编号", "店铺", "仓库", "子单原始单号", "付款时间", "收货地区", "商家编码", "货品名称", "下单数量", "物流单号", "拆自组合装"]
+        columns_to_keep = FEE_ORDER_COLUMNS
         all_data = []
         total_records = 0
 
@@ -260,51 +391,54 @@ class OrderDataProcessor(QMainWindow):
             file_path = file  # 用户选择的文件无需 resource_path
             if os.path.exists(file_path):
                 self.output_text.append(f"\n正在读取订单文件: {os.path.basename(file_path)}")
-                logging.debug(f"Reading order file: {file_path}")
+                logging.debug("Reading order file: %s", file_path)
                 try:
-                    df = pd.read_excel(file_path)
+                    with self.profiler.span('read_excel'):
+                        df = self.prefetcher.read(file_path)
                     total_records += len(df)
                     self.output_text.append(f"文件包含 {len(df)} 条记录")
                     self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
-                    logging.debug(f"Order file {file_path} contains {len(df)} records")
-                    missing_columns = [col for col in columns_to_keep if col not in df.columns]
-                    if missing_columns:
-                        self.output_text.append(f"警告: 缺少字段 {missing_columns}")
-                        logging.warning(f"Missing columns in {file_path}: {missing_columns}")
+                    logging.debug("Order file %s contains %s records", file_path, len(df))
+                    missing = missing_columns(df, columns_to_keep)
+                    if missing:
+                        self.output_text.append(f"警告: 缺少字段 {missing}")
+                        logging.warning("Missing columns in %s: %s", file_path, missing)
                     else:
                         df_cleaned = df[columns_to_keep].copy()
                         all_data.append(df_cleaned)
                 except Exception as e:
                     self.output_text.append(f"读取错误: {e}")
-                    logging.error(f"Failed to read order file {file_path}: {e}")
+                    logging.error("Failed to read order file %s: %s", file_path, e)
                     QMessageBox.warning(self, "警告", f"读取 {os.path.basename(file_path)} 失败: {e}")
             else:
                 self.output_text.append(f"文件 {os.path.basename(file_path)} 不存在！")
-                logging.error(f"Order file not found: {file_path}")
+                logging.error("Order file not found: %s", file_path)
                 QMessageBox.warning(self, "警告", f"文件 {os.path.basename(file_path)} 不存在！")
             QApplication.processEvents()
 
+        self.profiler.rows(rows_in=total_records)
         if all_data:
-            combined_data = pd.concat(all_data, ignore_index=True)
+            combined_data = combine_orders(all_data)
             self.output_text.append(f"\n合并完成，共 {len(combined_data)} 条记录")
             self.output_text.append(f"合并后的数据前 5 行：\n{combined_data.head().to_string()}")
-            logging.debug(f"Combined {len(combined_data)} records")
+            logging.debug("Combined %s records", len(combined_data))
 
             initial_count = len(combined_data)
-            combined_data = combined_data[combined_data['物流单号'].notna() & (combined_data['物流单号'] != '')]
+            combined_data = drop_untracked_orders(combined_data)
             filtered_count = len(combined_data)
+            self.profiler.rows(rows_out=filtered_count)
             self.output_text.append(f"\n剔除物流单号为空的记录后，剩余 {filtered_count} 条记录（原 {initial_count} 条，剔除了 {initial_count - filtered_count} 条）")
-            logging.debug(f"Filtered to {filtered_count} records (from {initial_count})")
+            logging.debug("Filtered to %s records (from %s)", filtered_count, initial_count)
 
-            output_file = os.path.join(self.output_dir, "中间过程处理_合并订单数据.xlsx")
+            output_file = os.path.join(self.output_dir, "中间过程处理_合并订单数据" + INTERMEDIATE_SUFFIX)
             try:
-                combined_data.to_excel(output_file, engine='openpyxl')
+                self.save_intermediate(combined_data, output_file)
                 self.output_text.append(f"\n清洗后的数据已保存到: {os.path.basename(output_file)}")
-                logging.debug(f"Saved cleaned data to: {output_file}")
+                logging.debug("Saved cleaned data to: %s", output_file)
                 return output_file
             except Exception as e:
                 self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
-                logging.error(f"Failed to save {output_file}: {e}")
+                logging.error("Failed to save %s: %s", output_file, e)
                 QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
                 return None
         else:
@@ -312,461 +446,416 @@ class OrderDataProcessor(QMainWindow):
             logging.error("No order data read successfully")
             return None
 
+    @profiled_stage()
     def data_clean_2(self, input_file):
         input_file = resource_path(input_file)
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
-            logging.debug(f"Reading file: {input_file}")
+            logging.debug("Reading file: %s", input_file)
             try:
-                df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    df = self.read_intermediate(input_file)
+                self.profiler.rows(rows_in=len(df))
                 self.output_text.append(f"文件包含 {len(df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
-                logging.debug(f"File {input_file} contains {len(df)} records")
+                logging.debug("File %s contains %s records", input_file, len(df))
 
-                def extract_province(address):
-                    if pd.isna(address):
-                        return None
-                    try:
-                        return str(address).split()[0]
-                    except IndexError:
-                        return None
-
-                df['省份'] = df['收货地区'].apply(extract_province)
+                df = add_province(df)
                 self.output_text.append(f"\n提取省份后的前 5 行数据：\n{df.head().to_string()}")
                 self.output_text.append(f"省份字段缺失值统计：{df['省份'].isna().sum()} 条记录未提取到省份")
-                logging.debug(f"Province extraction completed, missing provinces: {df['省份'].isna().sum()}")
+                logging.debug("Province extraction completed, missing provinces: %s", df['省份'].isna().sum())
 
-                output_file = os.path.join(self.output_dir, "中间过程处理_添加省份字段.xlsx")
+                self.profiler.rows(rows_out=len(df))
+                output_file = os.path.join(self.output_dir, "中间过程处理_添加省份字段" + INTERMEDIATE_SUFFIX)
                 try:
-                    df.to_excel(output_file, engine='openpyxl')
+                    self.save_intermediate(df, output_file)
                     self.output_text.append(f"\n处理后的数据已保存到: {os.path.basename(output_file)}")
-                    logging.debug(f"Saved province data to: {output_file}")
+                    logging.debug("Saved province data to: %s", output_file)
                     return output_file
                 except Exception as e:
                     self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
-                    logging.error(f"Failed to save {output_file}: {e}")
+                    logging.error("Failed to save %s: %s", output_file, e)
                     QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
                     return None
             except Exception as e:
                 self.output_text.append(f"读取错误: {e}")
-                logging.error(f"Failed to read {input_file}: {e}")
+                logging.error("Failed to read %s: %s", input_file, e)
                 QMessageBox.critical(self, "错误", f"读取 {os.path.basename(input_file)} 失败: {e}")
                 return None
         else:
             self.output_text.append(f"\n文件 {os.path.basename(input_file)} 不存在！")
-            logging.error(f"Input file not found: {input_file}")
+            logging.error("Input file not found: %s", input_file)
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    @profiled_stage()
     def abnormal_process(self, input_file):
-        jinan_coverage = [
-            '北京', '天津', '河北省', '山西省', '内蒙古自治区', '辽宁省', '吉林省', '黑龙江省',
-            '上海', '江苏省', '浙江省', '安徽省', '山东省', '河南省', '湖北省', '北京市', '上海市', '天津市'
-        ]
         input_file = resource_path(input_file)
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
-            logging.debug(f"Reading file: {input_file}")
+            logging.debug("Reading file: %s", input_file)
             try:
-                df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    df = self.read_intermediate(input_file)
+                self.profiler.rows(rows_in=len(df))
                 self.output_text.append(f"文件包含 {len(df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
-                logging.debug(f"File {input_file} contains {len(df)} records")
+                logging.debug("File %s contains %s records", input_file, len(df))
 
-                df['付款时间'] = pd.to_datetime(df['付款时间'], errors='coerce')
-                df['月份'] = df['付款时间'].dt.strftime('%Y-%m')
+                with self.profiler.span('to_datetime'):
+                    df = add_month(df)
                 self.output_text.append(f"\n添加月份字段后的前 5 行数据：\n{df.head().to_string()}")
                 logging.debug("Added month column")
 
-                df = df[df['仓库'].isin(['佛山-优赛-三水仓', '济南-优赛-市中'])]
+                df = filter_warehouses(df)
                 self.output_text.append(f"\n筛选后（仅包含指定仓库）的记录数: {len(df)}")
-                logging.debug(f"Filtered to {len(df)} records with specified warehouses")
-
-                abnormal_data = []
-                for index, row in df.iterrows():
-                    province = row['省份']
-                    warehouse = row['仓库']
-                    if pd.isna(province):
-                        abnormal_data.append(row)
-                    elif warehouse == '佛山-优赛-三水仓' and province in jinan_coverage:
-                        abnormal_data.append(row)
-                    elif warehouse == '济南-优赛-市中' and province not in jinan_coverage:
-                        abnormal_data.append(row)
-                    QApplication.processEvents()
-
-                abnormal_df = pd.DataFrame(abnormal_data)
+                logging.debug("Filtered to %s records with specified warehouses", len(df))
+
+                abnormal_df = df[out_of_region_mask(df)]
                 if not abnormal_df.empty:
                     self.output_text.append(f"\n发现异常数据：\n{abnormal_df.head().to_string()}")
                     self.output_text.append(f"\n异常数据记录数: {len(abnormal_df)}")
-                    logging.debug(f"Found {len(abnormal_df)} abnormal records")
-                    output_file = os.path.join(self.output_dir, "中间过程处理_异常数据.xlsx")
+                    logging.debug("Found %s abnormal records", len(abnormal_df))
+                    output_file = os.path.join(self.output_dir, "中间过程处理_异常数据" + INTERMEDIATE_SUFFIX)
                     try:
-                        abnormal_df.to_excel(output_file, engine='openpyxl')
+                        self.save_intermediate(abnormal_df, output_file)
                         self.output_text.append(f"\n异常数据已保存到: {os.path.basename(output_file)}")
-                        logging.debug(f"Saved abnormal data to: {output_file}")
+                        logging.debug("Saved abnormal data to: %s", output_file)
                     except Exception as e:
                         self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
-                        logging.error(f"Failed to save {output_file}: {e}")
+                        logging.error("Failed to save %s: %s", output_file, e)
                         QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
                         return None
                 else:
                     self.output_text.append("\n未发现异常数据！")
-                    output_file = os.path.join(self.output_dir, "中间过程处理_异常数据.xlsx")
+                    output_file = os.path.join(self.output_dir, "中间过程处理_异常数据" + INTERMEDIATE_SUFFIX)
                     try:
-                        abnormal_df.to_excel(output_file, engine='openpyxl')
+                        self.save_intermediate(abnormal_df, output_file)
                         self.output_text.append(f"\n无异常数据，保存空文件到: {os.path.basename(output_file)}")
-                        logging.debug(f"Saved empty abnormal data to: {output_file}")
+                        logging.debug("Saved empty abnormal data to: %s", output_file)
                     except Exception as e:
                         self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
-                        logging.error(f"Failed to save {output_file}: {e}")
+                        logging.error("Failed to save %s: %s", output_file, e)
                         QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
                         return None
 
                 if os.path.exists(self.inventory_file):
                     self.output_text.append(f"\n正在读取库存数据: {os.path.basename(self.inventory_file)}")
-                    logging.debug(f"Reading inventory file: {self.inventory_file}")
+                    logging.debug("Reading inventory file: %s", self.inventory_file)
                     try:
-                        inventory_df = pd.read_excel(self.inventory_file)
+                        with self.profiler.span('read_excel'):
+                            inventory_df = self.prefetcher.read(self.inventory_file)
                         self.output_text.append(f"库存数据前 5 行：\n{inventory_df.head().to_string()}")
-                        logging.debug(f"Inventory data head: {inventory_df.head().to_string()}")
-                        logging.debug(f"Inventory columns: {inventory_df.columns.tolist()}")
+                        logging.debug("Inventory data head: %s", lazy(inventory_df.head().to_string))
+                        logging.debug("Inventory columns: %s", inventory_df.columns.tolist())
                     except Exception as e:
                         self.output_text.append(f"读取库存数据错误: {e}")
-                        logging.error(f"Failed to read inventory file {self.inventory_file}: {e}")
+                        logging.error("Failed to read inventory file %s: %s", self.inventory_file, e)
                         QMessageBox.critical(self, "错误", f"读取 {os.path.basename(self.inventory_file)} 失败: {e}")
                         return None
                 else:
                     self.output_text.append(f"\n库存文件 {os.path.basename(self.inventory_file)} 不存在！")
-                    logging.error(f"Inventory file not found: {self.inventory_file}")
+                    logging.error("Inventory file not found: %s", self.inventory_file)
                     QMessageBox.critical(self, "错误", f"库存文件 {os.path.basename(self.inventory_file)} 不存在！")
                     return None
 
-                inventory_df['货品编号'] = inventory_df['货品编号'].astype(str)
-                abnormal_df['商家编码'] = abnormal_df['商家编码'].astype(str)
-
-                pivot_inventory = inventory_df.pivot_table(
-                    values=['期初库存', '期末库存'],
-                    index='货品编号',
-                    columns='仓库名称',
-                    aggfunc='sum',
-                    fill_value=0
-                )
+                with self.profiler.span('pivot_table'):
+                    pivot = pivot_inventory(inventory_df)
+                with self.profiler.span('merge'):
+                    merged_df = merge_inventory(abnormal_df, pivot)
 
-                pivot_inventory.columns = [
-                    '佛山仓期初库存' if '佛山-优赛-三水仓' in col and '期初库存' in col else
-                    '佛山仓期末库存' if '佛山-优赛-三水仓' in col and '期末库存' in col else
-                    '济南仓期初库存' if '济南-优赛-市中' in col and '期初库存' in col else
-                    '济南仓期末库存' if '济南-优赛-市中' in col and '期末库存' in col else col
-                    for col in pivot_inventory.columns
-                ]
-                pivot_inventory = pivot_inventory.reset_index()
-
-                merged_df = abnormal_df.merge(
-                    pivot_inventory,
-                    left_on='商家编码',
-                    right_on='货品编号',
-                    how='left'
-                )
-                merged_df = merged_df.drop(columns=['货品编号'], errors='ignore')
-
-                expected_columns = [
-                    '佛山仓期初库存', '济南仓期初库存', '佛山仓期末库存', '济南仓期末库存'
-                ]
-                for col in expected_columns:
-                    if col not in merged_df.columns:
-                        merged_df[col] = 0
-                    else:
-                        merged_df[col] = merged_df[col].fillna(0)
-
-                missing_inventory = merged_df[
-                    (merged_df['佛山仓期初库存'] == 0) &
-                    (merged_df['济南仓期初库存'] == 0) &
-                    (merged_df['佛山仓期末库存'] == 0) &
-                    (merged_df['济南仓期末库存'] == 0)
-                ]
-                if not missing_inventory.empty:
+                missing = missing_inventory(merged_df)
+                if not missing.empty:
                     self.output_text.append("\n警告：以下商家编码在库存数据中未找到对应的库存信息：")
-                    self.output_text.append(missing_inventory[['商家编码', '货品名称']].to_string())
-                    logging.debug(f"Missing inventory data: {missing_inventory[['商家编码', '货品名称']].to_string()}")
+                    self.output_text.append(missing[['商家编码', '货品名称']].to_string())
+                    logging.debug("Missing inventory data: %s", lazy(lambda: missing[['商家编码', '货品名称']].to_string()))
 
-                inventory_output_file = os.path.join(self.output_dir, "中间过程处理_合并库存数据.xlsx")
+                self.profiler.rows(rows_out=len(merged_df))
+                inventory_output_file = os.path.join(self.output_dir, "中间过程处理_合并库存数据" + INTERMEDIATE_SUFFIX)
                 try:
-                    merged_df.to_excel(inventory_output_file, engine='openpyxl')
+                    self.save_intermediate(merged_df, inventory_output_file)
                     self.output_text.append(f"\n合并库存数据已保存到: {os.path.basename(inventory_output_file)}")
-                    logging.debug(f"Saved merged inventory data to: {inventory_output_file}")
+                    logging.debug("Saved merged inventory data to: %s", inventory_output_file)
                     return inventory_output_file
                 except Exception as e:
                     self.output_text.append(f"\n保存 {os.path.basename(inventory_output_file)} 错误: {e}")
-                    logging.error(f"Failed to save {inventory_output_file}: {e}")
+                    logging.error("Failed to save %s: %s", inventory_output_file, e)
                     QMessageBox.critical(self, "错误", f"保存 {os.path.basename(inventory_output_file)} 失败: {e}")
                     return None
             except Exception as e:
                 self.output_text.append(f"读取错误: {e}")
-                logging.error(f"Failed to read {input_file}: {e}")
+                logging.error("Failed to read %s: %s", input_file, e)
                 QMessageBox.critical(self, "错误", f"读取 {os.path.basename(input_file)} 失败: {e}")
                 return None
         else:
             self.output_text.append(f"\n文件 {os.path.basename(input_file)} 不存在！")
-            logging.error(f"Input file not found: {input_file}")
+            logging.error("Input file not found: %s", input_file)
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    @profiled_stage()
     def filter_merchant_codes(self, input_file):
         input_file = resource_path(input_file)
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
-            logging.debug(f"Reading file: {input_file}")
+            logging.debug("Reading file: %s", input_file)
             try:
-                df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    df = self.read_intermediate(input_file)
+                self.profiler.rows(rows_in=len(df))
                 self.output_text.append(f"文件包含 {len(df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{df.head().to_string()}")
-                logging.debug(f"File {input_file} contains {len(df)} records")
-
-                exclude_patterns = [
-                    r'250g冰袋\*2\+500g干冰\*1',
-                    r'250g冰袋\*4',
-                    r'XDJXN',
-                    r'XDJLW'
-                ]
-                df['商家编码'] = df['商家编码'].astype(str)
-                mask = ~df['商家编码'].str.contains('|'.join(exclude_patterns), case=False, na=False, regex=True)
-                cleaned_df = df[mask]
-
-                excluded_df = df[~mask]
+                logging.debug("File %s contains %s records", input_file, len(df))
+
+                with self.profiler.span('str.contains'):
+                    cleaned_df, excluded_df = exclude_merchant_codes(df)
                 if not excluded_df.empty:
                     self.output_text.append("\n被筛掉的记录（包含指定商家编码模式）：")
                     self.output_text.append(excluded_df[['订单编号', '商家编码', '货品名称']].to_string())
-                    logging.debug(f"Excluded records: {excluded_df[['订单编号', '商家编码', '货品名称']].to_string()}")
+                    logging.debug("Excluded records: %s", lazy(lambda: excluded_df[['订单编号', '商家编码', '货品名称']].to_string()))
 
-                output_file = os.path.join(self.output_dir, "中间过程处理_筛选商家编码.xlsx")
+                self.profiler.rows(rows_out=len(cleaned_df))
+                output_file = os.path.join(self.output_dir, "中间过程处理_筛选商家编码" + INTERMEDIATE_SUFFIX)
                 try:
-                    cleaned_df.to_excel(output_file, engine='openpyxl')
+                    self.save_intermediate(cleaned_df, output_file)
                     self.output_text.append(f"\n清洗后的数据已保存到: {os.path.basename(output_file)}")
-                    logging.debug(f"Saved filtered data to: {output_file}")
+                    logging.debug("Saved filtered data to: %s", output_file)
                     return output_file
                 except Exception as e:
                     self.output_text.append(f"\n保存 {os.path.basename(output_file)} 错误: {e}")
-                    logging.error(f"Failed to save {output_file}: {e}")
+                    logging.error("Failed to save %s: %s", output_file, e)
                     QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
                     return None
             except Exception as e:
                 self.output_text.append(f"读取错误: {e}")
-                logging.error(f"Failed to read {input_file}: {e}")
+                logging.error("Failed to read %s: %s", input_file, e)
                 QMessageBox.critical(self, "错误", f"读取 {os.path.basename(input_file)} 失败: {e}")
                 return None
         else:
             self.output_text.append(f"\n文件 {os.path.basename(input_file)} 不存在！")
-            logging.error(f"Input file not found: {input_file}")
+            logging.error("Input file not found: %s", input_file)
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    @profiled_stage()
     def append_shipping_data(self, input_file):
         input_file = resource_path(input_file)
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
-            logging.debug(f"Reading file: {input_file}")
+            logging.debug("Reading file: %s", input_file)
             try:
-                abnormal_df = pd.read_excel(input_file)
+                with self.profiler.span('read_excel'):
+                    abnormal_df = self.read_intermediate(input_file)
+                self.profiler.rows(rows_in=len(abnormal_df))
                 self.output_text.append(f"文件包含 {len(abnormal_df)} 条记录")
                 self.output_text.append(f"前 5 行数据：\n{abnormal_df.head().to_string()}")
-                logging.debug(f"File {input_file} contains {len(abnormal_df)} records")
-
-                abnormal_df['子单原始单号'] = abnormal_df['子单原始单号'].astype(str)
+                logging.debug("File %s contains %s records", input_file, len(abnormal_df))
 
                 if os.path.exists(self.shipping_file):
                     self.output_text.append(f"\n正在读取发货数据文件: {os.path.basename(self.shipping_file)}")
-                    logging.debug(f"Reading shipping file: {self.shipping_file}")
-                    output_file = os.path.join(self.output_dir, "中间过程处理_追加发货数据字段.xlsx")
+                    logging.debug("Reading shipping file: %s", self.shipping_file)
+                    output_file = os.path.join(self.output_dir, "中间过程处理_追加发货数据字段" + INTERMEDIATE_SUFFIX)
 
                     try:
-                        writer = pd.ExcelWriter(output_file, engine='openpyxl')
-                        if writer is None:
-                            raise ValueError("Failed to initialize ExcelWriter with openpyxl engine")
-                        
                         self.output_text.append(f"\n正在读取佛山发货数据（Sheet: {self.foshan_sheet}）")
-                        logging.debug(f"Reading Foshan shipping data (Sheet: {self.foshan_sheet})")
-                        foshan_df = pd.read_excel(self.shipping_file, sheet_name=self.foshan_sheet)
+                        logging.debug("Reading Foshan shipping data (Sheet: %s)", self.foshan_sheet)
+                        with self.profiler.span('read_excel'):
+                            foshan_df = self.prefetcher.read(self.shipping_file, sheet_name=self.foshan_sheet)
                         self.output_text.append(f"佛山发货数据前 5 行：\n{foshan_df.head().to_string()}")
-                        logging.debug(f"Foshan data head: {foshan_df.head().to_string()}")
-
-                        foshan_df['原始单号'] = foshan_df['原始单号'].astype(str)
-                        foshan_columns = [col for col in foshan_df.columns if col != '原始单号']
-                        foshan_columns_renamed = [f"佛山_{col}" for col in foshan_columns]
-                        foshan_df = foshan_df.rename(columns=dict(zip(foshan_columns, foshan_columns_renamed)))
-
-                        foshan_merged_df = abnormal_df.merge(
-                            foshan_df[foshan_columns_renamed + ['原始单号']],
-                            left_on='子单原始单号',
-                            right_on='原始单号',
-                            how='left'
-                        )
-                        foshan_merged_df = foshan_merged_df.drop(columns=['原始单号'], errors='ignore')
+                        logging.debug("Foshan data head: %s", lazy(foshan_df.head().to_string))
+
+                        with self.profiler.span('merge'):
+                            foshan_merged_df, foshan_columns_renamed = merge_shipping(abnormal_df, foshan_df, '佛山')
 
                         initial_count = len(foshan_merged_df)
-                        foshan_merged_df = foshan_merged_df[
-                            ~foshan_merged_df['仓库'].str.contains('济南', case=False, na=False)
-                        ]
+                        foshan_merged_df = foshan_merged_df[~ships_from_jinan(foshan_merged_df)]
                         filtered_count = len(foshan_merged_df)
                         self.output_text.append(
                             f"\n佛山发货数据筛选后，剩余 {filtered_count} 条记录（原 {initial_count} 条，剔除了 {initial_count - filtered_count} 条包含‘济南’的记录）"
                         )
-                        logging.debug(f"Foshan filtered: {filtered_count} records (from {initial_count})")
+                        logging.debug("Foshan filtered: %s records (from %s)", filtered_count, initial_count)
 
-                        unmatched_foshan = foshan_merged_df[foshan_merged_df[foshan_columns_renamed].isna().all(axis=1)]
+                        unmatched_foshan = unmatched_shipping(foshan_merged_df, foshan_columns_renamed)
                         if not unmatched_foshan.empty:
                             self.output_text.append("\n警告：以下子单原始单号未在佛山发货数据中找到匹配：")
                             self.output_text.append(unmatched_foshan[['子单原始单号', '商家编码', '货品名称']].to_string())
-                            logging.debug(f"Unmatched Foshan orders: {unmatched_foshan[['子单原始单号', '商家编码', '货品名称']].to_string()}")
+                            logging.debug("Unmatched Foshan orders: %s", lazy(lambda: unmatched_foshan[['子单原始单号', '商家编码', '货品名称']].to_string()))
 
-                        foshan_merged_df.to_excel(writer, sheet_name='佛山发货数据', index=False)
-                        self.output_text.append(f"\n佛山发货数据合并结果已保存到: {os.path.basename(output_file)}（Sheet: 佛山发货数据）")
-                        logging.debug(f"Saved Foshan data to {output_file} (Sheet: 佛山发货数据)")
 
                         self.output_text.append(f"\n正在读取济南发货数据（Sheet: {self.jinan_sheet})")
-                        logging.debug(f"Reading Jinan shipping data (Sheet: {self.jinan_sheet})")
-                        jinan_df = pd.read_excel(self.shipping_file, sheet_name=self.jinan_sheet)
+                        logging.debug("Reading Jinan shipping data (Sheet: %s)", self.jinan_sheet)
+                        with self.profiler.span('read_excel'):
+                            jinan_df = self.prefetcher.read(self.shipping_file, sheet_name=self.jinan_sheet)
                         self.output_text.append(f"济南发货数据前 5 行：\n{jinan_df.head().to_string()}")
-                        logging.debug(f"Jinan data head: {jinan_df.head().to_string()}")
-
-                        jinan_df['原始单号'] = jinan_df['原始单号'].astype(str)
-                        jinan_columns = [col for col in jinan_df.columns if col != '原始单号']
-                        jinan_columns_renamed = [f"济南_{col}" for col in jinan_columns]
-                        jinan_df = jinan_df.rename(columns=dict(zip(jinan_columns, jinan_columns_renamed)))
-
-                        jinan_merged_df = abnormal_df.merge(
-                            jinan_df[jinan_columns_renamed + ['原始单号']],
-                            left_on='子单原始单号',
-                            right_on='原始单号',
-                            how='left'
-                        )
-                        jinan_merged_df = jinan_merged_df.drop(columns=['原始单号'], errors='ignore')
+                        logging.debug("Jinan data head: %s", lazy(jinan_df.head().to_string))
+
+                        with self.profiler.span('merge'):
+                            jinan_merged_df, jinan_columns_renamed = merge_shipping(abnormal_df, jinan_df, '济南')
 
                         initial_count = len(jinan_merged_df)
-                        jinan_merged_df = jinan_merged_df[
-                            jinan_merged_df['仓库'].str.contains('济南', case=False, na=False)
-                        ]
+                        jinan_merged_df = jinan_merged_df[ships_from_jinan(jinan_merged_df)]
                         filtered_count = len(jinan_merged_df)
                         self.output_text.append(
                             f"\n济南发货数据筛选后，剩余 {filtered_count} 条记录（原 {initial_count} 条，剔除了 {initial_count - filtered_count} 条不包含‘济南’的记录）"
                         )
-                        logging.debug(f"Jinan filtered: {filtered_count} records (from {initial_count})")
+                        logging.debug("Jinan filtered: %s records (from %s)", filtered_count, initial_count)
 
-                        unmatched_jinan = jinan_merged_df[jinan_merged_df[jinan_columns_renamed].isna().all(axis=1)]
+                        unmatched_jinan = unmatched_shipping(jinan_merged_df, jinan_columns_renamed)
                         if not unmatched_jinan.empty:
                             self.output_text.append("\n警告：以下子单原始单号未在济南发货数据中找到匹配：")
                             self.output_text.append(unmatched_jinan[['子单原始单号', '商家编码', '货品名称']].to_string())
-                            logging.debug(f"Unmatched Jinan orders: {unmatched_jinan[['子单原始单号', '商家编码', '货品名称']].to_string()}")
+                            logging.debug("Unmatched Jinan orders: %s", lazy(lambda: unmatched_jinan[['子单原始单号', '商家编码', '货品名称']].to_string()))
 
-                        jinan_merged_df.to_excel(writer, sheet_name='济南发货数据', index=False)
-                        self.output_text.append(f"\n济南发货数据合并结果已保存到: {os.path.basename(output_file)}（Sheet: 济南发货数据）")
-                        logging.debug(f"Saved Jinan data to {output_file} (Sheet: 济南发货数据)")
-
-                        writer.close()
+                        self.save_intermediate({'佛山发货数据': foshan_merged_df, '济南发货数据': jinan_merged_df}, output_file)
+                        self.output_text.append(f"\n佛山、济南发货数据合并结果已保存到: {os.path.basename(output_file)}"
+                                                f"（Sheet: 佛山发货数据、济南发货数据）")
+                        logging.debug("Saved Foshan and Jinan data to %s", output_file)
+                        self.profiler.rows(rows_out=len(foshan_merged_df) + len(jinan_merged_df))
                         self.output_text.append(f"\n追加发货数据后的结果已保存到: {os.path.basename(output_file)}")
-                        logging.debug(f"Saved shipping data to: {output_file}")
+                        logging.debug("Saved shipping data to: %s", output_file)
                         return output_file
 
                     except Exception as e:
                         self.output_text.append(f"保存发货数据错误: {e}")
-                        logging.error(f"Failed to save shipping data to {output_file}: {e}")
+                        logging.error("Failed to save shipping data to %s: %s", output_file, e)
                         QMessageBox.critical(self, "错误", f"保存发货数据失败: {e}")
                         return None
 
                 else:
                     self.output_text.append(f"\n发货数据文件 {os.path.basename(self.shipping_file)} 不存在！")
-                    logging.error(f"Shipping file not found: {self.shipping_file}")
+                    logging.error("Shipping file not found: %s", self.shipping_file)
                     QMessageBox.critical(self, "错误", f"发货数据文件 {os.path.basename(self.shipping_file)} 不存在！")
                     return None
 
             except Exception as e:
                 self.output_text.append(f"读取错误: {e}")
-                logging.error(f"Failed to read {input_file}: {e}")
+                logging.error("Failed to read %s: %s", input_file, e)
                 QMessageBox.critical(self, "错误", f"读取 {os.path.basename(input_file)} 失败: {e}")
                 return None
         else:
             self.output_text.append(f"\n文件 {os.path.basename(input_file)} 不存在！")
-            logging.error(f"Input file not found: {input_file}")
+            logging.error("Input file not found: %s", input_file)
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    @profiled_stage()
     def process_final_shipping_data(self, input_file):
         input_file = resource_path(input_file)
         if os.path.exists(input_file):
             self.output_text.append(f"\n正在读取文件: {os.path.basename(input_file)}")
-            logging.debug(f"Reading file: {input_file}")
+            logging.debug("Reading file: %s", input_file)
             try:
-                xl = pd.ExcelFile(input_file)
-                sheet_names = xl.sheet_names
+                sheet_names = intermediate_sheet_names(input_file)
                 self.output_text.append(f"\n发现的 sheet 名称: {sheet_names}")
-                logging.debug(f"Found sheets: {sheet_names}")
+                logging.debug("Found sheets: %s", sheet_names)
                 
-                output_file = os.path.join(self.output_dir, "最终结果_超区发货费用数据表.xlsx")
+                # 每个 sheet 单独保存（CSV、Parquet 只能如此）时输出为同名目录，目录中每个 sheet 一个文件
+                output_format = self.format_combo.currentData()
+                per_sheet = self.per_sheet_checkbox.isChecked() or output_format != 'xlsx'
+                output_file = os.path.join(self.output_dir, "最终结果_超区发货费用数据表" + ("" if per_sheet else ".xlsx"))
                 try:
-                    writer = pd.ExcelWriter(output_file, engine='openpyxl')
-                    if writer is None:
-                        raise ValueError("Failed to initialize ExcelWriter with openpyxl engine")
-                    
-                    for sheet in sheet_names:
+                    if per_sheet:
+                        os.makedirs(output_file, exist_ok=True)
+                        writer = None
+                    else:
+                        writer = pd.ExcelWriter(output_file, engine='openpyxl')
+                        if writer is None:
+                            raise ValueError("Failed to initialize ExcelWriter with openpyxl engine")
+                    targets = {sheet: os.path.join(output_file, f"{sheet}.{output_format}") if per_sheet else None
+                               for sheet in sheet_names}
+
+                    rows_in = rows_out = 0
+                    for result in self.process_sheets(input_file, sheet_names, targets):
+                        sheet = result['sheet']
                         self.output_text.append(f"\n=== 处理 Sheet: {sheet} ===")
-                        logging.debug(f"Processing sheet: {sheet}")
-                        
-                        df = pd.read_excel(input_file, sheet_name=sheet)
-                        self.output_text.append(f"{sheet} 原始记录数: {len(df)}")
-                        self.output_text.append(f"前 5 行数据:\n{df.head().to_string()}")
-                        logging.debug(f"{sheet} has {len(df)} records")
-                        
-                        initial_count = len(df)
-                        df = df.drop_duplicates(subset=['订单编号'], keep='first')
-                        self.output_text.append(f"\n去重后记录数: {len(df)}（原 {initial_count} 条，剔除了 {initial_count - len(df)} 条重复记录）")
-                        logging.debug(f"Deduplicated {sheet}: {len(df)} records (from {initial_count})")
-                        
-                        columns_to_drop = [col for col in df.columns if '货品' in str(col) or '商家编码' in str(col)]
+                        logging.debug("Processing sheet: %s", sheet)
+                        self.output_text.append(f"{sheet} 原始记录数: {result['rows_in']}")
+                        self.output_text.append(f"前 5 行数据:\n{result['raw_head'].to_string()}")
+                        logging.debug("%s has %s records", sheet, result['rows_in'])
+
+                        initial_count = result['rows_in']
+                        rows_in += initial_count
+                        self.output_text.append(f"\n去重后记录数: {result['rows_out']}（原 {initial_count} 条，剔除了 {initial_count - result['rows_out']} 条重复记录）")
+                        logging.debug("Deduplicated %s: %s records (from %s)", sheet, result['rows_out'], initial_count)
+
+                        columns_to_drop = result['columns_to_drop']
                         if columns_to_drop:
-                            self.output_text.append(f"\n将删除的包含‘货品’或‘商家编码’的列: {columns_to_drop}")
-                            logging.debug(f"Dropping columns: {columns_to_drop}")
-                            df = df.drop(columns=columns_to_drop)
+                            self.output_text.append(f"\n已删除的包含‘货品’或‘商家编码’的列: {columns_to_drop}")
+                            logging.debug("Dropping columns: %s", columns_to_drop)
                         else:
                             self.output_text.append("\n未找到包含‘货品’或‘商家编码’的列")
                             logging.debug("No columns with '货品' or '商家编码' found")
-                        
-                        self.output_text.append(f"\n处理后的前 5 行数据:\n{df.head().to_string()}")
-                        logging.debug(f"Processed {sheet} head: {df.head().to_string()}")
-                        
-                        df.to_excel(writer, sheet_name=sheet, index=False)
-                        self.output_text.append(f"\n{sheet} 处理结果已保存到: {os.path.basename(output_file)}（Sheet: {sheet}）")
-                        logging.debug(f"Saved {sheet} to {output_file}")
-                    
-                    writer.close()
+
+                        self.output_text.append(f"\n处理后的前 5 行数据:\n{result['head'].to_string()}")
+                        logging.debug("Processed %s head: %s", sheet, lazy(result['head'].to_string))
+
+                        rows_out += result['rows_out']
+                        if writer is not None:
+                            with self.profiler.span('to_excel'):
+                                result['data'].to_excel(writer, sheet_name=sheet, index=False)
+                            self.output_text.append(f"\n{sheet} 处理结果已保存到: {os.path.basename(output_file)}（Sheet: {sheet}）")
+                            logging.debug("Saved %s to %s", sheet, output_file)
+                        else:
+                            self.output_text.append(f"\n{sheet} 处理结果已保存到: {os.path.basename(output_file)}/{os.path.basename(result['output'])}")
+                            logging.debug("Saved %s to %s", sheet, result['output'])
+                        QApplication.processEvents()
+
+                    if writer is not None:
+                        with self.profiler.span('to_excel'):
+                            writer.close()
+                    self.profiler.rows(rows_in=rows_in, rows_out=rows_out)
                     self.output_text.append(f"\n去重及删除货品字段后的结果已保存到: {os.path.basename(output_file)}")
-                    logging.debug(f"Saved final shipping data to: {output_file}")
+                    logging.debug("Saved final shipping data to: %s", output_file)
                     return output_file
-                
+
                 except Exception as e:
                     self.output_text.append(f"\n保存最终结果错误: {e}")
-                    logging.error(f"Failed to save final shipping data to {output_file}: {e}")
+                    logging.error("Failed to save final shipping data to %s: %s", output_file, e)
                     QMessageBox.critical(self, "错误", f"保存 {os.path.basename(output_file)} 失败: {e}")
                     return None
 
             except Exception as e:
                 self.output_text.append(f"\n处理错误: {e}")
-                logging.error(f"Failed to process {input_file}: {e}")
+                logging.error("Failed to process %s: %s", input_file, e)
                 QMessageBox.critical(self, "错误", f"处理 {os.path.basename(input_file)} 失败: {e}")
                 return None
         else:
             self.output_text.append(f"\n文件 {os.path.basename(input_file)} 不存在！")
-            logging.error(f"Input file not found: {input_file}")
+            logging.error("Input file not found: %s", input_file)
             QMessageBox.critical(self, "错误", f"文件 {os.path.basename(input_file)} 不存在！")
             return None
 
+    def process_sheets(self, input_file, sheet_names, targets):
+        """各 sheet 在进程池中并行读取、去重（targets[sheet] 不为空时同时单独写出），按 sheet 顺序逐个返回结果，
+        主线程按顺序写入同一个工作簿，写前面的 sheet 时后面的 sheet 仍在处理；只有一个 sheet 或一个 CPU 时直接处理"""
+        max_workers = min(len(sheet_names), os.cpu_count() or 1)
+        if max_workers < 2:
+            for sheet in sheet_names:
+                with self.profiler.span('process_sheet'):
+                    result = process_shipping_sheet(input_file, sheet, read_intermediate, targets[sheet])
+                yield result
+            return
+        self.output_text.append(f"\n{len(sheet_names)} 个 sheet 并行处理（{max_workers} 个进程）")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(process_shipping_sheet, input_file, sheet, read_intermediate, targets[sheet])
+                       for sheet in sheet_names]
+            for future in futures:
+                with self.profiler.span('wait_sheet'):
+                    while not wait([future], timeout=0.05).done:
+                        QApplication.processEvents()
+                yield future.result()
+
 def main():
+    setup_logging()
     try:
         app = QApplication(sys.argv)
         window = OrderDataProcessor()
         window.show()
         sys.exit(app.exec_())
     except Exception as e:
-        logging.error(f"Main function error: {e}")
+        logging.error("Main function error: %s", e)
         raise
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包为 exe 后进程池（发货数据各 sheet 并行）需要
     main()
\ No newline at end of file
@@ -0,0 +1,203 @@
+# incremental_store.py
+"""增量关联分析计数库。
+
+持久化保存累计事务数、单商品计数、商品对计数，以及全量挖掘时跟踪的高阶项集（3 个及以上商品）计数。
+每日新增的订单导出经过与 data_clean / data_clean2 相同的清洗规则后累加进计数库，规则直接由累计计数生成。
+
+单商品和商品对的计数是精确的；高阶项集只累加全量挖掘时跟踪的那些，之后才变得频繁的高阶项集不在计数库中。
+未跟踪项集在全量挖掘时的计数低于 support_floor × TRACKING_MARGIN × 当时的事务数，之后每批最多增加
+min(该批含 3 个及以上商品的事务数, 该批最大的商品对计数)（高阶项集的计数不超过其中任一商品对的计数），
+这些增量的累计值记在 untracked_growth。两者之和仍低于 min_support × 累计事务数时，结果与全量挖掘一致；
+否则（或请求的支持度低于 support_floor 时）需要对所有历史批次做一次全量重新挖掘，见 needs_full_remine。
+
+同一订单编号只计入最先出现的批次：重新保存的导出（路径、大小或修改时间变了但内容相同）或与已累加文件
+有重叠订单的新文件，其中已计入的订单会被跳过，不会重复计数；全量重新挖掘时按批次顺序采用相同的规则。
+"""
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import apriori
+from scipy.sparse import csr_matrix, triu
+
+from apriori_core import read_order_items, clean_order_items, build_item_name_mapping, one_hot_encode
+
+STORE_VERSION = 3
+# 跟踪的高阶项集支持度下限为 support_floor × TRACKING_MARGIN，为新增数据带来的支持度漂移留出余量
+TRACKING_MARGIN = 0.5
+
+
+def drop_counted_orders(frames, order_ids):
+    """按顺序去掉各批数据中订单编号已在 order_ids（或前面的数据）中出现的订单，并把新的订单编号加入 order_ids；
+    返回 (去掉后的数据列表, 跳过的订单数)"""
+    kept, skipped = [], 0
+    for df in frames:
+        counted = df['订单编号'].isin(order_ids)
+        skipped += df.loc[counted, '订单编号'].nunique()
+        df = df[~counted]
+        order_ids.update(df['订单编号'].dropna())
+        kept.append(df)
+    return kept, skipped
+
+
+class IncrementalItemsetStore:
+    """累计计数库，保存在 path 指定的 pickle 文件中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.n_transactions = 0
+        self.item_counts = Counter()
+        self.pair_counts = Counter()  # {(编码A, 编码B): 计数}，A < B
+        self.tracked_counts = {}  # {frozenset: 计数}，仅包含 3 个及以上商品的项集
+        self.support_floor = None
+        self.remine_transactions = None  # 上次全量挖掘时的事务数
+        self.untracked_growth = 0  # 上次全量挖掘后未跟踪高阶项集计数可能增加的上限
+        self.batches = {}  # {批次指纹: 文件路径}
+        self.order_ids = set()  # 已累加批次中的全部订单编号
+        self.item_names = {}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        state = pd.read_pickle(self.path)
+        if state.get('version') not in (1, 2, STORE_VERSION):
+            return
+        self.n_transactions = state['n_transactions']
+        self.item_counts = state['item_counts']
+        self.pair_counts = state['pair_counts']
+        self.tracked_counts = state['tracked_counts']
+        self.support_floor = state['support_floor']
+        # 版本 1 没有记录漂移，remine_transactions 为 None，下次运行时全量重新挖掘
+        self.remine_transactions = state.get('remine_transactions')
+        self.untracked_growth = state.get('untracked_growth', 0)
+        self.batches = state['batches']
+        if 'order_ids' in state:
+            self.order_ids = state['order_ids']
+        else:
+            # 版本 2 及以前没有记录订单编号，无法识别重复的订单，下次运行时全量重新挖掘
+            self.remine_transactions = None
+        self.item_names = state['item_names']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        state = {
+            'version': STORE_VERSION,
+            'n_transactions': self.n_transactions,
+            'item_counts': self.item_counts,
+            'pair_counts': self.pair_counts,
+            'tracked_counts': self.tracked_counts,
+            'support_floor': self.support_floor,
+            'remine_transactions': self.remine_transactions,
+            'untracked_growth': self.untracked_growth,
+            'batches': self.batches,
+            'order_ids': self.order_ids,
+            'item_names': self.item_names,
+        }
+        tmp_path = self.path + '.tmp'
+        pd.to_pickle(state, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def untracked_count_bound(self):
+        """未跟踪的高阶项集当前计数的上限（不含）；从未全量挖掘时为 None"""
+        if self.support_floor is None or self.remine_transactions is None:
+            return None
+        return self.support_floor * TRACKING_MARGIN * self.remine_transactions + self.untracked_growth
+
+    def needs_full_remine(self, min_support):
+        """请求的支持度低于跟踪下限、从未全量挖掘，或新增数据可能使未跟踪的高阶项集达到 min_support 时
+        需要全量重新挖掘"""
+        if self.support_floor is None or min_support < self.support_floor:
+            return True
+        bound = self.untracked_count_bound()
+        return bound is None or bound > min_support * self.n_transactions
+
+    def _count(self, df_cleaned):
+        """累加一批已清洗数据的单商品、商品对和跟踪项集计数"""
+        pairs = df_cleaned[['订单编号', '商家编码']].drop_duplicates()
+        if pairs.empty:
+            return 0
+        order_idx, orders = pd.factorize(pairs['订单编号'])
+        item_idx, items = pd.factorize(pairs['商家编码'].astype(str), sort=True)
+        matrix = csr_matrix((np.ones(len(pairs), dtype=np.int32), (order_idx, item_idx)),
+                            shape=(len(orders), len(items)))
+
+        self.n_transactions += len(orders)
+        self.item_counts.update(dict(zip(items, np.asarray(matrix.sum(axis=0)).ravel().tolist())))
+
+        co_occurrence = triu(matrix.T @ matrix, k=1).tocoo()
+        self.pair_counts.update({(items[a], items[b]): int(c)
+                                 for a, b, c in zip(co_occurrence.row, co_occurrence.col, co_occurrence.data)})
+        if co_occurrence.nnz:
+            wide_orders = int((np.diff(matrix.indptr) >= 3).sum())
+            self.untracked_growth += min(wide_orders, int(co_occurrence.data.max()))
+
+        if self.tracked_counts:
+            csc = matrix.tocsc()
+            column = {item: idx for idx, item in enumerate(items)}
+            for itemset in self.tracked_counts:
+                if not all(item in column for item in itemset):
+                    continue
+                rows = None
+                for item in itemset:
+                    j = column[item]
+                    col_rows = csc.indices[csc.indptr[j]:csc.indptr[j + 1]]
+                    rows = col_rows if rows is None else np.intersect1d(rows, col_rows, assume_unique=True)
+                    if len(rows) == 0:
+                        break
+                self.tracked_counts[itemset] += len(rows)
+
+        for code, name in build_item_name_mapping(df_cleaned).items():
+            self.item_names.setdefault(str(code), name)
+        return len(orders)
+
+    def add_batch(self, frames, batch_files):
+        """累加一批新文件（read_order_items 读取的数据，与 batch_files 的顺序一致）；
+        batch_files 为 {批次指纹: 文件路径}，已处理过的批次应在调用前排除。
+        订单编号已累加过的订单跳过，返回 (新增事务数, 跳过的订单数)"""
+        frames, skipped = drop_counted_orders(frames, self.order_ids)
+        added = self._count(clean_order_items(frames))
+        self.batches.update(batch_files)
+        return added, skipped
+
+    def full_remine(self, support_floor):
+        """重新读取所有历史批次，从头计数并在 support_floor × TRACKING_MARGIN 下重新确定跟踪的高阶项集"""
+        missing = [path for path in self.batches.values() if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"以下历史批次文件不存在，无法全量重新挖掘: {', '.join(missing)}")
+        self.order_ids = set()
+        frames, _ = drop_counted_orders([read_order_items(path) for path in self.batches.values()], self.order_ids)
+        df_cleaned = clean_order_items(frames)
+        df_cleaned = df_cleaned.assign(商家编码=df_cleaned['商家编码'].astype(str))
+
+        self.n_transactions = 0
+        self.item_counts = Counter()
+        self.pair_counts = Counter()
+        self.tracked_counts = {}
+        self.item_names = {}
+        self._count(df_cleaned)
+
+        self.support_floor = support_floor
+        self.remine_transactions = self.n_transactions
+        self.untracked_growth = 0
+        if self.n_transactions:
+            one_hot_df = one_hot_encode(df_cleaned)
+            tracking_support = support_floor * TRACKING_MARGIN
+            itemsets = apriori(one_hot_df, min_support=tracking_support, use_colnames=True)
+            higher = itemsets[itemsets['itemsets'].map(len) >= 3]
+            self.tracked_counts = {
+                frozenset(itemset): int(round(support * self.n_transactions))
+                for itemset, support in zip(higher['itemsets'], higher['support'])
+            }
+        return len(self.tracked_counts)
+
+    def frequent_itemsets(self, min_support):
+        """由累计计数生成 support ≥ min_support 的频繁项集（support, itemsets 两列）"""
+        if self.needs_full_remine(min_support):
+            raise ValueError(f"最小支持度 {min_support:.4f} 低于跟踪下限或新增数据超出跟踪余量，需要全量重新挖掘")
+        n = self.n_transactions
+        min_count = min_support * n
+        records = [(count / n, frozenset([item])) for item, count in self.item_counts.items() if count >= min_count]
+        records += [(count / n, frozenset(pair)) for pair, count in self.pair_counts.items() if count >= min_count]
+        records += [(count / n, itemset) for itemset, count in self.tracked_counts.items() if count >= min_count]
+        return pd.DataFrame(records, columns=['support', 'itemsets'])
+
@@ -0,0 +1,292 @@
+# instrumentation.py
+"""处理流程的分步骤性能记录。
+
+每个处理步骤（@profiled_stage 装饰的窗口方法）记录耗时、CPU 时间、输入/输出行数和峰值内存（后台线程采样进程 RSS），
+步骤内部可以用 profiler.span('read_excel') 标出 read_excel、iterrows、pivot_table、to_excel 等子操作。
+结果可导出为 Chrome trace 格式的 JSON（在 chrome://tracing 或 https://ui.perfetto.dev 中打开），
+也可以在界面中以汇总表查看。可选对单个步骤做 cProfile（或 pyinstrument）剖析。
+"""
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton,
+                             QCheckBox, QComboBox, QLabel, QWidget, QHeaderView)
+
+try:
+    import psutil
+except ImportError:  # 未安装 psutil 时在 Linux 上读取 /proc，其他系统不统计内存
+    psutil = None
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument 为可选依赖，未安装时只提供 cProfile
+    pyinstrument = None
+
+RSS_SAMPLE_INTERVAL = 0.02
+PROFILE_ENGINES = ['cProfile'] + (['pyinstrument'] if pyinstrument is not None else [])
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），无法获取时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """在后台线程中定期采样进程内存，记录运行期间的峰值"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+
+    def __enter__(self):
+        self._sample()
+
+        def poll():
+            while not self._stop.wait(self.interval):
+                self._sample()
+        self._thread = threading.Thread(target=poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+class StageProfiler:
+    """记录步骤（stage）和子操作（span）；步骤可以嵌套，子操作归属于当前所在的步骤"""
+
+    def __init__(self):
+        self.profile_stage = None  # 需要剖析的步骤名称
+        self.profile_engine = 'cProfile'
+        self.output_dir = None  # 剖析结果的保存目录
+        self.reset()
+
+    def reset(self):
+        self.records = []
+        self._stack = []
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def _record(self, name, kind):
+        record = {
+            'name': name, 'kind': kind, 'depth': len(self._stack),
+            'start': time.perf_counter() - self._origin,
+            'seconds': None, 'cpu_seconds': None, 'rows_in': None, 'rows_out': None,
+            'peak_memory_mb': None, 'profile_file': None,
+        }
+        self.records.append(record)
+        self._stack.append(record)
+        sampler = RssSampler() if kind == 'stage' else None
+        capture = self._start_capture(name) if kind == 'stage' else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if sampler is not None:
+            sampler.__enter__()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            if sampler is not None:
+                sampler.__exit__(None, None, None)
+                if sampler.peak is not None:
+                    record['peak_memory_mb'] = sampler.peak / 1024 ** 2
+            if capture is not None:
+                record['profile_file'] = self._stop_capture(name, capture)
+            self._stack.remove(record)
+
+    def stage(self, name):
+        return self._record(name, 'stage')
+
+    def span(self, name):
+        return self._record(name, 'span')
+
+    def rows(self, rows_in=None, rows_out=None):
+        """设置当前步骤的输入/输出行数（在步骤外调用时忽略）"""
+        stages = [record for record in self._stack if record['kind'] == 'stage']
+        if not stages:
+            return
+        if rows_in is not None:
+            stages[-1]['rows_in'] = int(rows_in)
+        if rows_out is not None:
+            stages[-1]['rows_out'] = int(rows_out)
+
+    def _start_capture(self, name):
+        if name != self.profile_stage:
+            return None
+        if self.profile_engine == 'pyinstrument' and pyinstrument is not None:
+            capture = pyinstrument.Profiler()
+        else:
+            capture = cProfile.Profile()
+        capture.enable() if isinstance(capture, cProfile.Profile) else capture.start()
+        return capture
+
+    def _stop_capture(self, name, capture):
+        output_dir = self.output_dir or os.getcwd()
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        if isinstance(capture, cProfile.Profile):
+            capture.disable()
+            path = os.path.join(output_dir, f"性能剖析_{name}_{stamp}.prof")
+            capture.dump_stats(path)
+        else:
+            capture.stop()
+            path = os.path.join(output_dir, f"性能剖析_{name}_{stamp}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(capture.output_html())
+        return path
+
+    def chrome_trace(self):
+        """Chrome trace 格式（完整事件 ph='X'，时间单位为微秒）"""
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            if record['seconds'] is None:
+                continue
+            args = {key: record[key] for key in ('cpu_seconds', 'rows_in', 'rows_out', 'peak_memory_mb', 'profile_file')
+                    if record[key] is not None}
+            events.append({
+                'name': record['name'], 'cat': record['kind'], 'ph': 'X', 'pid': pid, 'tid': 1,
+                'ts': round(record['start'] * 1e6), 'dur': round(record['seconds'] * 1e6), 'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        return path
+
+    def summary_rows(self):
+        """汇总表：每个步骤一行，子操作缩进显示在所属步骤下"""
+        return [record for record in self.records if record['seconds'] is not None]
+
+    def format_summary(self):
+        lines = [f"{'步骤':<32}{'耗时(秒)':>10}{'CPU(秒)':>10}{'输入行':>10}{'输出行':>10}{'峰值内存(MB)':>14}"]
+        for record in self.summary_rows():
+            name = '  ' * record['depth'] + record['name']
+            lines.append(f"{name:<32}{record['seconds']:>10.2f}{record['cpu_seconds']:>10.2f}"
+                         f"{_format_optional(record['rows_in'], 'd'):>10}{_format_optional(record['rows_out'], 'd'):>10}"
+                         f"{_format_optional(record['peak_memory_mb'], '.1f'):>14}")
+        return '\n'.join(lines)
+
+
+def _format_optional(value, spec):
+    return '' if value is None else format(value, spec)
+
+
+def profiled_stage(name=None):
+    """将窗口方法标记为处理步骤，使用 self.profiler 记录；name 默认为方法名"""
+    def decorator(method):
+        stage_name = name or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(stage_name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class StageSummaryDialog(QDialog):
+    """以表格显示最近一次运行的分步骤性能数据"""
+
+    COLUMNS = ['步骤', '耗时(秒)', 'CPU(秒)', '输入行数', '输出行数', '峰值内存(MB)', '剖析文件']
+
+    def __init__(self, profiler, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('分步骤性能汇总')
+        self.resize(900, 420)
+        layout = QVBoxLayout(self)
+        rows = profiler.summary_rows()
+        total = sum(record['seconds'] for record in rows if record['depth'] == 0)
+        layout.addWidget(QLabel(f"共 {sum(record['kind'] == 'stage' for record in rows)} 个步骤，合计 {total:.2f} 秒；"
+                                f"缩进的行为步骤内部的子操作。", self))
+
+        table = QTableWidget(len(rows), len(self.COLUMNS), self)
+        table.setHorizontalHeaderLabels(self.COLUMNS)
+        for row, record in enumerate(rows):
+            values = [
+                '    ' * record['depth'] + record['name'],
+                f"{record['seconds']:.3f}",
+                f"{record['cpu_seconds']:.3f}",
+                _format_optional(record['rows_in'], 'd'),
+                _format_optional(record['rows_out'], 'd'),
+                _format_optional(record['peak_memory_mb'], '.1f'),
+                os.path.basename(record['profile_file']) if record['profile_file'] else '',
+            ]
+            for col, value in enumerate(values):
+                table.setItem(row, col, QTableWidgetItem(value))
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(table)
+
+        close_button = QPushButton('关闭', self)
+        close_button.clicked.connect(self.accept)
+        layout.addWidget(close_button)
+
+
+class ProfilingControls(QWidget):
+    """窗口中的性能记录控件：导出 Chrome trace、选择剖析的步骤、查看汇总表"""
+
+    def __init__(self, profiler, stage_names, parent=None):
+        super().__init__(parent)
+        self.profiler = profiler
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.trace_checkbox = QCheckBox('导出性能追踪（Chrome trace JSON）', self)
+        layout.addWidget(self.trace_checkbox)
+        layout.addWidget(QLabel('剖析步骤：', self))
+        self.profile_combo = QComboBox(self)
+        self.profile_combo.addItem('不剖析', None)
+        for stage_name in stage_names:
+            self.profile_combo.addItem(stage_name, stage_name)
+        layout.addWidget(self.profile_combo)
+        self.engine_combo = QComboBox(self)
+        self.engine_combo.addItems(PROFILE_ENGINES)
+        layout.addWidget(self.engine_combo)
+        self.summary_button = QPushButton('性能汇总', self)
+        self.summary_button.clicked.connect(self.show_summary)
+        layout.addWidget(self.summary_button)
+
+    def start(self, output_dir):
+        """每次运行开始时调用：清空记录并应用剖析设置"""
+        self.profiler.reset()
+        self.profiler.output_dir = output_dir
+        self.profiler.profile_stage = self.profile_combo.currentData()
+        self.profiler.profile_engine = self.engine_combo.currentText()
+
+    def finish(self, log):
+        """每次运行结束时调用：输出汇总表，按需导出 Chrome trace，返回 trace 文件路径"""
+        if not self.profiler.summary_rows():
+            return None
+        log("\n=== 分步骤性能汇总 ===\n" + self.profiler.format_summary())
+        for record in self.profiler.records:
+            if record['profile_file']:
+                log(f"步骤 {record['name']} 的剖析结果已保存到: {record['profile_file']}")
+        if not self.trace_checkbox.isChecked() or not self.profiler.output_dir:
+            return None
+        path = os.path.join(self.profiler.output_dir, f"性能追踪_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        self.profiler.write_chrome_trace(path)
+        log(f"性能追踪已保存到: {path}（可在 chrome://tracing 或 ui.perfetto.dev 中打开）")
+        return path
+
+    def show_summary(self):
+        StageSummaryDialog(self.profiler, self).exec_()
@@ -0,0 +1,134 @@
+# itemset_cache.py
+import glob
+import hashlib
+import os
+import pandas as pd
+
+# 清洗步骤或缓存内容结构变化时递增，使旧缓存自动失效（排除规则的变化由指纹中的 matcher 反映）
+CACHE_VERSION = 2
+
+
+def fingerprint_files(file_paths, matcher=None):
+    """根据文件路径、大小和修改时间计算输入数据指纹（不读取文件内容）；
+    matcher 为清洗时使用的 ExclusionMatcher，其规则列表和匹配方式也计入指纹"""
+    digest = hashlib.sha1(f"v{CACHE_VERSION}".encode('utf-8'))
+    if matcher is not None:
+        digest.update(matcher.signature().encode('utf-8'))
+    for path in sorted(os.path.abspath(p) for p in file_paths):
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ItemsetCache:
+    """频繁项集缓存：按输入数据指纹和最小支持度缓存挖掘结果，内存和磁盘两级。
+
+    命中条件为指纹一致且缓存的支持度 <= 请求的支持度，此时直接按支持度过滤缓存的项集，无需重新挖掘。
+    挖掘前预检按内存预算提高了支持度时，缓存按实际挖掘的支持度保存，另在请求的支持度下记一个别名，
+    再次以同一支持度（且开启预检自动调整）请求时命中该别名，返回提高后的结果。
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._memory = {}  # {fingerprint: {min_support: entry}}
+
+    def _disk_path(self, fingerprint, min_support):
+        return os.path.join(self.cache_dir, f"{fingerprint}_{min_support:.8f}.pkl")
+
+    @staticmethod
+    def _find(entries, min_support):
+        """按磁盘文件名的精度查找支持度对应的键，找不到返回 None"""
+        for support in entries:
+            if round(support, 8) == round(min_support, 8):
+                return support
+        return None
+
+    def _write(self, fingerprint, min_support, entry):
+        self._memory.setdefault(fingerprint, {})[min_support] = entry
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(fingerprint, min_support)
+            tmp_path = path + '.tmp'
+            pd.to_pickle(entry, tmp_path)
+            os.replace(tmp_path, path)
+
+    def _load_disk_entries(self, fingerprint):
+        """把磁盘上该指纹的缓存读入内存"""
+        entries = self._memory.setdefault(fingerprint, {})
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return entries
+        for path in glob.glob(os.path.join(self.cache_dir, f"{fingerprint}_*.pkl")):
+            try:
+                min_support = float(os.path.basename(path)[len(fingerprint) + 1:-4])
+            except ValueError:
+                continue
+            if min_support in entries:
+                continue
+            try:
+                entries[min_support] = pd.read_pickle(path)
+            except Exception:
+                # 缓存文件损坏时忽略，后续会重新挖掘并覆盖
+                continue
+        return entries
+
+    def n_transactions(self, fingerprint):
+        """返回缓存中记录的事务数，没有缓存时返回 None"""
+        entries = self._memory.get(fingerprint) or self._load_disk_entries(fingerprint)
+        for entry in entries.values():
+            if 'adjusted_support' not in entry:
+                return entry['n_transactions']
+        return None
+
+    def get(self, fingerprint, min_support, allow_adjusted=False):
+        """查找可复用的缓存，返回按 min_support 过滤后的条目副本；未命中返回 None。
+        allow_adjusted 为 True 时（预检可自动提高支持度）也查找别名，命中时条目中的 adjusted_support 为提高后的支持度"""
+        entries = self._memory.get(fingerprint)
+        if not entries or not any(s <= min_support for s in entries):
+            entries = self._load_disk_entries(fingerprint)
+        candidates = [s for s in entries if s <= min_support and 'adjusted_support' not in entries[s]]
+        if not candidates:
+            return self._get_adjusted(entries, min_support) if allow_adjusted else None
+        # 选择支持度最高的可用缓存，过滤的数据量最小
+        cached_support = max(candidates)
+        entry = entries[cached_support]
+        itemsets = entry['frequent_itemsets']
+        if cached_support < min_support:
+            itemsets = itemsets[itemsets['support'] >= min_support].reset_index(drop=True)
+        return {
+            'frequent_itemsets': itemsets,
+            'n_transactions': entry['n_transactions'],
+            'item_name_mapping': entry['item_name_mapping'],
+            'cached_support': cached_support,
+        }
+
+    def _get_adjusted(self, entries, min_support):
+        """按别名查找预检提高支持度后挖掘的缓存"""
+        alias = self._find(entries, min_support)
+        if alias is None or 'adjusted_support' not in entries[alias]:
+            return None
+        cached_support = self._find(entries, entries[alias]['adjusted_support'])
+        if cached_support is None or 'adjusted_support' in entries[cached_support]:
+            return None
+        entry = entries[cached_support]
+        return {
+            'frequent_itemsets': entry['frequent_itemsets'],
+            'n_transactions': entry['n_transactions'],
+            'item_name_mapping': entry['item_name_mapping'],
+            'cached_support': cached_support,
+            'adjusted_support': cached_support,
+        }
+
+    def put(self, fingerprint, min_support, frequent_itemsets, n_transactions, item_name_mapping,
+            requested_support=None):
+        """写入内存缓存，并尽量持久化到磁盘；requested_support 低于 min_support（预检提高了支持度）时另记别名"""
+        self._write(fingerprint, min_support, {
+            'frequent_itemsets': frequent_itemsets,
+            'n_transactions': n_transactions,
+            'item_name_mapping': item_name_mapping,
+        })
+        if requested_support is not None and requested_support < min_support:
+            entries = self._memory[fingerprint]
+            existing = self._find(entries, requested_support)
+            if existing is None or 'adjusted_support' in entries[existing]:
+                self._write(fingerprint, requested_support if existing is None else existing,
+                            {'adjusted_support': min_support})
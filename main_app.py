@@ -1,11 +1,38 @@
 import sys
 import os
+import threading
+import multiprocessing
+from contextlib import contextmanager
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QLabel
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import Qt
-import abnormal_order_data
-import apriori_app
-import fee  # 新增导入 fee.py
+from app_logging import setup_logging
+# 功能模块（abnormal_order_data、apriori_app、fee）及其依赖的 pandas、openpyxl、mlxtend 导入较慢，
+# 在点击按钮时才导入，主菜单可以立即显示；菜单显示后由 warm_up_modules 在后台线程中提前导入
+
+
+def warm_up_modules():
+    """在后台线程中预先导入各功能模块，导入失败时不处理，点击按钮时会再次导入并报错"""
+    def load():
+        try:
+            import abnormal_order_data  # noqa: F401（pandas、openpyxl）
+            import fee  # noqa: F401
+            import apriori_app  # noqa: F401（mlxtend、scipy）
+        except Exception:
+            pass
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+
+@contextmanager
+def busy_cursor():
+    """模块尚未加载完成时，打开窗口期间显示等待光标"""
+    QApplication.setOverrideCursor(Qt.WaitCursor)
+    try:
+        yield
+    finally:
+        QApplication.restoreOverrideCursor()
 
 class MainApp(QMainWindow):
     def __init__(self):
@@ -57,27 +84,36 @@ class MainApp(QMainWindow):
 
     def open_order_processor(self):
         if self.order_processor_window is None:
-            self.order_processor_window = abnormal_order_data.OrderDataProcessor(self)
+            with busy_cursor():
+                import abnormal_order_data
+                self.order_processor_window = abnormal_order_data.OrderDataProcessor(self)
             self.order_processor_window.closed.connect(self.show)  # 连接关闭信号
         self.order_processor_window.show()
         self.hide()
 
     def open_apriori(self):
         if self.apriori_window is None:
-            self.apriori_window = apriori_app.AprioriApp(self)
+            with busy_cursor():
+                import apriori_app
+                self.apriori_window = apriori_app.AprioriApp(self)
             self.apriori_window.closed.connect(self.show)  # 连接关闭信号
         self.apriori_window.show()
         self.hide()
 
     def open_fee(self):
         if self.fee_window is None:
-            self.fee_window = fee.OrderDataProcessor(self)  # 使用 fee.py 的 OrderDataProcessor
+            with busy_cursor():
+                import fee
+                self.fee_window = fee.OrderDataProcessor(self)  # 使用 fee.py 的 OrderDataProcessor
             self.fee_window.closed.connect(self.show)  # 连接关闭信号
         self.fee_window.show()
         self.hide()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包为 exe 后进程池（分区挖掘）需要
+    setup_logging()
     app = QApplication(sys.argv)
     window = MainApp()
     window.show()
+    warm_up_modules()
     sys.exit(app.exec_())
\ No newline at end of file
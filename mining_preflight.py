@@ -0,0 +1,158 @@
+# mining_preflight.py
+"""频繁项集挖掘前的规模和内存预估。
+
+只统计单商品计数和商品对共现计数（稀疏矩阵乘法），据此估计 Apriori 各层候选项集数量和内存峰值：
+mlxtend 的 apriori 每一层会构造 事务数 × 候选数 × 项集长度 的布尔数组，支持度过低时这一层会耗尽内存。
+2 项候选数为 C(频繁商品数, 2)；3 项候选数按前缀连接计算：以商品 i 为最小元素的频繁商品对有 d_i 个，
+则以 i 为前缀的 3 项候选不超过 C(d_i, 2)。更高层的候选由 3 项频繁项集连接产生，数量通常远小于前两层，不做估计。
+预估超出内存预算时自动切换为 FP-Growth（必要时使用稀疏输入）或逐步提高最小支持度。
+"""
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, triu
+from scipy.special import comb
+
+try:
+    import psutil
+except ImportError:  # 未安装 psutil 时使用固定的内存预算
+    psutil = None
+
+# 未安装 psutil 时的内存预算；安装时取可用内存的 MEMORY_BUDGET_FRACTION
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+MEMORY_BUDGET_FRACTION = 0.5
+# 预估频繁项集数超过该值时提高支持度（结果表本身也会占用大量内存，且无法在 Excel 中查看）
+MAX_ESTIMATED_ITEMSETS = 2000000
+# 每次提高支持度的倍数
+SUPPORT_RAISE_FACTOR = 1.5
+# 每个频繁项集（frozenset + 行）和每个 FP 树节点的大致内存
+ITEMSET_BYTES = 300
+FP_NODE_BYTES = 200
+# 稀疏输入每个非零元素的大致内存（值 + 行号）
+SPARSE_ENTRY_BYTES = 9
+ENGINE_NAMES = {'apriori': 'Apriori', 'fpgrowth': 'FP-Growth'}
+
+
+def memory_budget():
+    """挖掘可使用的内存预算（字节）"""
+    if psutil is None:
+        return DEFAULT_MEMORY_BUDGET
+    return int(psutil.virtual_memory().available * MEMORY_BUDGET_FRACTION)
+
+
+def format_bytes(n_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n_bytes < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TB"
+
+
+class MiningCostEstimator:
+    """构造时统计一次单商品和商品对计数，之后可对不低于 min_support 的任意支持度快速估计挖掘规模"""
+
+    def __init__(self, order_ids, item_codes, min_support):
+        order_idx, orders = pd.factorize(pd.Series(order_ids))
+        # 列顺序与 one_hot_encode 一致（按编码排序），Apriori 按该顺序连接候选项集
+        item_idx, items = pd.factorize(pd.Series(item_codes), sort=True)
+        # 用整数键对（订单，商品）去重，比对字符串列去重快得多
+        keys = np.unique(order_idx.astype(np.int64) * len(items) + item_idx)
+        order_idx, item_idx = keys // len(items), keys % len(items)
+        self.n_transactions = len(orders)
+        self.n_items = len(items)
+        self.nnz = len(keys)
+        self.item_counts = np.bincount(item_idx, minlength=self.n_items)
+        self.base_support = min_support
+
+        # 只有频繁商品才可能组成频繁商品对
+        in_frequent = (self.item_counts >= self._min_count(min_support))[item_idx]
+        matrix = csr_matrix((np.ones(int(in_frequent.sum()), dtype=np.int32),
+                             (order_idx[in_frequent], item_idx[in_frequent])),
+                            shape=(self.n_transactions, self.n_items))
+        co_occurrence = triu(matrix.T @ matrix, k=1).tocoo()
+        keep = co_occurrence.data >= self._min_count(min_support)
+        self.pair_rows = co_occurrence.row[keep]
+        self.pair_counts = co_occurrence.data[keep]
+
+    def _min_count(self, min_support):
+        return int(np.ceil(min_support * self.n_transactions - 1e-9))
+
+    def estimate(self, min_support):
+        """估计给定支持度下的频繁商品数、频繁商品对数、候选项集数和各引擎的内存峰值"""
+        if min_support < self.base_support:
+            raise ValueError("估计的支持度不能低于构造时的支持度")
+        min_count = self._min_count(min_support)
+        n_tx = self.n_transactions
+        frequent_items = self.item_counts >= min_count
+        n_frequent_items = int(frequent_items.sum())
+        frequent_pairs = self.pair_counts >= min_count
+        n_frequent_pairs = int(frequent_pairs.sum())
+        out_degree = np.bincount(self.pair_rows[frequent_pairs], minlength=self.n_items)
+
+        candidates = {2: float(comb(n_frequent_items, 2)), 3: float(comb(out_degree, 2).sum())}
+        estimated_itemsets = n_frequent_items + n_frequent_pairs + candidates[3]
+
+        dense_bytes = n_tx * self.n_items
+        # apriori 每层：X[:, combin] 为 事务数 × 候选数 × k，再加上同样行列数的结果布尔数组
+        level_bytes = max(n_tx * count * (k + 1) for k, count in candidates.items())
+        apriori_bytes = dense_bytes + level_bytes + estimated_itemsets * ITEMSET_BYTES
+        frequent_nnz = int(self.item_counts[frequent_items].sum())
+        tree_bytes = frequent_nnz * FP_NODE_BYTES + estimated_itemsets * ITEMSET_BYTES
+        return {
+            'min_support': min_support,
+            'n_transactions': n_tx,
+            'n_items': self.n_items,
+            'n_frequent_items': n_frequent_items,
+            'n_frequent_pairs': n_frequent_pairs,
+            'candidates': candidates,
+            'estimated_itemsets': estimated_itemsets,
+            'dense_bytes': dense_bytes,
+            'apriori_bytes': apriori_bytes,
+            'fpgrowth_bytes': dense_bytes + tree_bytes,
+            'fpgrowth_sparse_bytes': self.nnz * SPARSE_ENTRY_BYTES + tree_bytes,
+        }
+
+
+def plan_mining(order_ids, item_codes, min_support, budget=None, auto_adjust=True):
+    """挖掘前预检：返回挖掘引擎、是否使用稀疏输入、实际使用的支持度、预估结果和提示信息。
+
+    auto_adjust 为 False 时只给出警告，仍按原支持度使用 Apriori。
+    """
+    budget = memory_budget() if budget is None else budget
+    estimator = MiningCostEstimator(order_ids, item_codes, min_support)
+    plan = {'engine': 'apriori', 'sparse': False, 'min_support': min_support,
+            'requested_support': min_support, 'budget': budget, 'messages': []}
+    support = min_support
+    while True:
+        estimate = estimator.estimate(support)
+        plan['estimate'] = estimate
+        fits_output = estimate['estimated_itemsets'] <= MAX_ESTIMATED_ITEMSETS
+        if not auto_adjust:
+            if estimate['apriori_bytes'] > budget or not fits_output:
+                plan['messages'].append(
+                    f"警告：预计 Apriori 内存峰值 {format_bytes(estimate['apriori_bytes'])}（预算 {format_bytes(budget)}），"
+                    f"预计频繁项集约 {estimate['estimated_itemsets']:.0f} 个，可能耗尽内存，建议提高最小支持度。")
+            return plan
+        if fits_output:
+            if estimate['apriori_bytes'] <= budget:
+                break
+            if estimate['fpgrowth_bytes'] <= budget:
+                plan['engine'] = 'fpgrowth'
+                break
+            if estimate['fpgrowth_sparse_bytes'] <= budget:
+                plan['engine'], plan['sparse'] = 'fpgrowth', True
+                break
+        if support >= 1:
+            plan['engine'], plan['sparse'] = 'fpgrowth', True
+            plan['messages'].append("警告：最小支持度已提高到 1 仍超出内存预算，按支持度 1 使用 FP-Growth 挖掘。")
+            break
+        support = min(support * SUPPORT_RAISE_FACTOR, 1.0)
+
+    plan['min_support'] = support
+    if support > min_support:
+        plan['messages'].append(
+            f"最小支持度 {min_support:.6f} 预计超出内存预算 {format_bytes(budget)}，已自动提高到 {support:.6f}。")
+    if plan['engine'] != 'apriori':
+        plan['messages'].append(
+            f"预计 Apriori 内存峰值 {format_bytes(estimate['apriori_bytes'])} 超出预算，改用 FP-Growth"
+            f"{'（稀疏输入）' if plan['sparse'] else ''}。")
+    return plan
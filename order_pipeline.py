@@ -0,0 +1,581 @@
+# order_pipeline.py
+"""超区发货订单处理的公共流程，abnormal_order_data.py、fee.py 和命令行共用。
+
+两个窗口的前四步（合并订单、提取省份、检测超区发货并合并库存、筛选商家编码）相同，费用数据只是多保留
+物流单号、拆自组合装两个字段，并剔除物流单号为空的记录。这些都是逐行筛选，因此可以先在全部记录上算一次，
+最后再剔除物流单号为空的记录，结果与单独运行相同。
+
+任务类型：
+- abnormal：缺货导致的超区发货数据（最终结果_缺货导致的超区发货数据.xlsx）
+- fee：超区发货费用数据（追加佛山、济南发货数据后按订单编号去重，最终结果_超区发货费用数据表.xlsx）
+- combined：订单和库存只读取、计算一次，公共部分完成后分别输出上面两个结果
+
+超区判断：济南仓覆盖 JINAN_COVERAGE 中的省份。佛山仓发往这些省份、济南仓发往其他省份，或收货地区提取不到省份的记录，视为超区发货。
+
+执行后端（--backend）：筛选、库存透视与合并、发货数据合并和去重可以由不同后端执行，结果相同。
+- pandas：默认，即本模块中的函数；
+- duckdb：在嵌入式 DuckDB 中以 SQL 执行（见 duckdb_backend.py），多线程，内存不足时中间结果写入临时目录；
+- polars：整个流程构建为一个 Polars LazyFrame 查询计划，一次执行（见 polars_backend.py）。
+--validate 用 pandas 再计算一次并逐表对比，确认结果一致后才写出。
+
+命令行用法：
+    python order_pipeline.py combined --orders 订单1.xlsx 订单2.xlsx --inventory 库存.xlsx --shipping 发货数据.xlsx --out 输出目录
+    python order_pipeline.py abnormal --orders 订单.xlsx --inventory 库存.xlsx --out 输出目录
+    python order_pipeline.py combined --backend duckdb --orders ... --inventory ... --shipping ...
+    python order_pipeline.py combined --format parquet --orders ... --inventory ... --shipping ...
+"""
+import argparse
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from instrumentation import StageProfiler
+from exclusion_rules import EXCLUSION_RULES, ExclusionMatcher
+from rule_export import EXPORT_FORMATS, write_table
+
+JOB_TYPES = ('abnormal', 'fee', 'combined')
+BACKENDS = ('pandas', 'duckdb', 'polars')
+ABNORMAL_ORDER_COLUMNS = ["订单编号", "店铺", "仓库", "子单原始单号", "付款时间", "收货地区", "商家编码", "货品名称", "下单数量"]
+# 费用数据额外保留的字段
+FEE_ONLY_COLUMNS = ["物流单号", "拆自组合装"]
+FEE_ORDER_COLUMNS = ABNORMAL_ORDER_COLUMNS + FEE_ONLY_COLUMNS
+FOSHAN_WAREHOUSE = '佛山-优赛-三水仓'
+JINAN_WAREHOUSE = '济南-优赛-市中'
+JINAN_COVERAGE = [
+    '北京', '天津', '河北省', '山西省', '内蒙古自治区', '辽宁省', '吉林省', '黑龙江省',
+    '上海', '江苏省', '浙江省', '安徽省', '山东省', '河南省', '湖北省', '北京市', '上海市', '天津市'
+]
+# 辅料商家编码：包含 exclusion_rules.EXCLUSION_RULES 中任意一条（不区分大小写）即筛掉
+MERCHANT_CODE_EXCLUSION = ExclusionMatcher(EXCLUSION_RULES, mode='substring')
+INVENTORY_COLUMNS = ['佛山仓期初库存', '济南仓期初库存', '佛山仓期末库存', '济南仓期末库存']
+FOSHAN_SHEET = '佛山发货数据'
+JINAN_SHEET = '济南发货数据'
+ABNORMAL_RESULT_FILE = "最终结果_缺货导致的超区发货数据.xlsx"
+FEE_RESULT_FILE = "最终结果_超区发货费用数据表.xlsx"
+# 结果格式：xlsx（默认）、csv、parquet；CSV/Parquet 不能包含多个 sheet，费用数据的每个 sheet 写入同名目录下的单独文件
+OUTPUT_FORMATS = tuple(extension.lstrip('.') for extension in EXPORT_FORMATS.values())
+# 付款时间为文本时依次尝试的格式（pandas 按第一个值推断的格式优先）
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M',
+                    '%Y-%m-%d', '%Y/%m/%d', '%Y%m%d%H%M%S', '%Y%m%d']
+DATETIME_SAMPLE_SIZE = 200
+UNKNOWN_MONTH = '未知月份'
+# 预先解析好的库存、发货数据（pickle），可代替 Excel 文件作为 inputs 中的 inventory、shipping
+PARSED_SUFFIX = '.parsed.pkl'
+
+
+class PipelineError(Exception):
+    """处理无法继续（没有可用的订单数据、缺少文件或 sheet 等），消息直接显示给用户"""
+
+
+def missing_columns(df, columns):
+    return [col for col in columns if col not in df.columns]
+
+
+def combine_orders(frames):
+    return pd.concat(frames, ignore_index=True)
+
+
+def drop_untracked_orders(df):
+    """剔除物流单号为空的记录（费用数据只统计已发货的订单）"""
+    return df[df['物流单号'].notna() & (df['物流单号'] != '')]
+
+
+def add_province(df):
+    """收货地区以空格分隔，第一段为省份；收货地区为空时省份为空"""
+    address = df['收货地区']
+    return df.assign(省份=address.where(address.isna(), address.astype(str).str.split().str[0]))
+
+
+def detect_datetime_format(values, sample_size=DATETIME_SAMPLE_SIZE):
+    """从均匀抽取的文本样本中检测日期时间格式，返回能解析样本最多的格式（个别无效值不影响检测）；
+    没有文本或都不匹配时为 None"""
+    values = values.dropna()
+    if values.empty:
+        return None
+    positions = np.unique(np.linspace(0, len(values) - 1, min(sample_size, len(values))).astype(int))
+    sample = pd.Series([value for value in values.iloc[positions] if isinstance(value, str)], dtype=object)
+    if sample.empty:
+        return None
+    guessed = guess_datetime_format(sample.iloc[0])
+    best, best_count = None, 0
+    for fmt in ([guessed] if guessed else []) + DATETIME_FORMATS:
+        count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if count == len(sample):
+            return fmt
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+
+def parse_datetime(values):
+    """文本按检测到的固定格式解析（不逐行推断），个别格式不同的值再逐个推断；无法解析的为 NaT"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    fmt = detect_datetime_format(values)
+    if fmt is None:
+        return pd.to_datetime(values, errors='coerce')
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        parsed[failed] = pd.to_datetime(values[failed], format='mixed', errors='coerce')
+    return parsed
+
+
+def add_month(df):
+    """月份为按月的 Period（内部是整数编码），写出 Excel 时显示为 YYYY-MM"""
+    paid_at = parse_datetime(df['付款时间'])
+    return df.assign(付款时间=paid_at, 月份=paid_at.dt.to_period('M'))
+
+
+def filter_warehouses(df):
+    """只保留佛山、济南两个仓库的记录"""
+    return df[df['仓库'].isin([FOSHAN_WAREHOUSE, JINAN_WAREHOUSE])]
+
+
+def out_of_region_mask(df):
+    """超区发货的记录：省份为空、佛山仓发往济南仓覆盖省份、济南仓发往覆盖范围以外的省份"""
+    province = df['省份']
+    in_coverage = province.isin(JINAN_COVERAGE)
+    return (province.isna()
+            | ((df['仓库'] == FOSHAN_WAREHOUSE) & in_coverage)
+            | ((df['仓库'] == JINAN_WAREHOUSE) & ~in_coverage))
+
+
+def pivot_inventory(inventory_df):
+    """按货品编号透视两个仓库的期初、期末库存"""
+    inventory_df = inventory_df.assign(货品编号=inventory_df['货品编号'].astype(str))
+    pivot = inventory_df.pivot_table(
+        values=['期初库存', '期末库存'],
+        index='货品编号',
+        columns='仓库名称',
+        aggfunc='sum',
+        fill_value=0
+    )
+    pivot.columns = inventory_column_names(pivot.columns)
+    return pivot.reset_index()
+
+
+def inventory_column_names(columns):
+    """透视表的（库存字段, 仓库名称）列改为“佛山仓期初库存”等名称，其他仓库的列保持原样"""
+    return [
+        '佛山仓期初库存' if FOSHAN_WAREHOUSE in col and '期初库存' in col else
+        '佛山仓期末库存' if FOSHAN_WAREHOUSE in col and '期末库存' in col else
+        '济南仓期初库存' if JINAN_WAREHOUSE in col and '期初库存' in col else
+        '济南仓期末库存' if JINAN_WAREHOUSE in col and '期末库存' in col else col
+        for col in columns
+    ]
+
+
+def merge_inventory(abnormal_df, pivot):
+    """按商家编码左连接库存透视表，没有库存记录的商品库存记为 0"""
+    abnormal_df = abnormal_df.assign(商家编码=abnormal_df['商家编码'].astype(str))
+    merged_df = abnormal_df.merge(pivot, left_on='商家编码', right_on='货品编号', how='left')
+    merged_df = merged_df.drop(columns=['货品编号'], errors='ignore')
+    return fill_inventory_columns(merged_df)
+
+
+def fill_inventory_columns(merged_df):
+    """两个仓库的库存列不存在时补 0，未匹配到库存的记录填 0"""
+    for col in INVENTORY_COLUMNS:
+        if col not in merged_df.columns:
+            merged_df[col] = 0
+        else:
+            merged_df[col] = merged_df[col].fillna(0)
+    return merged_df
+
+
+def missing_inventory(merged_df):
+    """两个仓库期初、期末库存都为 0 的记录（库存数据中没有该商家编码）"""
+    return merged_df[(merged_df[INVENTORY_COLUMNS] == 0).all(axis=1)]
+
+
+def exclude_merchant_codes(df):
+    """筛掉冰袋、干冰等辅料商家编码，返回 (保留的记录, 被筛掉的记录)"""
+    df = df.assign(商家编码=df['商家编码'].astype(str))
+    excluded = MERCHANT_CODE_EXCLUSION.mask(df['商家编码'])
+    return df[~excluded], df[excluded]
+
+
+def ships_from_jinan(df):
+    return df['仓库'].str.contains('济南', case=False, na=False)
+
+
+def merge_shipping(df, shipping_df, prefix):
+    """按子单原始单号左连接发货数据，发货数据的字段加上前缀（佛山_/济南_），返回 (合并结果, 发货字段)"""
+    df = df.assign(子单原始单号=df['子单原始单号'].astype(str))
+    shipping_df = shipping_df.assign(原始单号=shipping_df['原始单号'].astype(str))
+    columns = [col for col in shipping_df.columns if col != '原始单号']
+    renamed = [f"{prefix}_{col}" for col in columns]
+    shipping_df = shipping_df.rename(columns=dict(zip(columns, renamed)))
+    merged = df.merge(shipping_df[renamed + ['原始单号']], left_on='子单原始单号', right_on='原始单号', how='left')
+    return merged.drop(columns=['原始单号'], errors='ignore'), renamed
+
+
+def split_shipping(df, foshan_df, jinan_df):
+    """佛山仓（不含济南的仓库）记录合并佛山发货数据，济南仓记录合并济南发货数据，返回 {sheet 名: (合并结果, 发货字段)}"""
+    foshan_merged, foshan_columns = merge_shipping(df, foshan_df, '佛山')
+    jinan_merged, jinan_columns = merge_shipping(df, jinan_df, '济南')
+    return {
+        FOSHAN_SHEET: (foshan_merged[~ships_from_jinan(foshan_merged)], foshan_columns),
+        JINAN_SHEET: (jinan_merged[ships_from_jinan(jinan_merged)], jinan_columns),
+    }
+
+
+def unmatched_shipping(merged, shipping_columns):
+    """发货数据中没有匹配记录的行"""
+    return merged[merged[shipping_columns].isna().all(axis=1)]
+
+
+def dedupe_shipping_sheet(df):
+    """按订单编号去重并删除货品、商家编码相关字段（费用按订单统计），返回 (结果, 删除的字段)"""
+    df = df.drop_duplicates(subset=['订单编号'], keep='first')
+    columns_to_drop = [col for col in df.columns if '货品' in str(col) or '商家编码' in str(col)]
+    return df.drop(columns=columns_to_drop), columns_to_drop
+
+
+def process_shipping_sheet(path, sheet_name, reader=None, output_file=None):
+    """读取发货数据工作簿的一个 sheet 并去重（可在进程池中执行）；output_file 不为空时该 sheet 单独写出到该文件
+    （按扩展名写为 xlsx、csv 或 parquet）。
+    返回 {'sheet', 'rows_in', 'raw_head', 'head', 'rows_out', 'columns_to_drop', 'data', 'output'}，
+    单独写出时 data 为 None（不传回主进程）"""
+    df = (reader or pd.read_excel)(path, sheet_name=sheet_name)
+    rows_in, raw_head = len(df), df.head()
+    df, columns_to_drop = dedupe_shipping_sheet(df)
+    if output_file and output_file.endswith('.xlsx'):
+        df.to_excel(output_file, sheet_name=sheet_name, index=False)
+    elif output_file:
+        write_table(df, output_file)
+    return {'sheet': sheet_name, 'rows_in': rows_in, 'raw_head': raw_head, 'head': df.head(), 'rows_out': len(df),
+            'columns_to_drop': columns_to_drop, 'data': None if output_file else df, 'output': output_file}
+
+
+class PandasBackend:
+    """默认后端，直接调用本模块的 pandas 函数。
+
+    逐步执行的后端（duckdb）继承本类并重写各步骤方法，返回与之相同的 DataFrame；
+    整体执行的后端（polars）只需实现 compute 和 close。
+    """
+
+    name = 'pandas'
+
+    def filter_warehouses(self, df):
+        return filter_warehouses(df)
+
+    def out_of_region(self, df):
+        return df[out_of_region_mask(df)]
+
+    def merge_inventory(self, abnormal_df, inventory_df):
+        return merge_inventory(abnormal_df, pivot_inventory(inventory_df))
+
+    def exclude_merchant_codes(self, df):
+        return exclude_merchant_codes(df)
+
+    def drop_untracked_orders(self, df):
+        return drop_untracked_orders(df)
+
+    def split_shipping(self, df, foshan_df, jinan_df):
+        return split_shipping(df, foshan_df, jinan_df)
+
+    def dedupe_shipping_sheet(self, df):
+        return dedupe_shipping_sheet(df)
+
+    def compute(self, job, inputs, log, profiler):
+        return compute_results(job, inputs, log, profiler, self)
+
+    def close(self):
+        pass
+
+
+def available_backends():
+    """已安装依赖的执行后端"""
+    return [name for name in BACKENDS if name == 'pandas' or importlib.util.find_spec(name) is not None]
+
+
+def create_backend(name, work_dir=None):
+    """按名称创建执行后端；work_dir 为 duckdb 后端写出临时数据的目录"""
+    if name == 'pandas':
+        return PandasBackend()
+    if name == 'duckdb':
+        try:
+            from duckdb_backend import DuckDBBackend
+        except ImportError as e:
+            raise PipelineError(f"duckdb 后端需要安装 duckdb（pip install duckdb）: {e}")
+        return DuckDBBackend(work_dir)
+    if name == 'polars':
+        try:
+            from polars_backend import PolarsBackend
+        except ImportError as e:
+            raise PipelineError(f"polars 后端需要安装 polars（pip install polars）: {e}")
+        return PolarsBackend()
+    raise ValueError(f"未知的执行后端: {name}，可选 {', '.join(BACKENDS)}")
+
+
+def load_orders(files, columns, log=print, profiler=None, reader=None):
+    """读取并合并订单文件，只保留 columns，缺少字段的文件跳过；返回 (合并数据, 读取的总记录数)"""
+    profiler = profiler or StageProfiler()
+    reader = reader or pd.read_excel
+    frames, total_records = [], 0
+    for file in files:
+        if not os.path.exists(file):
+            log(f"文件 {os.path.basename(file)} 不存在！")
+            continue
+        with profiler.span('read_excel'):
+            df = reader(file)
+        total_records += len(df)
+        missing = missing_columns(df, columns)
+        if missing:
+            log(f"警告: {os.path.basename(file)} 缺少字段 {missing}，已跳过")
+            continue
+        frames.append(df[columns].copy())
+    if not frames:
+        raise PipelineError("没有成功读取任何订单数据！")
+    return combine_orders(frames), total_records
+
+
+def read_inventory(path, reader=None):
+    """读取库存数据；PARSED_SUFFIX 结尾的是预先解析好的 DataFrame（见 batch_scheduler.py）"""
+    if path.endswith(PARSED_SUFFIX):
+        return pd.read_pickle(path)
+    return (reader or pd.read_excel)(path)
+
+
+def read_sheet(path, sheet_name, reader=None):
+    """读取发货数据的指定 sheet，sheet 不存在时给出可用的 sheet 名称；
+    PARSED_SUFFIX 结尾的是预先解析好的 {sheet 名: DataFrame}"""
+    if path.endswith(PARSED_SUFFIX):
+        sheets = pd.read_pickle(path)
+        if sheet_name not in sheets:
+            raise PipelineError(f"{os.path.basename(path)} 中没有 sheet “{sheet_name}”，可用: {', '.join(sheets)}")
+        return sheets[sheet_name]
+    try:
+        return (reader or pd.read_excel)(path, sheet_name=sheet_name)
+    except ValueError as e:
+        raise PipelineError(f"读取 {os.path.basename(path)} 的 sheet “{sheet_name}” 失败: {e}")
+
+
+def write_shipping_workbook(sheets, output_file):
+    """各 sheet 写入同一个工作簿，返回各 sheet 的行数"""
+    counts = {}
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        for sheet, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet, index=False)
+            counts[sheet] = len(df)
+    return counts
+
+
+def result_path(output_dir, result_file, output_format):
+    """结果文件的路径：xlsx 为 result_file，其他格式替换扩展名"""
+    return os.path.join(output_dir, os.path.splitext(result_file)[0] + '.' + output_format)
+
+
+def write_shipping_tables(sheets, output_dir, output_format):
+    """各 sheet 写入 output_dir 下的单独文件（sheet 名.csv / sheet 名.parquet），返回各 sheet 的行数"""
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {}
+    for sheet, df in sheets.items():
+        write_table(df, os.path.join(output_dir, f"{sheet}.{output_format}"))
+        counts[sheet] = len(df)
+    return counts
+
+
+def compute_results(job, inputs, log, profiler, engine):
+    """逐步计算任务结果，返回 {'abnormal': 缺货导致的超区发货数据, 'fee': {sheet 名: 去重后的费用数据}}"""
+    with profiler.stage('prepare_orders'):
+        columns = ABNORMAL_ORDER_COLUMNS if job == 'abnormal' else FEE_ORDER_COLUMNS
+        orders, total_records = load_orders(inputs['orders'], columns, log, profiler, inputs.get('reader'))
+        profiler.rows(rows_in=total_records)
+        if job == 'fee':
+            orders = engine.drop_untracked_orders(orders)
+        orders = add_month(add_province(orders))
+        orders = engine.filter_warehouses(orders)
+        profiler.rows(rows_out=len(orders))
+        log(f"读取订单 {total_records} 条，两个仓库的记录 {len(orders)} 条")
+
+    with profiler.stage('abnormal_process'):
+        abnormal_df = engine.out_of_region(orders)
+        with profiler.span('read_excel'):
+            inventory_df = read_inventory(inputs['inventory'], inputs.get('reader'))
+        merged_df = engine.merge_inventory(abnormal_df, inventory_df)
+        profiler.rows(rows_in=len(orders), rows_out=len(merged_df))
+        log(f"超区发货记录 {len(merged_df)} 条，其中 {len(missing_inventory(merged_df))} 条在库存数据中没有库存信息")
+
+    with profiler.stage('filter_merchant_codes'):
+        cleaned_df, excluded_df = engine.exclude_merchant_codes(merged_df)
+        profiler.rows(rows_in=len(merged_df), rows_out=len(cleaned_df))
+        log(f"筛掉辅料商家编码 {len(excluded_df)} 条，剩余 {len(cleaned_df)} 条")
+
+    results = {}
+    if job in ('abnormal', 'combined'):
+        results['abnormal'] = cleaned_df.drop(columns=FEE_ONLY_COLUMNS, errors='ignore') if job == 'combined' else cleaned_df
+
+    if job in ('fee', 'combined'):
+        with profiler.stage('append_shipping_data'):
+            fee_df = engine.drop_untracked_orders(cleaned_df) if job == 'combined' else cleaned_df
+            with profiler.span('read_excel'):
+                foshan_df = read_sheet(inputs['shipping'], inputs.get('foshan_sheet', FOSHAN_SHEET), inputs.get('reader'))
+                jinan_df = read_sheet(inputs['shipping'], inputs.get('jinan_sheet', JINAN_SHEET), inputs.get('reader'))
+            shipping = engine.split_shipping(fee_df, foshan_df, jinan_df)
+            profiler.rows(rows_in=len(fee_df), rows_out=sum(len(merged) for merged, _ in shipping.values()))
+            for sheet, (merged, shipping_columns) in shipping.items():
+                log(f"{sheet}：{len(merged)} 条记录，{len(unmatched_shipping(merged, shipping_columns))} 条未匹配到发货数据")
+        with profiler.stage('process_final_shipping_data'):
+            results['fee'] = {sheet: engine.dedupe_shipping_sheet(merged)[0] for sheet, (merged, _) in shipping.items()}
+            profiler.rows(rows_in=sum(len(merged) for merged, _ in shipping.values()),
+                          rows_out=sum(len(df) for df in results['fee'].values()))
+    return results
+
+
+def compare_results(results, reference):
+    """逐个结果表对比（忽略行索引），返回差异说明列表，完全相同时为空"""
+    differences = []
+    pairs = []
+    if 'abnormal' in reference:
+        pairs.append(('缺货导致的超区发货数据', results.get('abnormal'), reference['abnormal']))
+    for sheet, df in reference.get('fee', {}).items():
+        pairs.append((f"超区发货费用数据/{sheet}", results.get('fee', {}).get(sheet), df))
+    for name, df, expected in pairs:
+        if df is None:
+            differences.append(f"{name}: 缺少结果")
+            continue
+        try:
+            pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
+        except AssertionError as e:
+            differences.append(f"{name}: {e}")
+    return differences
+
+
+def split_by_month(results):
+    """按月份拆分结果，返回 {月份（YYYY-MM）: 该月的结果}；月份为空的记录归入 UNKNOWN_MONTH"""
+    frames = ([results['abnormal']] if 'abnormal' in results else []) + list(results.get('fee', {}).values())
+    months = sorted({month for df in frames for month in df['月份'].dropna().unique()})
+    masks = [(str(month), lambda df, month=month: df['月份'] == month) for month in months]
+    if any(df['月份'].isna().any() for df in frames):
+        masks.append((UNKNOWN_MONTH, lambda df: df['月份'].isna()))
+    split = {}
+    for label, mask in masks:
+        split[label] = {}
+        if 'abnormal' in results:
+            split[label]['abnormal'] = results['abnormal'][mask(results['abnormal'])]
+        if 'fee' in results:
+            split[label]['fee'] = {sheet: df[mask(df)] for sheet, df in results['fee'].items()}
+    return split
+
+
+def write_results(results, output_dir, log, profiler, partition_by_month=False, output_format='xlsx'):
+    """按 output_format 写出结果；partition_by_month 时每个月份写入 output_dir/YYYY-MM/，返回的键为 '结果类型:月份'"""
+    if partition_by_month:
+        outputs = {}
+        for month, month_results in split_by_month(results).items():
+            month_dir = os.path.join(output_dir, month)
+            os.makedirs(month_dir, exist_ok=True)
+            for kind, path in write_results(month_results, month_dir, log, profiler,
+                                            output_format=output_format).items():
+                outputs[f"{kind}:{month}"] = path
+        return outputs
+    outputs = {}
+    if 'abnormal' in results:
+        with profiler.stage('write_abnormal_result'):
+            outputs['abnormal'] = result_path(output_dir, ABNORMAL_RESULT_FILE, output_format)
+            if output_format == 'xlsx':
+                with profiler.span('to_excel'):
+                    results['abnormal'].to_excel(outputs['abnormal'], index=False)
+            else:
+                with profiler.span('write_table'):
+                    write_table(results['abnormal'], outputs['abnormal'])
+            log(f"缺货导致的超区发货数据 {len(results['abnormal'])} 条已保存到: {outputs['abnormal']}")
+    if 'fee' in results:
+        with profiler.stage('write_fee_result'):
+            if output_format == 'xlsx':
+                outputs['fee'] = os.path.join(output_dir, FEE_RESULT_FILE)
+                with profiler.span('to_excel'):
+                    counts = write_shipping_workbook(results['fee'], outputs['fee'])
+            else:
+                outputs['fee'] = os.path.join(output_dir, os.path.splitext(FEE_RESULT_FILE)[0])
+                with profiler.span('write_table'):
+                    counts = write_shipping_tables(results['fee'], outputs['fee'], output_format)
+            log(f"超区发货费用数据（{'，'.join(f'{sheet} {count} 条' for sheet, count in counts.items())}）"
+                f"已保存到: {outputs['fee']}")
+    return outputs
+
+
+def run_job(job, inputs, output_dir, log=print, profiler=None, backend='pandas', validate=False,
+            partition_by_month=False, summary_cube=True, output_format='xlsx'):
+    """运行一个任务，返回 {'abnormal': 文件, 'fee': 文件, 'cube': 汇总文件}（只包含该任务生成的结果）。
+
+    inputs: {'orders': [订单文件], 'inventory': 库存文件, 'shipping': 发货数据文件（fee/combined 需要），
+             'foshan_sheet': 佛山发货数据 sheet 名称, 'jinan_sheet': 济南发货数据 sheet 名称,
+             'reader': 可选，代替 pd.read_excel(path, sheet_name=...) 读取 Excel，例如 prefetch.ExcelPrefetcher.read}
+    backend: 执行后端名称，见 BACKENDS
+    validate: 非 pandas 后端时再用 pandas 后端计算一次并逐表对比，不一致时报错且不写出结果
+    partition_by_month: 按付款时间的月份拆分，每个月的结果写入 output_dir/YYYY-MM/
+    summary_cube: 把结果汇总更新到 output_dir 的超区发货汇总（见 summary_cube.py）
+    output_format: 结果格式，见 OUTPUT_FORMATS；csv、parquet 时费用数据输出为目录（每个 sheet 一个文件）
+    """
+    if job not in JOB_TYPES:
+        raise ValueError(f"未知的任务类型: {job}，可选 {', '.join(JOB_TYPES)}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的结果格式: {output_format}，可选 {', '.join(OUTPUT_FORMATS)}")
+    if job != 'abnormal' and not inputs.get('shipping'):
+        raise PipelineError("费用数据需要发货数据文件！")
+    for path in [inputs['inventory']] + ([inputs['shipping']] if job != 'abnormal' else []):
+        if not os.path.exists(path):
+            raise PipelineError(f"文件 {os.path.basename(path)} 不存在！")
+    profiler = profiler or StageProfiler()
+    os.makedirs(output_dir, exist_ok=True)
+    engine = create_backend(backend, output_dir)
+    try:
+        results = engine.compute(job, inputs, log, profiler)
+    finally:
+        engine.close()
+
+    if validate and backend != 'pandas':
+        with profiler.stage('validate'):
+            reference = PandasBackend().compute(job, inputs, lambda message: None, profiler)
+            differences = compare_results(results, reference)
+        if differences:
+            raise PipelineError(f"{backend} 后端的结果与 pandas 不一致：\n" + '\n'.join(differences))
+        log(f"已核对：{backend} 后端的结果与 pandas 完全一致")
+    outputs = write_results(results, output_dir, log, profiler, partition_by_month, output_format)
+    if summary_cube:
+        from summary_cube import update_cube  # summary_cube 依赖本模块
+        with profiler.stage('update_summary_cube'):
+            outputs['cube'] = update_cube(results, inputs['orders'], output_dir, log)
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='超区发货订单处理：缺货导致的超区发货数据、超区发货费用数据')
+    parser.add_argument('job', choices=JOB_TYPES, help='abnormal：缺货导致的超区发货数据；fee：超区发货费用数据；combined：一次运行输出两者')
+    parser.add_argument('--orders', nargs='+', required=True, help='订单导出文件')
+    parser.add_argument('--inventory', required=True, help='库存数据文件')
+    parser.add_argument('--shipping', help='发货数据文件（fee、combined 需要）')
+    parser.add_argument('--foshan-sheet', default=FOSHAN_SHEET)
+    parser.add_argument('--jinan-sheet', default=JINAN_SHEET)
+    parser.add_argument('--out', default='.', help='输出目录')
+    parser.add_argument('--backend', choices=BACKENDS, default='pandas', help='执行后端')
+    parser.add_argument('--validate', action='store_true', help='与 pandas 后端的结果逐表对比')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='xlsx',
+                        help='结果格式：xlsx（默认）、csv（分块写出）、parquet（保留数据类型并压缩）')
+    parser.add_argument('--partition-by-month', action='store_true', help='按月份拆分结果，每个月写入 输出目录/YYYY-MM/')
+    parser.add_argument('--no-cube', action='store_true', help='不更新超区发货汇总（summary_cube.py）')
+    parser.add_argument('--profile', action='store_true', help='输出分步骤耗时')
+    args = parser.parse_args(argv)
+
+    inputs = {'orders': args.orders, 'inventory': args.inventory, 'shipping': args.shipping,
+              'foshan_sheet': args.foshan_sheet, 'jinan_sheet': args.jinan_sheet}
+    profiler = StageProfiler()
+    try:
+        run_job(args.job, inputs, args.out, profiler=profiler, backend=args.backend, validate=args.validate,
+                partition_by_month=args.partition_by_month, summary_cube=not args.no_cube, output_format=args.format)
+    except PipelineError as e:
+        print(f"错误：{e}")
+        return 1
+    if args.profile:
+        print(profiler.format_summary())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,212 @@
+# polars_backend.py
+"""order_pipeline 的 Polars 执行后端。
+
+订单、库存和发货数据读入后，整个流程（仓库筛选、省份提取、超区判断、库存透视与合并、商家编码筛选、
+剔除物流单号为空的记录、发货数据合并和按订单编号去重）构建为一个 LazyFrame 查询计划，
+各结果表和日志用到的计数通过 pl.collect_all 一次执行：公共部分只计算一次，
+只用到的列参与计算（projection pushdown），筛选尽量提前（predicate pushdown），多线程执行。
+
+结果转换回 pandas 时按 pandas 后端的规则调整字段类型（左连接有未匹配的行时整数列变为浮点数等），
+与 pandas 后端的结果逐表相同，可用 order_pipeline.py --validate 核对。
+Excel 由 pandas 读取（Polars 读取 Excel 需要额外安装 fastexcel）；付款时间为文本时按 order_pipeline.parse_datetime 解析，
+与 pandas 后端一致。
+"""
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from order_pipeline import (ABNORMAL_ORDER_COLUMNS, FEE_ORDER_COLUMNS, FEE_ONLY_COLUMNS, FOSHAN_WAREHOUSE, JINAN_WAREHOUSE,
+                            JINAN_COVERAGE, MERCHANT_CODE_EXCLUSION, INVENTORY_COLUMNS, FOSHAN_SHEET, JINAN_SHEET,
+                            load_orders, read_inventory, read_sheet, inventory_column_names, parse_datetime)
+
+INVENTORY_VALUES = ['期初库存', '期末库存']
+MATCHED = '__matched'
+
+
+def to_polars(df):
+    """pandas → Polars：混合类型的文本列（例如同时有数字和文本的编码）中的非空值转为文本"""
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object and not series.dropna().map(type).eq(str).all():
+            converted[col] = series.where(series.isna(), series.astype(str))
+    return pl.from_pandas(df.assign(**converted) if converted else df)
+
+
+def as_text(name, dtype):
+    """与 pandas 的 astype(str) 相同：整数和文本直接转换，空值为 'nan'，其他类型按 Python 的 str()"""
+    column = pl.col(name)
+    if dtype == pl.String:
+        return column.fill_null('nan')
+    if dtype.is_integer():
+        return column.cast(pl.String)
+    return column.map_elements(str, return_dtype=pl.String).fill_null('nan')
+
+
+def is_tracked():
+    return pl.col('物流单号').is_not_null() & (pl.col('物流单号').cast(pl.String) != '')
+
+
+def ships_from_jinan():
+    return pl.col('仓库').cast(pl.String).str.contains('济南', literal=True).fill_null(False)
+
+
+def left_join(left, right, left_on, right_on):
+    """与 pandas merge(how='left') 相同的左连接：保持左表顺序，一对多时按右表顺序；未匹配的行 MATCHED 为空"""
+    return left.join(right.with_columns(pl.lit(True).alias(MATCHED)), left_on=left_on, right_on=right_on,
+                     how='left', maintain_order='left_right')
+
+
+def to_pandas(df):
+    """Polars → pandas：文本列的空值与 pandas 读取 Excel 的结果一样为 NaN（而不是 None）"""
+    df = df.to_pandas()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def upcast_unmatched(df, columns):
+    """pandas 左连接有未匹配的行时，右表的整数列变为浮点数、布尔列变为 object"""
+    for col in columns:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype('float64')
+        elif pd.api.types.is_bool_dtype(df[col]):
+            df[col] = df[col].astype(object)
+    return df
+
+
+class PolarsBackend:
+    """整体执行的后端：只实现 order_pipeline.PandasBackend 的 compute 和 close"""
+
+    name = 'polars'
+
+    def compute(self, job, inputs, log, profiler):
+        with profiler.stage('read_inputs'):
+            columns = ABNORMAL_ORDER_COLUMNS if job == 'abnormal' else FEE_ORDER_COLUMNS
+            orders_df, total_records = load_orders(inputs['orders'], columns, log, profiler, inputs.get('reader'))
+            if not pd.api.types.is_datetime64_any_dtype(orders_df['付款时间']):
+                orders_df['付款时间'] = parse_datetime(orders_df['付款时间'])
+            with profiler.span('read_excel'):
+                inventory_df = read_inventory(inputs['inventory'], inputs.get('reader'))
+                sheets = {}
+                if job != 'abnormal':
+                    sheets[FOSHAN_SHEET] = read_sheet(inputs['shipping'], inputs.get('foshan_sheet', FOSHAN_SHEET), inputs.get('reader'))
+                    sheets[JINAN_SHEET] = read_sheet(inputs['shipping'], inputs.get('jinan_sheet', JINAN_SHEET), inputs.get('reader'))
+            with profiler.span('to_polars'):
+                orders = to_polars(orders_df)
+                inventory = to_polars(inventory_df)
+                sheets = {sheet: to_polars(df) for sheet, df in sheets.items()}
+            profiler.rows(rows_in=total_records)
+
+        with profiler.stage('build_plan'):
+            plan, pivot_columns = self.build_plan(job, orders, inventory, sheets)
+
+        with profiler.stage('collect'):
+            names = list(plan)
+            collected = dict(zip(names, pl.collect_all([plan[name] for name in names])))
+            counts = {name: collected[name].item() for name in names if name.startswith('n_') or name.startswith('any_')}
+            profiler.rows(rows_in=total_records,
+                          rows_out=sum(len(collected[name]) for name in names if name in sheets or name == 'abnormal'))
+
+        log(f"读取订单 {total_records} 条，两个仓库的记录 {counts['n_orders']} 条")
+        log(f"超区发货记录 {counts['n_merged']} 条，其中 {counts['n_missing_inventory']} 条在库存数据中没有库存信息")
+        log(f"筛掉辅料商家编码 {counts['n_excluded']} 条，剩余 {counts['n_cleaned']} 条")
+        for sheet in sheets:
+            log(f"{sheet}：{counts[f'n_{sheet}']} 条记录，{counts[f'n_unmatched_{sheet}']} 条未匹配到发货数据")
+
+        with profiler.stage('to_pandas'):
+            stock_names = dict(zip([f'__stock{i}' for i in range(len(pivot_columns))], inventory_column_names(pivot_columns)))
+            upcast = list(stock_names.values()) if counts['any_unmatched_inventory'] else []
+
+            def convert(df):
+                df = to_pandas(df).rename(columns=stock_names)
+                # 与 pandas 后端相同，月份为按月的 Period
+                df['月份'] = df['月份'].dt.to_period('M')
+                return upcast_unmatched(df, [col for col in upcast if col in df.columns])
+
+            results = {}
+            if 'abnormal' in collected:
+                results['abnormal'] = convert(collected['abnormal'])
+            if sheets:
+                results['fee'] = {}
+                for sheet in sheets:
+                    df = convert(collected[sheet])
+                    if counts[f'any_unmatched_{sheet}']:
+                        shipping_columns = [col for col in collected[sheet].columns if col.startswith(self.prefix(sheet) + '_')]
+                        df = upcast_unmatched(df, shipping_columns)
+                    results['fee'][sheet] = df
+        return results
+
+    @staticmethod
+    def prefix(sheet):
+        return '佛山' if sheet == FOSHAN_SHEET else '济南'
+
+    def build_plan(self, job, orders, inventory, sheets):
+        """返回 ({名称: LazyFrame}, 库存透视的（库存字段, 仓库名称）列)；名称以 n_/any_ 开头的是单个计数或标记"""
+        plan = {}
+        base = orders.lazy()
+        if job == 'fee':
+            base = base.filter(is_tracked())
+        province = pl.col('收货地区').cast(pl.String).str.extract(r'^\s*(\S+)', 1)
+        base = base.with_columns(province.alias('省份'), pl.col('付款时间').dt.truncate('1mo').alias('月份'))
+        base = base.filter(pl.col('仓库').is_in([FOSHAN_WAREHOUSE, JINAN_WAREHOUSE]).fill_null(False))
+        plan['n_orders'] = base.select(pl.len())
+
+        in_coverage = pl.col('省份').is_in(JINAN_COVERAGE)
+        out_of_region = (pl.col('省份').is_null()
+                         | ((pl.col('仓库') == FOSHAN_WAREHOUSE) & in_coverage)
+                         | ((pl.col('仓库') == JINAN_WAREHOUSE) & ~in_coverage))
+        abnormal = base.filter(out_of_region.fill_null(False))
+
+        # 库存透视：列为（库存字段, 仓库名称）的全部组合，仓库名称排序，缺少的组合为 0
+        warehouses = sorted(inventory['仓库名称'].drop_nulls().unique().to_list())
+        pivot_columns = [(value, warehouse) for value in INVENTORY_VALUES for warehouse in warehouses]
+        stock = (inventory.lazy()
+                 .with_columns(as_text('货品编号', inventory.schema['货品编号']))
+                 .filter(pl.col('仓库名称').is_not_null())
+                 .group_by('货品编号')
+                 .agg([pl.col(value).filter(pl.col('仓库名称') == warehouse).sum().alias(f'__stock{i}')
+                       for i, (value, warehouse) in enumerate(pivot_columns)]))
+        abnormal = abnormal.with_columns(as_text('商家编码', orders.schema['商家编码']))
+        merged = left_join(abnormal, stock, '商家编码', '货品编号')
+        plan['any_unmatched_inventory'] = merged.select(pl.col(MATCHED).is_null().any())
+        stock_names = dict(zip(inventory_column_names(pivot_columns), [f'__stock{i}' for i in range(len(pivot_columns))]))
+        merged = merged.drop(MATCHED).with_columns([
+            pl.col(stock_names[col]).fill_null(0) if col in stock_names else pl.lit(0, dtype=pl.Int64).alias(col)
+            for col in INVENTORY_COLUMNS])
+        inventory_columns = [pl.col(stock_names[col]) if col in stock_names else pl.col(col) for col in INVENTORY_COLUMNS]
+        plan['n_merged'] = merged.select(pl.len())
+        plan['n_missing_inventory'] = merged.select(pl.all_horizontal([col == 0 for col in inventory_columns]).sum())
+
+        pattern = MERCHANT_CODE_EXCLUSION.regex()
+        excluded = pl.col('商家编码').str.contains(pattern) if pattern else pl.lit(False)
+        cleaned = merged.filter(~excluded)
+        plan['n_excluded'] = merged.filter(excluded).select(pl.len())
+        plan['n_cleaned'] = cleaned.select(pl.len())
+
+        if job in ('abnormal', 'combined'):
+            plan['abnormal'] = cleaned.drop(FEE_ONLY_COLUMNS, strict=False) if job == 'combined' else cleaned
+
+        if sheets:
+            fee = cleaned.filter(is_tracked()) if job == 'combined' else cleaned
+            fee = fee.with_columns(as_text('子单原始单号', orders.schema['子单原始单号']))
+            for sheet, shipping in sheets.items():
+                prefix = self.prefix(sheet)
+                columns = [col for col in shipping.columns if col != '原始单号']
+                shipping_lf = (shipping.lazy()
+                               .with_columns(as_text('原始单号', shipping.schema['原始单号']))
+                               .rename({col: f"{prefix}_{col}" for col in columns}))
+                joined = left_join(fee, shipping_lf, '子单原始单号', '原始单号')
+                plan[f'any_unmatched_{sheet}'] = joined.select(pl.col(MATCHED).is_null().any())
+                joined = joined.drop(MATCHED)
+                kept = joined.filter(ships_from_jinan() if sheet == JINAN_SHEET else ~ships_from_jinan())
+                plan[f'n_{sheet}'] = kept.select(pl.len())
+                plan[f'n_unmatched_{sheet}'] = kept.select(
+                    pl.all_horizontal([pl.col(f"{prefix}_{col}").is_null() for col in columns]).sum())
+                deduped = kept.unique(subset='订单编号', keep='first', maintain_order=True)
+                plan[sheet] = deduped.select([col for col in kept.collect_schema().names()
+                                              if '货品' not in col and '商家编码' not in col])
+        return plan, pivot_columns
+
+    def close(self):
+        pass
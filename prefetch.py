@@ -0,0 +1,91 @@
+# prefetch.py
+"""选择文件后立即在后台线程中读取 Excel，点击运行处理时直接使用已读取的数据。
+
+用户在文件对话框和 sheet 名称输入框中通常要花几十秒，这段时间里界面线程空闲，
+后台线程读取 Excel 不会影响界面响应。每类文件（订单、库存、发货数据）占一个槽位：
+重新选择时，该槽位中不再需要的读取任务被取消（尚未开始的直接取消，已开始的读完后丢弃结果）。
+
+read() 与 pd.read_excel(path, sheet_name=...) 相同：已预读取的直接返回副本，正在读取的等待完成，
+没有预读取、已取消或文件在预读取后被修改的，在当前线程中重新读取。
+
+窗口关闭时调用 shutdown() 取消全部读取并停止后台线程；窗口再次打开后调用 prefetch() 时重新创建线程池。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# 同时读取的文件数：订单、库存和发货数据各一个，openpyxl 解析主要占用 GIL，更多线程没有意义
+MAX_WORKERS = 2
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ExcelPrefetcher:
+    """按 (文件, sheet) 缓存后台读取任务"""
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._max_workers = max_workers
+        self._executor = None  # 第一次 prefetch 时创建，shutdown 后为 None
+        self._lock = threading.Lock()
+        self._futures = {}  # {(文件, sheet): (future, 提交时的文件大小和修改时间)}
+        self._slots = {}    # {槽位: {(文件, sheet)}}
+
+    def prefetch(self, slot, files, sheet_name=0):
+        """槽位 slot 改为读取 files（一个或多个文件的 sheet_name），取消该槽位中不再需要的读取"""
+        if isinstance(files, str):
+            files = [files]
+        sheet_names = sheet_name if isinstance(sheet_name, (list, tuple)) else [sheet_name]
+        keys = {(os.path.abspath(file), sheet) for file in files for sheet in sheet_names}
+        with self._lock:
+            stale = self._slots.get(slot, set()) - keys
+            self._slots[slot] = keys
+            for key in stale:
+                if not any(key in other for other in self._slots.values()):
+                    self._discard(key)
+            if keys and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix='excel_prefetch')
+            for key in keys:
+                if key not in self._futures:
+                    self._futures[key] = (self._executor.submit(pd.read_excel, key[0], sheet_name=key[1]),
+                                          _file_stamp(key[0]))
+
+    def clear(self, slot):
+        """取消槽位中的全部读取（例如取消了选择）"""
+        self.prefetch(slot, [])
+
+    def _discard(self, key):
+        future, _ = self._futures.pop(key, (None, None))
+        if future is not None:
+            future.cancel()
+
+    def read(self, path, sheet_name=0):
+        """与 pd.read_excel(path, sheet_name=sheet_name) 相同，优先使用预读取的结果"""
+        key = (os.path.abspath(path), sheet_name)
+        with self._lock:
+            future, stamp = self._futures.get(key, (None, None))
+        if future is not None and not future.cancelled() and stamp == _file_stamp(key[0]):
+            try:
+                # 返回副本：处理步骤可能修改读取的数据，再次运行时仍使用原始数据
+                return future.result().copy()
+            except Exception:
+                pass  # 后台读取失败时在当前线程重新读取，由调用方处理异常
+        return pd.read_excel(path, sheet_name=sheet_name)
+
+    def shutdown(self, wait=False, cancel_futures=True):
+        """丢弃全部读取结果并停止后台线程；wait 为 False 时不等待正在进行的读取（读完后结果被丢弃）"""
+        with self._lock:
+            for key in list(self._futures):
+                self._discard(key)
+            self._slots.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -0,0 +1,92 @@
+# rule_export.py
+"""关联分析结果导出。
+
+商品名称按不同项集去重后生成，每个项集只拼接一次；项集写为分隔字符串而不是 frozenset；
+xlsx 使用 openpyxl 只写模式流式写出，超出 Excel 行数上限的结果可导出为 CSV 或 Parquet。
+"""
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+ITEM_DELIMITER = '|'
+EXCEL_MAX_ROWS = 1048575  # Excel 单个 sheet 的最大数据行数（不含表头）
+EXPORT_FORMATS = {'Excel': '.xlsx', 'CSV': '.csv', 'Parquet': '.parquet'}
+PARQUET_COMPRESSION = 'snappy'
+
+
+def itemset_strings(itemsets, item_name_mapping, delimiter=ITEM_DELIMITER):
+    """将 frozenset 项集列转换为（编码字符串，名称字符串）两个数组，项内按编码排序。
+
+    规则的前件、后件大量重复，先对项集去重，每个不同的项集只拼接一次字符串，再按整数编号取回各行。
+    """
+    itemsets = pd.Series(itemsets).reset_index(drop=True)
+    if itemsets.empty:
+        empty = np.empty(0, dtype=object)
+        return empty, empty
+    inverse, uniques = pd.factorize(itemsets)
+    names = {}
+    code_labels = np.empty(len(uniques), dtype=object)
+    name_labels = np.empty(len(uniques), dtype=object)
+    for idx, itemset in enumerate(uniques):
+        codes = sorted(str(code) for code in itemset)
+        code_labels[idx] = delimiter.join(codes)
+        for code in codes:
+            if code not in names:
+                names[code] = str(item_name_mapping.get(code, f"未知商品({code})"))
+        name_labels[idx] = delimiter.join(names[code] for code in codes)
+    return code_labels[inverse], name_labels[inverse]
+
+
+def compact_itemsets(frequent_itemsets, item_name_mapping):
+    """频繁项集导出用的紧凑表：itemsets 和商品名称均为分隔字符串"""
+    codes, names = itemset_strings(frequent_itemsets['itemsets'], item_name_mapping)
+    compact = frequent_itemsets.drop(columns=['itemsets']).copy()
+    compact.insert(1, 'itemsets', codes)
+    compact['商品名称'] = names
+    return compact
+
+
+def compact_rules(rules, item_name_mapping):
+    """关联规则导出用的紧凑表：前件、后件及其商品名称均为分隔字符串"""
+    antecedent_codes, antecedent_names = itemset_strings(rules['antecedents'], item_name_mapping)
+    consequent_codes, consequent_names = itemset_strings(rules['consequents'], item_name_mapping)
+    compact = rules.copy()
+    compact['antecedents'] = antecedent_codes
+    compact['consequents'] = consequent_codes
+    compact['前件商品名称'] = antecedent_names
+    compact['后件商品名称'] = consequent_names
+    return compact
+
+
+def parquet_frame(df):
+    """Parquet 要求列名为字符串、每列只有一种类型：非字符串列名（例如库存透视的元组列名）转为字符串，
+    混有数字和文本的列转为文本，按月的 Period 列（月份）转为 YYYY-MM 文本（否则其他工具读到的是扩展类型的整数编码），
+    其他列保留原数据类型"""
+    df = df.rename(columns=lambda col: col if isinstance(col, str) else str(col))
+    for col in df.columns[[isinstance(dtype, pd.PeriodDtype) for dtype in df.dtypes]]:
+        df[col] = df[col].astype(str).where(df[col].notna(), None)
+    for col in df.columns[(df.dtypes == object).to_numpy()]:
+        values = df[col]
+        if values.dropna().map(type).nunique() > 1:
+            df[col] = values.astype(str).where(values.notna(), None)
+    return df
+
+
+def write_table(df, path):
+    """按扩展名写出结果表：.xlsx 流式写出，.csv 分块写出，.parquet 保留数据类型并压缩"""
+    if path.endswith('.parquet'):
+        parquet_frame(df).to_parquet(path, index=False, compression=PARQUET_COMPRESSION)
+    elif path.endswith('.csv'):
+        df.to_csv(path, index=False, encoding='utf-8-sig', chunksize=100000)
+    else:
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(f"共 {len(df)} 行，超过 Excel 上限 {EXCEL_MAX_ROWS} 行，请导出为 CSV 或 Parquet")
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append([str(col) for col in df.columns])
+        # 缺失值写为空单元格
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+        workbook.save(path)
+    return path
@@ -0,0 +1,278 @@
+# rule_index.py
+"""“买了 X → 推荐 Y”的关联规则推荐索引。
+
+索引以前件商家编码集合为键，每个前件只保留按置信度和按提升度排序的前若干条规则。查询时枚举购物篮的子集
+（不超过最长前件的长度）逐个查字典，合并各前件的后件并去掉购物篮中已有的商品，单次查询为微秒级。
+索引文件通过临时文件 + os.replace 原子替换，服务进程在后台检测到文件更新后整体替换内存中的索引，查询不中断。
+
+命令行用法：
+    python rule_index.py build Data/最终结果_association_rules.xlsx --index Data/rule_index.pkl
+    python rule_index.py query --index Data/rule_index.pkl SKU001 SKU002 --metric lift --top 10
+    python rule_index.py serve --index Data/rule_index.pkl --port 8765
+    （HTTP 查询：GET /recommend?items=SKU001,SKU002&metric=lift&top=10）
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from itertools import combinations
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from rule_export import ITEM_DELIMITER
+
+INDEX_VERSION = 1
+RULE_INDEX_FILE = 'rule_index.pkl'
+INDEX_METRICS = ('confidence', 'lift')
+# 每个前件按每种指标保留的规则数
+MAX_RULES_PER_ANTECEDENT = 50
+# 后台检测索引文件更新的间隔（秒）
+RELOAD_INTERVAL = 2.0
+DEFAULT_PORT = 8765
+
+
+def _split_itemset(value):
+    """规则表中的项集可能是分隔字符串（导出文件）或 frozenset（mlxtend 原始输出）"""
+    if isinstance(value, str):
+        return tuple(sorted(value.split(ITEM_DELIMITER)))
+    return tuple(sorted(str(item) for item in value))
+
+
+class RuleIndex:
+    """内存中的推荐索引：{前件: {指标: [(后件, 置信度, 提升度, 支持度, 单量), ...]}}"""
+
+    def __init__(self, entries, item_names, built_at=None):
+        self.entries = entries
+        self.item_names = item_names
+        self.max_antecedent_len = max((len(antecedent) for antecedent in entries), default=0)
+        self.n_rules = len({(antecedent, row[0]) for antecedent, by_metric in entries.items()
+                            for rows in by_metric.values() for row in rows})
+        self.built_at = built_at or time.strftime('%Y-%m-%d %H:%M:%S')
+
+    @classmethod
+    def from_rules(cls, rules, item_name_mapping=None, max_per_antecedent=MAX_RULES_PER_ANTECEDENT):
+        """由 association_rules 结果（或 compact_rules 导出的表）构建索引"""
+        antecedents = [_split_itemset(value) for value in rules['antecedents']]
+        consequents = [_split_itemset(value) for value in rules['consequents']]
+        counts = rules['单量'].to_numpy() if '单量' in rules else [None] * len(rules)
+        table = pd.DataFrame({
+            'antecedents': antecedents,
+            'consequents': consequents,
+            'confidence': rules['confidence'].to_numpy(dtype=float),
+            'lift': rules['lift'].to_numpy(dtype=float),
+            'support': rules['support'].to_numpy(dtype=float),
+            '单量': counts,
+        })
+
+        rows = list(table[['consequents', 'confidence', 'lift', 'support', '单量']].itertuples(index=False, name=None))
+        entries = {}
+        for metric in INDEX_METRICS:
+            top = (table.sort_values(metric, ascending=False, kind='stable')
+                   .groupby('antecedents', sort=False).head(max_per_antecedent))
+            for antecedent, position in zip(top['antecedents'], top.index):
+                entries.setdefault(frozenset(antecedent), {m: [] for m in INDEX_METRICS})[metric].append(rows[position])
+
+        item_names = {str(code): name for code, name in (item_name_mapping or {}).items()}
+        if not item_names and '前件商品名称' in rules:
+            for code_col, name_col in [('antecedents', '前件商品名称'), ('consequents', '后件商品名称')]:
+                for codes, names in zip(rules[code_col], rules[name_col]):
+                    if isinstance(codes, str) and isinstance(names, str):
+                        item_names.update(zip(codes.split(ITEM_DELIMITER), names.split(ITEM_DELIMITER)))
+        return cls(entries, item_names)
+
+    def recommend(self, basket, metric='confidence', top_n=10):
+        """返回购物篮的推荐结果：前件为购物篮子集的规则中，按指标取每个后件最好的一条，降序排列"""
+        if metric not in INDEX_METRICS:
+            raise ValueError(f"不支持的排序指标: {metric}，可选 {', '.join(INDEX_METRICS)}")
+        basket = frozenset(str(item) for item in basket)
+        rank = 1 if metric == 'confidence' else 2
+        best = {}
+        for size in range(1, min(len(basket), self.max_antecedent_len) + 1):
+            for antecedent in combinations(sorted(basket), size):
+                by_metric = self.entries.get(frozenset(antecedent))
+                if by_metric is None:
+                    continue
+                taken = 0
+                for row in by_metric[metric]:
+                    consequent = row[0]
+                    if basket.intersection(consequent):
+                        continue
+                    current = best.get(consequent)
+                    if current is None or row[rank] > current[1][rank]:
+                        best[consequent] = (antecedent, row)
+                    taken += 1
+                    if taken >= top_n:
+                        break  # 每个前件的规则已按指标排序，后面的不会进入前 top_n
+        ranked = sorted(best.values(), key=lambda entry: entry[1][rank], reverse=True)[:top_n]
+        return [{
+            'antecedents': list(antecedent),
+            'consequents': list(row[0]),
+            '后件商品名称': [self.item_names.get(code, f"未知商品({code})") for code in row[0]],
+            'confidence': row[1],
+            'lift': row[2],
+            'support': row[3],
+            '单量': None if row[4] is None else int(row[4]),
+        } for antecedent, row in ranked]
+
+    def save(self, path):
+        """原子写出索引文件，读取方不会读到写了一半的文件"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        state = {'version': INDEX_VERSION, 'entries': self.entries,
+                 'item_names': self.item_names, 'built_at': self.built_at}
+        tmp_path = path + '.tmp'
+        pd.to_pickle(state, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        state = pd.read_pickle(path)
+        if state.get('version') != INDEX_VERSION:
+            raise ValueError(f"推荐索引版本不匹配，请重新生成: {path}")
+        return cls(state['entries'], state['item_names'], state['built_at'])
+
+
+class RuleIndexHolder:
+    """持有当前索引；检测到索引文件更新时在后台加载新索引，加载完成后整体替换引用，查询始终可用"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = RuleIndex.load(path)
+        self.mtime = os.stat(path).st_mtime_ns
+        self._lock = threading.Lock()
+
+    def reload_if_changed(self):
+        """索引文件有更新时重新加载，返回是否替换了索引"""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self.mtime:
+                return False
+            self.index = RuleIndex.load(self.path)
+            self.mtime = mtime
+            return True
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """启动后台线程定期检测索引文件更新"""
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.reload_if_changed():
+                        print(f"推荐索引已重新加载（{self.index.built_at}，{self.index.n_rules} 条规则）", flush=True)
+                except Exception as e:
+                    print(f"重新加载推荐索引失败，继续使用旧索引: {str(e)}", flush=True)
+        thread = threading.Thread(target=poll, daemon=True)
+        thread.start()
+        return thread
+
+    def recommend(self, basket, metric='confidence', top_n=10):
+        return self.index.recommend(basket, metric, top_n)
+
+
+def make_handler(holder):
+    class RecommendHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path == '/health':
+                index = holder.index
+                self.send_json(200, {'built_at': index.built_at, 'rules': index.n_rules,
+                                     'antecedents': len(index.entries)})
+            elif url.path == '/recommend':
+                items = [item for value in params.get('items', []) for item in value.split(',') if item]
+                try:
+                    metric = params.get('metric', ['confidence'])[0]
+                    top_n = int(params.get('top', ['10'])[0])
+                    results = holder.recommend(items, metric, top_n)
+                except ValueError as e:
+                    self.send_json(400, {'error': str(e)})
+                    return
+                self.send_json(200, {'items': items, 'metric': metric, 'built_at': holder.index.built_at,
+                                     'results': results})
+            else:
+                self.send_json(404, {'error': '可用路径: /recommend?items=A,B&metric=confidence&top=10, /health'})
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # 不逐条打印请求日志
+
+    return RecommendHandler
+
+
+def serve(index_path, host='127.0.0.1', port=DEFAULT_PORT):
+    holder = RuleIndexHolder(index_path)
+    holder.watch()
+    server = ThreadingHTTPServer((host, port), make_handler(holder))
+    print(f"推荐服务已启动: http://{host}:{port}/recommend?items=编码1,编码2（索引 {holder.index.built_at}，"
+          f"{holder.index.n_rules} 条规则）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def read_rules_file(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.csv'):
+        return pd.read_csv(path, encoding='utf-8-sig', dtype={'antecedents': str, 'consequents': str})
+    return pd.read_excel(path, dtype={'antecedents': str, 'consequents': str})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='关联规则推荐索引：构建、查询和本地 HTTP 服务')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='由导出的关联规则文件构建索引')
+    build_parser.add_argument('rules_file', help='最终结果_association_rules（.xlsx/.csv/.parquet）')
+    build_parser.add_argument('--index', default=RULE_INDEX_FILE, help='索引文件路径')
+
+    query_parser = subparsers.add_parser('query', help='查询购物篮的推荐结果')
+    query_parser.add_argument('items', nargs='+', help='购物篮中的商家编码')
+    query_parser.add_argument('--index', default=RULE_INDEX_FILE, help='索引文件路径')
+    query_parser.add_argument('--metric', choices=INDEX_METRICS, default='confidence')
+    query_parser.add_argument('--top', type=int, default=10)
+
+    serve_parser = subparsers.add_parser('serve', help='启动本地 HTTP 查询服务，索引文件更新后自动重新加载')
+    serve_parser.add_argument('--index', default=RULE_INDEX_FILE, help='索引文件路径')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        index = RuleIndex.from_rules(read_rules_file(args.rules_file))
+        index.save(args.index)
+        print(f"推荐索引已保存到: {args.index}（{len(index.entries)} 个前件，{index.n_rules} 条规则）")
+    elif args.command == 'query':
+        index = RuleIndex.load(args.index)
+        start = time.perf_counter()
+        results = index.recommend(args.items, args.metric, args.top)
+        elapsed = (time.perf_counter() - start) * 1e6
+        for rank, result in enumerate(results, 1):
+            print(f"{rank}. {ITEM_DELIMITER.join(result['consequents'])} {ITEM_DELIMITER.join(result['后件商品名称'])} "
+                  f"置信度 {result['confidence']:.4f} 提升度 {result['lift']:.4f} "
+                  f"（前件 {ITEM_DELIMITER.join(result['antecedents'])}）")
+        if not results:
+            print("没有匹配的关联规则。")
+        print(f"查询耗时 {elapsed:.0f} 微秒")
+    else:
+        serve(args.index, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
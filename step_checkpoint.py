@@ -0,0 +1,108 @@
+# step_checkpoint.py
+"""分步骤处理的 checkpoint：再次运行时跳过输入和参数都没有变化的步骤。
+
+每个步骤的指纹由步骤名称、参数、外部输入文件（路径、大小、修改时间）和上游步骤的指纹计算，
+上游步骤有变化时下游的指纹随之变化。步骤成功后记录指纹和输出文件（连同输出文件的大小、修改时间），
+下次运行时指纹相同且输出文件没有被修改或删除的步骤直接沿用输出文件。
+
+中间文件是 pickle（write_intermediate / read_intermediate），写入和读取都只需要零点几秒，数据类型原样保留；
+多个 sheet 的中间结果保存为 {sheet 名: DataFrame}。供用户核对的 中间过程处理_*.xlsx 由 export_excel 另存
+（超区发货费用窗口默认保存），下游步骤不读取它。
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# 步骤的处理逻辑或输出格式变化时递增，使旧 checkpoint 失效
+CHECKPOINT_VERSION = 2
+CHECKPOINT_DIR = '.checkpoints'
+MANIFEST_FILE = 'steps.json'
+INTERMEDIATE_SUFFIX = '.pkl'
+
+
+def file_stamp(path):
+    """文件的 [绝对路径, 大小, 修改时间]，文件不存在时为 None"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+class StepCheckpoints:
+    """directory/steps.json：{步骤名称: {'fingerprint', 'output', 'stamp'}}"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.steps = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == CHECKPOINT_VERSION:
+                    self.steps = manifest.get('steps', {})
+            except (OSError, ValueError):
+                self.steps = {}
+
+    @staticmethod
+    def fingerprint(step, upstream=None, files=(), params=None):
+        """upstream 为上游步骤的指纹；files 中的文件按路径、大小和修改时间计入"""
+        payload = [CHECKPOINT_VERSION, step, upstream, [file_stamp(path) for path in files], params]
+        return hashlib.sha1(json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+    def lookup(self, step, fingerprint):
+        """指纹相同且输出文件没有变化时返回输出文件，否则返回 None"""
+        entry = self.steps.get(step)
+        if not entry or entry['fingerprint'] != fingerprint:
+            return None
+        if file_stamp(entry['output']) != entry['stamp']:
+            return None
+        return entry['output']
+
+    def record(self, step, fingerprint, output):
+        self.steps[step] = {'fingerprint': fingerprint, 'output': output, 'stamp': file_stamp(output)}
+        os.makedirs(self.directory, exist_ok=True)
+        temp = self.manifest_path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'steps': self.steps}, f, ensure_ascii=False, indent=2)
+        os.replace(temp, self.manifest_path)
+
+
+def write_intermediate(data, path):
+    """保存中间结果（DataFrame 或 {sheet 名: DataFrame}），先写临时文件，完成后改名"""
+    temp = path + '.tmp'
+    pd.to_pickle(data, temp)
+    os.replace(temp, path)
+    return path
+
+
+def read_intermediate(path, sheet_name=0):
+    """读取中间结果；多个 sheet 的中间结果按 sheet_name（sheet 名或序号）取出其中一个，
+    sheet_name 为 None 时返回 {sheet 名: DataFrame}（与 pd.read_excel 相同）"""
+    data = pd.read_pickle(path)
+    if sheet_name is None:
+        return data if isinstance(data, dict) else {0: data}
+    if isinstance(data, dict):
+        return list(data.values())[sheet_name] if isinstance(sheet_name, int) else data[sheet_name]
+    return data
+
+
+def intermediate_sheet_names(path):
+    """多个 sheet 的中间结果的 sheet 名称"""
+    data = pd.read_pickle(path)
+    return list(data) if isinstance(data, dict) else [0]
+
+
+def export_excel(path):
+    """中间结果另存为同名 .xlsx（已是最新时跳过），返回 Excel 文件路径"""
+    excel_path = os.path.splitext(path)[0] + '.xlsx'
+    if os.path.exists(excel_path) and os.path.getmtime(excel_path) >= os.path.getmtime(path):
+        return excel_path
+    data = pd.read_pickle(path)
+    with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+        for sheet, df in (data.items() if isinstance(data, dict) else [('Sheet1', data)]):
+            df.to_excel(writer, sheet_name=sheet, index=False)
+    return excel_path
@@ -0,0 +1,233 @@
+# summary_cube.py
+"""超区发货汇总（月份 × 仓库 × 省份 × 店铺），代替在 Excel 中对逐行结果做数据透视。
+
+每次 order_pipeline.run_job 运行后，把本次结果按四个维度汇总，更新到输出目录下的 超区发货汇总.pkl，
+并导出同样内容的 超区发货汇总.xlsx。汇总表只有几百到几千行，上卷（例如只按月份、仓库）和下钻（筛选某个月、
+某个仓库后按省份、店铺展开）都直接在汇总表上计算，不需要再读取逐行结果。
+
+指标：
+- 缺货导致的超区发货数据（abnormal、combined）：记录数、订单数、下单数量，以及应发仓（济南仓覆盖省份为济南仓，
+  其他省份为佛山仓）期初、期末库存不大于 0 的记录数；
+- 超区发货费用数据（fee、combined）：计费订单数，以及发货数据中名称含“费”的数值字段（去掉佛山_/济南_前缀）的合计。
+
+增量更新：汇总按批次保存，批次为一次运行的订单文件（路径）。同一批订单文件再次运行时替换该批次的汇总，
+新的订单文件作为新批次累加，因此重复运行不会重复计数。订单数是每个格子内的不同订单编号数，
+同一订单的记录分在多个格子（例如拆到两个仓库发货）时，上卷后该订单在每个格子各计一次。
+
+命令行用法：
+    python summary_cube.py 输出目录/超区发货汇总.pkl --by 月份 仓库
+    python summary_cube.py 输出目录/超区发货汇总.pkl --by 省份 店铺 --where 月份=2025-06 --where 仓库=济南-优赛-市中
+    python summary_cube.py 输出目录/超区发货汇总.pkl --batches    # 列出已汇总的批次
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from order_pipeline import JINAN_COVERAGE, UNKNOWN_MONTH
+
+CUBE_VERSION = 1
+CUBE_FILE = '超区发货汇总.pkl'
+CUBE_EXPORT_FILE = '超区发货汇总.xlsx'
+DIMENSIONS = ['月份', '仓库', '省份', '店铺']
+UNKNOWN_VALUE = '未知'
+ORDER_MEASURES = ['记录数', '订单数', '下单数量', '应发仓期初缺货记录数', '应发仓期末缺货记录数']
+FEE_COUNT = '计费订单数'
+FEE_KEYWORD = '费'
+SHIPPING_PREFIXES = ('佛山_', '济南_')
+
+
+def batch_key(order_files):
+    """批次标识：订单文件的绝对路径（排序后）"""
+    return '|'.join(sorted(os.path.abspath(path) for path in order_files))
+
+
+def dimension_frame(df):
+    """四个维度列，月份转换为 YYYY-MM，空值记为 UNKNOWN_MONTH / UNKNOWN_VALUE"""
+    dims = pd.DataFrame(index=df.index)
+    dims['月份'] = df['月份'].astype(str).where(df['月份'].notna(), UNKNOWN_MONTH)
+    for col in DIMENSIONS[1:]:
+        dims[col] = df[col].astype(object).where(df[col].notna(), UNKNOWN_VALUE)
+    return dims
+
+
+def summarize_orders(df):
+    """缺货导致的超区发货数据按四个维度汇总"""
+    should_jinan = df['省份'].isin(JINAN_COVERAGE).to_numpy()
+    known = df['省份'].notna().to_numpy()
+    opening = np.where(should_jinan, df['济南仓期初库存'], df['佛山仓期初库存'])
+    closing = np.where(should_jinan, df['济南仓期末库存'], df['佛山仓期末库存'])
+    frame = dimension_frame(df).assign(
+        记录数=1,
+        订单编号=df['订单编号'],
+        下单数量=pd.to_numeric(df['下单数量'], errors='coerce').fillna(0),
+        应发仓期初缺货记录数=(known & (opening <= 0)).astype(int),
+        应发仓期末缺货记录数=(known & (closing <= 0)).astype(int),
+    )
+    grouped = frame.groupby(DIMENSIONS, sort=False)
+    summary = grouped[['记录数', '下单数量', '应发仓期初缺货记录数', '应发仓期末缺货记录数']].sum()
+    summary['订单数'] = grouped['订单编号'].nunique()
+    return summary.reset_index()[DIMENSIONS + ORDER_MEASURES]
+
+
+def fee_columns(df):
+    """去掉佛山_/济南_前缀后名称含“费”的数值字段，返回 {原字段: 汇总字段}"""
+    columns = {}
+    for col in df.columns:
+        name = str(col)
+        for prefix in SHIPPING_PREFIXES:
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        if FEE_KEYWORD in name and pd.api.types.is_numeric_dtype(df[col]):
+            columns[col] = name
+    return columns
+
+
+def summarize_fees(sheets):
+    """超区发货费用数据（{sheet 名: 按订单编号去重后的数据}）按四个维度汇总"""
+    frames = []
+    for df in sheets.values():
+        columns = fee_columns(df)
+        fees = df[list(columns)].rename(columns=columns)
+        frames.append(pd.concat([dimension_frame(df), fees], axis=1).assign(**{FEE_COUNT: 1}))
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DIMENSIONS + [FEE_COUNT])
+    measures = [FEE_COUNT] + [col for col in frame.columns if col not in DIMENSIONS and col != FEE_COUNT]
+    return frame.groupby(DIMENSIONS, sort=False)[measures].sum().reset_index()
+
+
+def combine_measures(frames):
+    """同类汇总（各批次）相加"""
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).groupby(DIMENSIONS, sort=False).sum().reset_index()
+
+
+class SummaryCube:
+    """汇总文件，保存在 path 指定的 pickle 文件中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.batches = {}  # {批次标识: {'orders': 汇总或 None, 'fees': 汇总或 None, 'updated_at': 时间}}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        state = pd.read_pickle(self.path)
+        if state.get('version') != CUBE_VERSION:
+            return
+        self.batches = state['batches']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        pd.to_pickle({'version': CUBE_VERSION, 'batches': self.batches}, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def update(self, results, batch):
+        """用一次运行的结果（order_pipeline.compute_results 的返回值）替换该批次的汇总；
+        本次没有计算的结果（例如 abnormal 任务没有费用数据）保留该批次原有的汇总"""
+        entry = dict(self.batches.get(batch, {'orders': None, 'fees': None}))
+        if 'abnormal' in results:
+            entry['orders'] = summarize_orders(results['abnormal'])
+        if 'fee' in results:
+            entry['fees'] = summarize_fees(results['fee'])
+        entry['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.batches[batch] = entry
+
+    def merge(self, other):
+        """合并另一个汇总文件的批次（相同批次以 other 为准）"""
+        self.batches.update(other.batches)
+
+    def table(self):
+        """全部批次合计后的汇总表，两类指标按维度外连接，没有数据的指标记为 0"""
+        orders = combine_measures([entry['orders'] for entry in self.batches.values() if entry['orders'] is not None])
+        fees = combine_measures([entry['fees'] for entry in self.batches.values() if entry['fees'] is not None])
+        if orders is None and fees is None:
+            return pd.DataFrame(columns=DIMENSIONS + ORDER_MEASURES + [FEE_COUNT])
+        if orders is None or fees is None:
+            table = orders if fees is None else fees
+        else:
+            table = orders.merge(fees, on=DIMENSIONS, how='outer')
+        measures = [col for col in table.columns if col not in DIMENSIONS]
+        table[measures] = table[measures].fillna(0)
+        # 外连接补空值后计数变为浮点数，取整数值的计数字段恢复为整数
+        for col in ORDER_MEASURES + [FEE_COUNT]:
+            if col in table.columns and (table[col] % 1 == 0).all():
+                table[col] = table[col].astype('int64')
+        return table.sort_values(DIMENSIONS, ignore_index=True)
+
+    def rollup(self, by=(), where=None):
+        """按 by 中的维度上卷（为空时为总计），where 为 {维度: 值或值列表} 的筛选条件"""
+        table = self.table()
+        for dim, values in (where or {}).items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"未知的维度: {dim}，可选 {', '.join(DIMENSIONS)}")
+            table = table[table[dim].isin(values if isinstance(values, (list, tuple, set)) else [values])]
+        measures = [col for col in table.columns if col not in DIMENSIONS]
+        by = list(by)
+        unknown = [dim for dim in by if dim not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"未知的维度: {', '.join(unknown)}，可选 {', '.join(DIMENSIONS)}")
+        if not by:
+            return pd.DataFrame([table[measures].sum()], index=['合计']).astype(table[measures].dtypes.to_dict())
+        return table.groupby(by)[measures].sum().reset_index()
+
+    def export(self, output_file):
+        """汇总表写入 Excel"""
+        self.table().to_excel(output_file, index=False)
+
+
+def update_cube(results, order_files, output_dir, log=print):
+    """run_job 调用：把本次结果更新到 output_dir 的汇总文件并导出 Excel，返回汇总文件路径"""
+    cube = SummaryCube(os.path.join(output_dir, CUBE_FILE))
+    cube.update(results, batch_key(order_files))
+    cube.save()
+    cube.export(os.path.join(output_dir, CUBE_EXPORT_FILE))
+    log(f"超区发货汇总已更新（{len(cube.batches)} 个批次，{len(cube.table())} 个格子）: "
+        f"{os.path.join(output_dir, CUBE_EXPORT_FILE)}")
+    return cube.path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询超区发货汇总（月份 × 仓库 × 省份 × 店铺）')
+    parser.add_argument('cube', help='汇总文件（超区发货汇总.pkl）')
+    parser.add_argument('--by', nargs='*', default=[], choices=DIMENSIONS, help='上卷到这些维度，不指定时为总计')
+    parser.add_argument('--where', action='append', default=[], metavar='维度=值',
+                        help='筛选条件，可指定多次；同一维度多个值用逗号分隔')
+    parser.add_argument('--batches', action='store_true', help='列出已汇总的批次')
+    parser.add_argument('--excel', help='查询结果另存为 Excel')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.cube):
+        print(f"错误：汇总文件 {args.cube} 不存在")
+        return 1
+    cube = SummaryCube(args.cube)
+    if args.batches:
+        for batch, entry in cube.batches.items():
+            print(f"{entry['updated_at']}  {batch.replace('|', ', ')}")
+        return 0
+    where = {}
+    for condition in args.where:
+        dim, sep, values = condition.partition('=')
+        if not sep:
+            print(f"错误：筛选条件应为 维度=值: {condition}")
+            return 1
+        where[dim.strip()] = [value.strip() for value in values.split(',')]
+    try:
+        result = cube.rollup(args.by, where)
+    except ValueError as e:
+        print(f"错误：{e}")
+        return 1
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(result.to_string(index=False))
+    if args.excel:
+        result.to_excel(args.excel, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# synthetic_data.py
+"""生成性能测试用的模拟数据，字段与真实导出文件一致。
+
+- 订单导出：包含 fee.py、abnormal_order_data.py 和 apriori_app.py 需要的全部字段，每单 1~6 个商品，
+  商品按 Zipf 分布抽样（少数商品很畅销），少量收货地区为空、物流单号为空、无效商家编码，贴近真实数据；
+- 库存数据：货品编号 / 仓库名称 / 期初库存 / 期末库存，部分商品没有库存记录；
+- 发货数据：佛山发货数据、济南发货数据两个 sheet，原始单号 + 费用字段，部分订单没有发货记录。
+
+订单超过 Excel 单个 sheet 的行数上限时拆分为多个文件。生成结果按（行数，随机种子）缓存在输出目录中。
+
+命令行用法：
+    python synthetic_data.py --rows 100000 --out benchmark_data
+"""
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from exclusion_rules import EXCLUSION_RULES
+
+# 每个订单文件的最大行数（低于 Excel 上限，与真实导出的拆分方式类似）
+ROWS_PER_FILE = 500000
+STORES = ['旗舰店', '专营店', '天猫超市', '京东自营', '抖音小店']
+WAREHOUSES = ['佛山-优赛-三水仓', '济南-优赛-市中', '广州-云仓', '武汉-中转仓']
+WAREHOUSE_WEIGHTS = [0.45, 0.35, 0.15, 0.05]
+PROVINCES = ['广东省', '广西壮族自治区', '福建省', '湖南省', '四川省', '云南省', '贵州省', '重庆', '海南省', '江西省',
+             '北京', '天津', '河北省', '山西省', '辽宁省', '吉林省', '黑龙江省', '上海', '江苏省', '浙江省',
+             '安徽省', '山东省', '河南省', '湖北省', '内蒙古自治区', '陕西省']
+EXPRESS_COMPANIES = ['顺丰', '中通', '圆通', '韵达', '京东物流']
+FOSHAN_SHEET = '佛山发货数据'
+JINAN_SHEET = '济南发货数据'
+
+
+def _write_workbook(path, sheets):
+    """以 openpyxl 只写模式写出多个 sheet（{sheet 名: DataFrame}）"""
+    workbook = Workbook(write_only=True)
+    for name, df in sheets.items():
+        sheet = workbook.create_sheet(title=name)
+        sheet.append([str(col) for col in df.columns])
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def generate_orders(n_rows, seed=0):
+    """生成约 n_rows 行订单明细（每行一个商品）"""
+    rng = np.random.default_rng(seed)
+    n_items = int(np.clip(n_rows // 50, 200, 20000))
+    n_orders = max(n_rows * 2 // 7, 1)  # 平均每单 3.5 行
+    basket_sizes = rng.integers(1, 7, size=n_orders)
+    basket_sizes = basket_sizes[np.cumsum(basket_sizes) <= n_rows]
+    n_orders = len(basket_sizes)
+    order_of_row = np.repeat(np.arange(n_orders), basket_sizes)
+    n = len(order_of_row)
+
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 1.1
+    popularity /= popularity.sum()
+    item_codes = np.array([f'SKU{i:06d}' for i in range(n_items)], dtype=object)
+    item_names = np.array([f'商品{i:06d}' for i in range(n_items)], dtype=object)
+    items = rng.choice(n_items, size=n, p=popularity)
+    codes = item_codes[items]
+    invalid = rng.random(n) < 0.01
+    codes[invalid] = rng.choice(EXCLUSION_RULES, size=int(invalid.sum()))
+
+    # 订单级字段
+    order_ids = np.array([f'T{seed:02d}{i:010d}' for i in range(n_orders)], dtype=object)
+    source_ids = np.array([f'P{seed:02d}{i:010d}' for i in range(n_orders)], dtype=object)
+    stores = rng.choice(STORES, size=n_orders)
+    warehouses = rng.choice(WAREHOUSES, size=n_orders, p=WAREHOUSE_WEIGHTS)
+    provinces = rng.choice(PROVINCES, size=n_orders)
+    regions = np.char.add(provinces.astype(str), ' 某市 某区').astype(object)
+    regions[rng.random(n_orders) < 0.01] = None
+    pay_times = pd.Timestamp('2025-06-01') + pd.to_timedelta(rng.integers(0, 30 * 86400, size=n_orders), unit='s')
+    tracking = np.array([f'SF{seed:02d}{i:011d}' for i in range(n_orders)], dtype=object)
+    tracking[rng.random(n_orders) < 0.02] = None
+    customers = np.array([f'C{i:08d}' for i in rng.integers(0, max(n_orders // 3, 1), size=n_orders)], dtype=object)
+
+    combo = np.full(n, None, dtype=object)
+    in_combo = rng.random(n) < 0.05
+    combo[in_combo] = '组合装' + codes[in_combo].astype(str)
+    return pd.DataFrame({
+        '订单编号': order_ids[order_of_row],
+        '店铺': stores[order_of_row],
+        '仓库': warehouses[order_of_row],
+        '子单原始单号': source_ids[order_of_row],
+        '付款时间': pay_times[order_of_row],
+        '收货地区': regions[order_of_row],
+        '商家编码': codes,
+        '货品名称': np.where(invalid, '冰袋', item_names[items]),
+        '下单数量': rng.integers(1, 4, size=n),
+        '物流单号': tracking[order_of_row],
+        '拆自组合装': combo,
+        '客户编号': customers[order_of_row],
+    })
+
+
+def generate_inventory(orders, seed=0):
+    """为订单中出现的商品生成两个仓库（及其他仓库）的库存，约 5% 的商品没有库存记录"""
+    rng = np.random.default_rng(seed + 1)
+    codes = pd.unique(orders['商家编码'])
+    codes = codes[rng.random(len(codes)) >= 0.05]
+    inventory = pd.DataFrame({
+        '货品编号': np.repeat(codes, len(WAREHOUSES)),
+        '仓库名称': np.tile(WAREHOUSES, len(codes)),
+    })
+    inventory['期初库存'] = rng.integers(0, 500, size=len(inventory))
+    inventory['期末库存'] = rng.integers(0, 500, size=len(inventory))
+    return inventory
+
+
+def generate_shipping(orders, seed=0):
+    """生成佛山、济南两个仓库的发货费用数据，约 3% 的子单没有发货记录"""
+    rng = np.random.default_rng(seed + 2)
+    sheets = {}
+    for sheet, keyword in [(FOSHAN_SHEET, '佛山'), (JINAN_SHEET, '济南')]:
+        shipped = orders.loc[orders['仓库'].str.contains(keyword), '子单原始单号'].drop_duplicates()
+        shipped = shipped[rng.random(len(shipped)) >= 0.03].to_numpy()
+        n = len(shipped)
+        sheets[sheet] = pd.DataFrame({
+            '原始单号': shipped,
+            '快递公司': rng.choice(EXPRESS_COMPANIES, size=n),
+            '重量': rng.uniform(0.2, 10, size=n).round(2),
+            '首重费用': rng.choice([6.0, 8.0, 12.0], size=n),
+            '续重费用': rng.uniform(0, 30, size=n).round(2),
+            '发货日期': (pd.Timestamp('2025-06-01') + pd.to_timedelta(rng.integers(0, 31, size=n), unit='D')),
+        })
+        sheets[sheet]['运费合计'] = (sheets[sheet]['首重费用'] + sheets[sheet]['续重费用']).round(2)
+    return sheets
+
+
+def generate_dataset(out_dir, n_rows, seed=0, log=print):
+    """生成（或复用已生成的）一套模拟数据，返回 {'orders': [文件], 'inventory': 文件, 'shipping': 文件, 'rows': 行数}"""
+    dataset_dir = os.path.join(out_dir, f'rows{n_rows}_seed{seed}')
+    manifest_file = os.path.join(dataset_dir, 'manifest.json')
+    if os.path.exists(manifest_file):
+        with open(manifest_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    log(f"正在生成 {n_rows} 行模拟订单数据: {dataset_dir}")
+    orders = generate_orders(n_rows, seed)
+    order_files = []
+    for part, start in enumerate(range(0, len(orders), ROWS_PER_FILE)):
+        path = os.path.join(dataset_dir, f'订单导出_{part + 1}.xlsx')
+        _write_workbook(path, {'Sheet1': orders.iloc[start:start + ROWS_PER_FILE]})
+        order_files.append(path)
+    inventory_file = _write_workbook(os.path.join(dataset_dir, '库存数据.xlsx'),
+                                     {'Sheet1': generate_inventory(orders, seed)})
+    shipping_file = _write_workbook(os.path.join(dataset_dir, '发货数据.xlsx'), generate_shipping(orders, seed))
+
+    dataset = {'orders': order_files, 'inventory': inventory_file, 'shipping': shipping_file,
+               'rows': len(orders), 'seed': seed}
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(dataset, f, ensure_ascii=False, indent=2)
+    return dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成性能测试用的模拟订单、库存和发货数据')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='订单明细行数（可指定多个）')
+    parser.add_argument('--out', default='benchmark_data', help='输出目录')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    for n_rows in args.rows:
+        dataset = generate_dataset(args.out, n_rows, args.seed)
+        print(f"{dataset['rows']} 行订单（{len(dataset['orders'])} 个文件）、库存、发货数据已保存到 "
+              f"{os.path.dirname(dataset['inventory'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from apriori_core import read_order_items
+
+
+def test_numeric_ids_read_as_text_despite_blanks(tmp_path):
+    with_blanks = tmp_path / 'with_blanks.xlsx'
+    without_blanks = tmp_path / 'without_blanks.xlsx'
+    pd.DataFrame({'订单编号': [1001, 1001, None], '店铺': ['旗舰店'] * 3, '客户编号': [7, None, 7],
+                  '商家编码': [123, 456, 123], '货品名称': ['甲', '乙', '甲']}).to_excel(with_blanks, index=False)
+    pd.DataFrame({'订单编号': [1002, 1002], '店铺': ['旗舰店'] * 2, '客户编号': [8, 8],
+                  '商家编码': [123, None], '货品名称': ['甲', '丙']}).to_excel(without_blanks, index=False)
+
+    first = read_order_items(str(with_blanks))
+    second = read_order_items(str(without_blanks))
+    assert first['订单编号'].tolist()[:2] == ['1001', '1001']
+    assert pd.isna(first['订单编号'].iloc[2])
+    assert first['客户编号'].tolist()[0] == '7' and pd.isna(first['客户编号'].iloc[1])
+    assert set(first['商家编码']) == {'123', '456'}
+    assert second['商家编码'].iloc[0] == '123' and pd.isna(second['商家编码'].iloc[1])
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from instrumentation import StageProfiler
+from order_pipeline import PandasBackend, compare_results, create_backend
+from synthetic_data import generate_dataset
+
+# 与 pandas 后端逐表对比的执行后端
+BACKENDS = ['duckdb', 'polars']
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    dataset = generate_dataset(str(tmp_path_factory.mktemp('data')), 600, seed=3, log=lambda message: None)
+    cache = {}
+
+    def reader(path, sheet_name=0):
+        if (path, sheet_name) not in cache:
+            cache[path, sheet_name] = pd.read_excel(path, sheet_name=sheet_name)
+        return cache[path, sheet_name].copy()
+
+    return {'orders': dataset['orders'], 'inventory': dataset['inventory'], 'shipping': dataset['shipping'],
+            'reader': reader}
+
+
+@pytest.fixture(scope='module')
+def reference(inputs):
+    return {job: PandasBackend().compute(job, inputs, lambda message: None, StageProfiler())
+            for job in ('abnormal', 'fee', 'combined')}
+
+
+@pytest.mark.parametrize('job', ['abnormal', 'fee', 'combined'])
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backend_matches_pandas(backend, job, inputs, reference, tmp_path):
+    pytest.importorskip(backend)
+    engine = create_backend(backend, str(tmp_path))
+    try:
+        results = engine.compute(job, inputs, lambda message: None, StageProfiler())
+    finally:
+        engine.close()
+    assert compare_results(results, reference[job]) == []
+
+
+def test_reference_is_not_trivial(reference):
+    assert len(reference['combined']['abnormal']) > 0
+    assert all(len(df) > 0 for df in reference['fee']['fee'].values())
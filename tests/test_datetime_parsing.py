@@ -0,0 +1,62 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from order_pipeline import add_month, detect_datetime_format, parse_datetime
+
+
+@pytest.mark.parametrize('values, expected', [
+    (['2025-06-01 08:30:00', '2025-06-30 23:59:59'], '%Y-%m-%d %H:%M:%S'),
+    (['2025/06/01 08:30:00', '2025/12/31 00:00:01'], '%Y/%m/%d %H:%M:%S'),
+    (['2025-06-01 08:30', '2025-07-02 10:00'], '%Y-%m-%d %H:%M'),
+    (['2025-06-01', '2025-07-02'], '%Y-%m-%d'),
+    (['20250601083000', '20250702100000'], '%Y%m%d%H%M%S'),
+])
+def test_detect_datetime_format(values, expected):
+    assert detect_datetime_format(pd.Series(values + [None])) == expected
+
+
+def test_detect_without_text():
+    assert detect_datetime_format(pd.Series([None, None])) is None
+    assert detect_datetime_format(pd.Series([datetime.datetime(2025, 6, 1)], dtype=object)) is None
+    assert detect_datetime_format(pd.Series(['不是日期', '也不是'])) is None
+
+
+def test_parse_datetime_matches_to_datetime():
+    values = pd.Series(['2025-06-01 08:30:00', None, '2025-07-15 12:00:00', '2025-08-31 23:59:59'] * 100)
+    pd.testing.assert_series_equal(parse_datetime(values), pd.to_datetime(values))
+
+
+def test_parse_datetime_outliers_fall_back_to_per_value_parsing():
+    values = pd.Series(['2025-06-01 08:30:00'] * 300 + ['2025/07/02 10:00', '无效', None])
+    parsed = parse_datetime(values)
+    assert parsed.iloc[0] == pd.Timestamp('2025-06-01 08:30:00')
+    assert parsed.iloc[300] == pd.Timestamp('2025-07-02 10:00:00')
+    assert parsed.iloc[301:].isna().all()
+
+
+def test_parse_datetime_keeps_datetime_columns():
+    values = pd.Series(pd.to_datetime(['2025-06-01', None]))
+    assert parse_datetime(values) is values
+
+
+def test_add_month_buckets_by_period():
+    df = pd.DataFrame({'付款时间': ['2025-06-30 23:59:59', '2025-07-01 00:00:00', None]})
+    result = add_month(df)
+    assert str(result['月份'].dtype) == 'period[M]'
+    assert result['月份'].iloc[:2].astype(str).tolist() == ['2025-06', '2025-07']
+    assert pd.isna(result['月份'].iloc[2])
+    assert pd.api.types.is_datetime64_any_dtype(result['付款时间'])
+
+
+def test_month_written_to_parquet_as_text(tmp_path):
+    pytest.importorskip('pyarrow')
+    from rule_export import write_table
+
+    result = add_month(pd.DataFrame({'付款时间': ['2025-06-30 23:59:59', None]}))
+    path = write_table(result, str(tmp_path / 'result.parquet'))
+    months = pd.read_parquet(path)['月份']
+    assert months.dtype == object
+    assert months.tolist() == ['2025-06', None]
+    assert str(result['月份'].dtype) == 'period[M]'
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from exclusion_rules import EXCLUSION_RULES, AhoCorasick, ExclusionMatcher
+
+# 改为共用规则列表之前超区发货处理使用的正则表达式
+OLD_PATTERNS = [r'250g冰袋\*2\+500g干冰\*1', r'250g冰袋\*4', r'XDJXN', r'XDJLW']
+
+
+def sample_codes(seed=0, size=2000):
+    rng = np.random.default_rng(seed)
+    pieces = EXCLUSION_RULES + [rule.lower() for rule in EXCLUSION_RULES] + ['SKU', '250g冰袋', '*4', 'xdj', '-', '']
+    codes = [''.join(rng.choice(pieces, size=rng.integers(1, 4))) + str(rng.integers(100)) for _ in range(size)]
+    codes = pd.Series(codes, dtype=object)
+    codes.iloc[::97] = None
+    return codes
+
+
+def test_substring_matches_old_regex_filter():
+    codes = sample_codes()
+    old = codes.astype(str).str.contains('|'.join(OLD_PATTERNS), case=False, na=False, regex=True)
+    old[codes.isna()] = False
+    new = ExclusionMatcher(mode='substring').mask(codes)
+    assert new.index.equals(codes.index)
+    assert new.tolist() == old.tolist()
+    assert new.any() and not new.all()
+
+
+def test_exact_matches_old_isin_filter():
+    codes = pd.Series(EXCLUSION_RULES + [rule.lower() for rule in EXCLUSION_RULES] + ['X' + EXCLUSION_RULES[2], None],
+                      index=range(10, 20))
+    new = ExclusionMatcher(EXCLUSION_RULES, mode='exact', case_sensitive=True).mask(codes)
+    assert new.tolist() == codes.isin(EXCLUSION_RULES).tolist()
+
+
+@pytest.mark.parametrize('mode', ['substring', 'exact'])
+@pytest.mark.parametrize('case_sensitive', [False, True])
+def test_regex_equivalent_to_mask(mode, case_sensitive):
+    matcher = ExclusionMatcher(mode=mode, case_sensitive=case_sensitive)
+    codes = pd.concat([sample_codes(seed=1), pd.Series(EXCLUSION_RULES + [rule.lower() for rule in EXCLUSION_RULES])],
+                      ignore_index=True)
+    via_regex = codes.str.contains(matcher.regex(), na=False, regex=True)
+    assert via_regex.tolist() == matcher.mask(codes).tolist()
+    assert ExclusionMatcher(rules=[]).regex() is None
+
+
+@pytest.mark.parametrize('case_sensitive', [False, True])
+def test_backend_regex_honours_case_sensitivity(case_sensitive):
+    duckdb = pytest.importorskip('duckdb')
+    polars = pytest.importorskip('polars')
+    matcher = ExclusionMatcher(case_sensitive=case_sensitive)
+    codes = sample_codes(seed=2).dropna().tolist()
+    expected = matcher.mask(pd.Series(codes)).tolist()
+    assert [row[0] for row in duckdb.execute('SELECT regexp_matches(code, ?) FROM unnest(?) t(code)',
+                                             [matcher.regex(), codes]).fetchall()] == expected
+    assert polars.Series(codes).str.contains(matcher.regex()).to_list() == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('ushers', True), ('she', True), ('hers', True), ('xhisx', True), ('sh', False), ('', False),
+])
+def test_aho_corasick_overlapping_patterns(text, expected):
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert automaton.contains(text) is expected
+    assert expected == any(pattern in text for pattern in ['he', 'she', 'his', 'hers'])
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        ExclusionMatcher(mode='regex')
+
+
+def test_signature_covers_rules_and_mode():
+    base = ExclusionMatcher(EXCLUSION_RULES, mode='exact', case_sensitive=True)
+    assert base.signature() == ExclusionMatcher(EXCLUSION_RULES, mode='exact', case_sensitive=True).signature()
+    assert base.signature() != ExclusionMatcher(EXCLUSION_RULES + ['新规则'], mode='exact', case_sensitive=True).signature()
+    assert base.signature() != ExclusionMatcher(EXCLUSION_RULES, mode='substring', case_sensitive=True).signature()
+    assert base.signature() != ExclusionMatcher(EXCLUSION_RULES, mode='exact').signature()
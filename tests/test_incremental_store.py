@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import apriori
+
+from apriori_core import clean_order_items, one_hot_encode, read_order_items
+from incremental_store import IncrementalItemsetStore
+
+MIN_SUPPORT = 0.05
+HOT_ITEMSET = frozenset(['I90', 'I91', 'I92'])
+
+
+def write_batch(path, batch, n_orders, hot_share, rng):
+    """随机订单；hot_share 的订单额外包含 HOT_ITEMSET 中的三个商品"""
+    rows = []
+    for order in range(n_orders):
+        items = set(rng.choice(20, size=rng.integers(2, 5), replace=False))
+        if rng.random() < hot_share:
+            items |= {90, 91, 92}
+        rows += [{'订单编号': f"b{batch}o{order}", '店铺': '旗舰店', '客户编号': 'c', '商家编码': f"I{item}",
+                  '货品名称': f"商品{item}"} for item in items]
+    pd.DataFrame(rows).to_excel(path, index=False)
+    return str(path)
+
+
+def test_remine_when_untracked_itemsets_may_become_frequent(tmp_path):
+    rng = np.random.default_rng(1)
+    files = [write_batch(tmp_path / 'b0.xlsx', 0, 400, 0.0, rng)]
+    store = IncrementalItemsetStore(str(tmp_path / 'store.pkl'))
+    store.batches['b0'] = files[0]
+    store.full_remine(MIN_SUPPORT)
+    assert not store.needs_full_remine(MIN_SUPPORT)
+    assert HOT_ITEMSET not in set(store.frequent_itemsets(MIN_SUPPORT)['itemsets'])
+
+    remined = 0
+    for batch in range(1, 4):
+        files.append(write_batch(tmp_path / f"b{batch}.xlsx", batch, 100, 0.3, rng))
+        store.add_batch([read_order_items(files[-1])], {f"b{batch}": files[-1]})
+        if store.needs_full_remine(MIN_SUPPORT):
+            remined += 1
+            store.full_remine(MIN_SUPPORT)
+        expected = apriori(one_hot_encode(clean_order_items([read_order_items(path) for path in files])),
+                           min_support=MIN_SUPPORT, use_colnames=True)
+        assert set(store.frequent_itemsets(MIN_SUPPORT)['itemsets']) == set(expected['itemsets'])
+    assert remined
+    assert HOT_ITEMSET in set(store.frequent_itemsets(MIN_SUPPORT)['itemsets'])
+
+
+def test_drift_state_persists_and_old_stores_are_remined(tmp_path):
+    rng = np.random.default_rng(2)
+    path = write_batch(tmp_path / 'b0.xlsx', 0, 200, 0.0, rng)
+    store = IncrementalItemsetStore(str(tmp_path / 'store.pkl'))
+    store.batches['b0'] = path
+    store.full_remine(MIN_SUPPORT)
+    store.add_batch([read_order_items(write_batch(tmp_path / 'b1.xlsx', 1, 20, 0.0, rng))], {})
+    store.save()
+
+    reloaded = IncrementalItemsetStore(store.path)
+    assert reloaded.remine_transactions == store.remine_transactions
+    assert reloaded.untracked_growth == store.untracked_growth > 0
+
+    state = pd.read_pickle(store.path)
+    assert reloaded.order_ids == store.order_ids and len(store.order_ids) == 220
+
+    del state['order_ids']
+    state['version'] = 2
+    pd.to_pickle(state, store.path)
+    assert IncrementalItemsetStore(store.path).needs_full_remine(MIN_SUPPORT)
+    state['version'] = 1
+    del state['remine_transactions'], state['untracked_growth']
+    pd.to_pickle(state, store.path)
+    assert IncrementalItemsetStore(store.path).needs_full_remine(MIN_SUPPORT)
+
+
+def test_resaved_batch_is_not_counted_twice(tmp_path):
+    rng = np.random.default_rng(3)
+    first = write_batch(tmp_path / 'b0.xlsx', 0, 200, 0.2, rng)
+    store = IncrementalItemsetStore(str(tmp_path / 'store.pkl'))
+    store.batches['b0'] = first
+    store.full_remine(MIN_SUPPORT)
+    counts = (store.n_transactions, dict(store.item_counts), dict(store.pair_counts), dict(store.tracked_counts))
+
+    # 同一份导出另存为新文件（路径和修改时间不同，批次指纹不同）
+    resaved = tmp_path / 'b0_resaved.xlsx'
+    pd.read_excel(first).to_excel(resaved, index=False)
+    assert store.add_batch([read_order_items(str(resaved))], {'b0 resaved': str(resaved)}) == (0, 200)
+    assert (store.n_transactions, dict(store.item_counts), dict(store.pair_counts),
+            dict(store.tracked_counts)) == counts
+
+    # 与已累加的订单部分重叠的新文件只累加新订单，全量重新挖掘的结果与增量一致
+    overlap = tmp_path / 'b1.xlsx'
+    extra = pd.read_excel(write_batch(tmp_path / 'extra.xlsx', 1, 50, 0.2, rng))
+    pd.concat([pd.read_excel(first).head(30), extra]).to_excel(overlap, index=False)
+    added, skipped = store.add_batch([read_order_items(str(overlap))], {'b1': str(overlap)})
+    assert added == 50 and skipped > 0
+    assert store.n_transactions == counts[0] + 50
+    incremental = (store.n_transactions, dict(store.item_counts), dict(store.pair_counts))
+    store.full_remine(MIN_SUPPORT)
+    assert (store.n_transactions, dict(store.item_counts), dict(store.pair_counts)) == incremental
@@ -0,0 +1,126 @@
+import os
+
+import pandas as pd
+import pytest
+
+from apriori_core import INVALID_CODE_MATCHER
+from exclusion_rules import ExclusionMatcher
+from itemset_cache import ItemsetCache, fingerprint_files
+
+
+@pytest.fixture
+def itemsets():
+    return pd.DataFrame({
+        'support': [0.5, 0.2, 0.05, 0.01],
+        'itemsets': [frozenset(['A']), frozenset(['B']), frozenset(['A', 'B']), frozenset(['A', 'B', 'C'])],
+    })
+
+
+def test_hit_filters_lower_support_entry(itemsets):
+    cache = ItemsetCache()
+    cache.put('fp', 0.01, itemsets, 100, {'A': '商品A'})
+    hit = cache.get('fp', 0.05)
+    assert hit['cached_support'] == 0.01
+    assert hit['n_transactions'] == 100
+    assert hit['item_name_mapping'] == {'A': '商品A'}
+    assert hit['frequent_itemsets']['support'].tolist() == [0.5, 0.2, 0.05]
+    assert cache.get('fp', 0.01)['frequent_itemsets'] is itemsets
+
+
+def test_miss_below_cached_support_or_other_fingerprint(itemsets):
+    cache = ItemsetCache()
+    cache.put('fp', 0.05, itemsets, 100, {})
+    assert cache.get('fp', 0.01) is None
+    assert cache.get('other', 0.05) is None
+    assert cache.n_transactions('other') is None
+
+
+def test_prefers_highest_usable_support(itemsets):
+    cache = ItemsetCache()
+    cache.put('fp', 0.01, itemsets, 100, {})
+    cache.put('fp', 0.05, itemsets[itemsets['support'] >= 0.05], 100, {})
+    assert cache.get('fp', 0.2)['cached_support'] == 0.05
+    assert cache.get('fp', 0.02)['cached_support'] == 0.01
+
+
+def test_disk_cache_survives_new_instance(tmp_path, itemsets):
+    ItemsetCache(str(tmp_path)).put('fp', 0.01, itemsets, 100, {'A': '商品A'})
+    cache = ItemsetCache(str(tmp_path))
+    assert cache.n_transactions('fp') == 100
+    hit = cache.get('fp', 0.2)
+    assert hit['frequent_itemsets']['support'].tolist() == [0.5, 0.2]
+
+    (tmp_path / 'fp_0.50000000.pkl').write_bytes(b'corrupt')
+    assert ItemsetCache(str(tmp_path)).get('fp', 0.5)['cached_support'] == 0.01
+
+
+def test_fingerprint_changes_with_files_and_rules(tmp_path):
+    path = tmp_path / 'orders.xlsx'
+    path.write_bytes(b'v1')
+    files = [str(path)]
+    base = fingerprint_files(files, INVALID_CODE_MATCHER)
+    assert base == fingerprint_files(files, INVALID_CODE_MATCHER)
+
+    changed_rules = ExclusionMatcher(INVALID_CODE_MATCHER.rules + ['新辅料'], mode='exact', case_sensitive=True)
+    assert base != fingerprint_files(files, changed_rules)
+    assert base != fingerprint_files(files, ExclusionMatcher(INVALID_CODE_MATCHER.rules, mode='substring'))
+
+    path.write_bytes(b'version 2')
+    assert base != fingerprint_files(files, INVALID_CODE_MATCHER)
+    os.remove(path)
+    with pytest.raises(OSError):
+        fingerprint_files(files)
+
+
+def test_adjusted_support_alias(tmp_path, itemsets):
+    raised = itemsets[itemsets['support'] >= 0.05].reset_index(drop=True)
+    ItemsetCache(str(tmp_path)).put('fp', 0.05, raised, 100, {}, requested_support=0.001)
+    cache = ItemsetCache(str(tmp_path))
+    assert cache.n_transactions('fp') == 100
+    hit = cache.get('fp', 0.001, allow_adjusted=True)
+    assert hit['adjusted_support'] == hit['cached_support'] == 0.05
+    assert hit['frequent_itemsets']['support'].tolist() == [0.5, 0.2, 0.05]
+    # 关闭预检自动调整，或请求其他支持度时不能用提高后的结果代替
+    assert cache.get('fp', 0.001) is None
+    assert cache.get('fp', 0.002, allow_adjusted=True) is None
+
+    cache.put('fp', 0.001, itemsets, 100, {})
+    assert 'adjusted_support' not in cache.get('fp', 0.001, allow_adjusted=True)
+
+
+def test_app_hits_cache_after_guard_raised_support(tmp_path, monkeypatch):
+    pytest.importorskip('PyQt5')
+    monkeypatch.setenv('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    import apriori_app
+    import mining_preflight
+
+    def raising_plan(order_ids, item_codes, min_support, auto_adjust=True):
+        # 模拟内存预算不足：预检把支持度提高到 4 倍
+        plan = mining_preflight.plan_mining(order_ids, item_codes, min_support * 4, auto_adjust=auto_adjust)
+        plan['requested_support'] = min_support
+        return plan
+
+    monkeypatch.setattr(apriori_app, 'plan_mining', raising_plan)
+    orders = tmp_path / 'orders.xlsx'
+    rows = [(f"O{i}", code) for i in range(40) for code in ('A', 'B' if i % 2 else 'C')]
+    pd.DataFrame({'订单编号': [order for order, _ in rows], '店铺': '旗舰店', '客户编号': '1',
+                  '商家编码': [code for _, code in rows], '货品名称': [f"商品{code}" for _, code in rows]}
+                 ).to_excel(orders, index=False)
+
+    app = QApplication.instance() or QApplication([])
+    window = apriori_app.AprioriApp()
+    window.file_paths, window.data_dir = [str(orders)], str(tmp_path / 'Data')
+    window.itemset_cache.cache_dir = str(tmp_path / 'Data' / 'itemset_cache')
+    window.support_input.setText('0.05')
+    mined = []
+    monkeypatch.setattr(window, 'mine_itemsets', lambda *args, **kwargs: mined.append(args) or
+                        apriori_app.AprioriApp.mine_itemsets(window, *args, **kwargs))
+    window.run_analysis()
+    assert len(mined) == 1
+    window.run_analysis()
+    assert len(mined) == 1
+    assert '命中频繁项集缓存' in window.log_text.toPlainText()
+    assert '0.200000' in window.log_text.toPlainText()
+    window.close()
+    app.processEvents()
@@ -0,0 +1,78 @@
+import os
+
+import pandas as pd
+
+from step_checkpoint import (StepCheckpoints, export_excel, intermediate_sheet_names, read_intermediate,
+                             write_intermediate)
+
+
+def touch(path, content='x'):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_fingerprint_tracks_inputs_params_and_upstream(tmp_path):
+    source = touch(tmp_path / 'orders.xlsx')
+    base = StepCheckpoints.fingerprint('step', 'upstream', [source], ['a'])
+    assert base == StepCheckpoints.fingerprint('step', 'upstream', [source], ['a'])
+    assert base != StepCheckpoints.fingerprint('other', 'upstream', [source], ['a'])
+    assert base != StepCheckpoints.fingerprint('step', 'changed', [source], ['a'])
+    assert base != StepCheckpoints.fingerprint('step', 'upstream', [source], ['b'])
+
+    touch(source, 'modified content')
+    assert base != StepCheckpoints.fingerprint('step', 'upstream', [source], ['a'])
+    os.remove(source)
+    assert base != StepCheckpoints.fingerprint('step', 'upstream', [source], ['a'])
+
+
+def test_lookup_after_record_and_reload(tmp_path):
+    output = touch(tmp_path / 'out.pkl')
+    checkpoints = StepCheckpoints(str(tmp_path / '.checkpoints'))
+    assert checkpoints.lookup('step', 'fp') is None
+    checkpoints.record('step', 'fp', output)
+
+    reloaded = StepCheckpoints(str(tmp_path / '.checkpoints'))
+    assert reloaded.lookup('step', 'fp') == output
+    assert reloaded.lookup('step', 'other fingerprint') is None
+    assert reloaded.lookup('other step', 'fp') is None
+
+
+def test_lookup_invalidated_when_output_changes(tmp_path):
+    output = touch(tmp_path / 'out.pkl')
+    checkpoints = StepCheckpoints(str(tmp_path / '.checkpoints'))
+    checkpoints.record('step', 'fp', output)
+    touch(output, 'edited by hand')
+    assert checkpoints.lookup('step', 'fp') is None
+
+    checkpoints.record('step', 'fp', output)
+    os.remove(output)
+    assert checkpoints.lookup('step', 'fp') is None
+
+
+def test_corrupt_or_old_manifest_is_ignored(tmp_path):
+    directory = tmp_path / '.checkpoints'
+    directory.mkdir()
+    touch(directory / 'steps.json', '{not json')
+    assert StepCheckpoints(str(directory)).steps == {}
+    touch(directory / 'steps.json', '{"version": 0, "steps": {"step": {}}}')
+    assert StepCheckpoints(str(directory)).steps == {}
+
+
+def test_intermediate_round_trip_and_excel_export(tmp_path):
+    single = pd.DataFrame({'订单编号': ['A1', 'A2'], '月份': pd.PeriodIndex(['2025-06', '2025-07'], freq='M')})
+    sheets = {'佛山发货数据': single.head(1), '济南发货数据': single.tail(1)}
+    single_path = write_intermediate(single, str(tmp_path / 'single.pkl'))
+    sheets_path = write_intermediate(sheets, str(tmp_path / 'sheets.pkl'))
+
+    pd.testing.assert_frame_equal(read_intermediate(single_path), single)
+    assert intermediate_sheet_names(sheets_path) == ['佛山发货数据', '济南发货数据']
+    pd.testing.assert_frame_equal(read_intermediate(sheets_path, sheet_name='济南发货数据'), sheets['济南发货数据'])
+    pd.testing.assert_frame_equal(read_intermediate(sheets_path, sheet_name=0), sheets['佛山发货数据'])
+
+    excel_path = export_excel(sheets_path)
+    assert excel_path == str(tmp_path / 'sheets.xlsx')
+    assert list(pd.read_excel(excel_path, sheet_name=None)) == ['佛山发货数据', '济南发货数据']
+    mtime = os.path.getmtime(excel_path)
+    assert export_excel(sheets_path) == excel_path
+    assert os.path.getmtime(excel_path) == mtime
@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('PyQt5')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+from order_pipeline import run_job
+from summary_cube import CUBE_FILE, SummaryCube
+from synthetic_data import FOSHAN_SHEET, JINAN_SHEET, generate_dataset
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    return generate_dataset(str(tmp_path_factory.mktemp('data')), 400, seed=5, log=lambda message: None)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    application = QApplication.instance() or QApplication([])
+    for name in ('information', 'warning', 'critical'):
+        monkeypatch.setattr(QMessageBox, name, staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+    return application
+
+
+def run_window(window, output_dir):
+    output_dir.mkdir()
+    window.output_dir = str(output_dir)
+    window.run_processing()
+    window.close()
+    return SummaryCube(os.path.join(str(output_dir), CUBE_FILE))
+
+
+def job_cube(job, dataset, output_dir):
+    inputs = {'orders': dataset['orders'], 'inventory': dataset['inventory'], 'shipping': dataset['shipping']}
+    run_job(job, inputs, str(output_dir), log=lambda message: None)
+    return SummaryCube(os.path.join(str(output_dir), CUBE_FILE))
+
+
+def assert_same_rollup(cube, expected):
+    assert len(cube.batches) == 1
+    for by in ([], ['月份', '仓库'], ['省份', '店铺']):
+        pd.testing.assert_frame_equal(cube.rollup(by), expected.rollup(by))
+
+
+def test_fee_steps_update_cube_like_run_job(app, dataset, tmp_path):
+    import fee
+
+    window = fee.OrderDataProcessor()
+    window.order_files, window.inventory_file = dataset['orders'], dataset['inventory']
+    window.shipping_file, window.foshan_sheet, window.jinan_sheet = dataset['shipping'], FOSHAN_SHEET, JINAN_SHEET
+    window.export_intermediate_checkbox.setChecked(False)
+    cube = run_window(window, tmp_path / 'steps')
+    assert_same_rollup(cube, job_cube('fee', dataset, tmp_path / 'job'))
+
+
+def test_abnormal_steps_update_cube_like_run_job(app, dataset, tmp_path):
+    import abnormal_order_data
+
+    window = abnormal_order_data.OrderDataProcessor()
+    window.order_files, window.inventory_file = dataset['orders'], dataset['inventory']
+    cube = run_window(window, tmp_path / 'steps')
+    assert_same_rollup(cube, job_cube('abnormal', dataset, tmp_path / 'job'))
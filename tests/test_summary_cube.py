@@ -0,0 +1,80 @@
+import os
+
+import pandas as pd
+import pytest
+
+from summary_cube import CUBE_EXPORT_FILE, FEE_COUNT, SummaryCube, batch_key, update_cube
+
+
+def orders(quantities, provinces=('北京', '广东省'), month='2025-06'):
+    n = len(quantities)
+    return pd.DataFrame({
+        '月份': pd.PeriodIndex([month] * n, freq='M'),
+        '仓库': ['佛山-优赛-三水仓'] * n,
+        '省份': [provinces[i % len(provinces)] for i in range(n)],
+        '店铺': ['旗舰店'] * n,
+        '订单编号': [f"O{i // 2}" for i in range(n)],
+        '下单数量': quantities,
+        '佛山仓期初库存': [0] * n, '济南仓期初库存': [5] * n,
+        '佛山仓期末库存': [1] * n, '济南仓期末库存': [-1] * n,
+    })
+
+
+def fees(amounts):
+    df = orders([1] * len(amounts)).drop(columns=['下单数量'])
+    return {'佛山发货数据': df.assign(佛山_运费=amounts, 佛山_快递公司='顺丰')}
+
+
+def totals(cube):
+    return cube.rollup().iloc[0]
+
+
+def test_rerun_of_same_batch_replaces_it(tmp_path):
+    cube = SummaryCube(str(tmp_path / 'cube.pkl'))
+    batch = batch_key([str(tmp_path / 'b.xlsx'), str(tmp_path / 'a.xlsx')])
+    assert batch == batch_key([str(tmp_path / 'a.xlsx'), str(tmp_path / 'b.xlsx')])
+
+    cube.update({'abnormal': orders([1, 2, 3]), 'fee': fees([10.0, 20.0])}, batch)
+    cube.update({'abnormal': orders([5, 5]), 'fee': fees([7.5])}, batch)
+    total = totals(cube)
+    assert total['记录数'] == 2 and total['下单数量'] == 10
+    assert total[FEE_COUNT] == 1 and total['运费'] == 7.5
+
+    cube.update({'abnormal': orders([1])}, 'another batch')
+    total = totals(cube)
+    assert total['记录数'] == 3 and total['下单数量'] == 11
+    assert total['运费'] == 7.5
+
+
+def test_abnormal_only_run_keeps_batch_fees(tmp_path):
+    cube = SummaryCube(str(tmp_path / 'cube.pkl'))
+    cube.update({'abnormal': orders([1]), 'fee': fees([3.0, 4.0])}, 'batch')
+    cube.update({'abnormal': orders([2, 2])}, 'batch')
+    total = totals(cube)
+    assert total['下单数量'] == 4 and total['运费'] == 7.0
+
+
+def test_measures_and_rollup(tmp_path):
+    cube = SummaryCube(str(tmp_path / 'cube.pkl'))
+    cube.update({'abnormal': orders([1, 2, 3, 4])}, 'batch')
+    by_province = cube.rollup(['省份']).set_index('省份')
+    assert by_province.loc['北京', '记录数'] == 2
+    assert by_province.loc['北京', '订单数'] == 2
+    # 北京由济南仓覆盖：期初 5 不缺货、期末 -1 缺货；广东省由佛山仓覆盖：期初 0 缺货、期末 1 不缺货
+    assert by_province.loc['北京', ['应发仓期初缺货记录数', '应发仓期末缺货记录数']].tolist() == [0, 2]
+    assert by_province.loc['广东省', ['应发仓期初缺货记录数', '应发仓期末缺货记录数']].tolist() == [2, 0]
+    assert cube.rollup(['月份'], where={'省份': '北京'})['下单数量'].tolist() == [4]
+    with pytest.raises(ValueError):
+        cube.rollup(['城市'])
+
+
+def test_update_cube_persists_and_exports(tmp_path):
+    output_dir = str(tmp_path)
+    order_files = [str(tmp_path / 'orders.xlsx')]
+    path = update_cube({'abnormal': orders([1, 2])}, order_files, output_dir, log=lambda message: None)
+    update_cube({'abnormal': orders([1, 2])}, order_files, output_dir, log=lambda message: None)
+    reloaded = SummaryCube(path)
+    assert list(reloaded.batches) == [batch_key(order_files)]
+    assert totals(reloaded)['记录数'] == 2
+    exported = pd.read_excel(os.path.join(output_dir, CUBE_EXPORT_FILE))
+    assert exported['记录数'].sum() == 2
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mlxtend.frequent_patterns import apriori, association_rules
+
+from apriori_core import one_hot_encode
+from topk_rules import mine_top_k_rules
+
+
+def random_orders(seed, n_orders=300, n_items=12):
+    """订单内商品按频次偏斜抽取，并带几组经常一起购买的商品"""
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_items + 1)
+    rows = []
+    for order in range(n_orders):
+        items = set(rng.choice(n_items, size=rng.integers(1, 5), p=weights / weights.sum()))
+        if rng.random() < 0.2:
+            items |= {9, 10, 11}
+        rows += [(f"O{order}", f"SKU{item:02d}") for item in items]
+    return pd.DataFrame(rows, columns=['订单编号', '商家编码'])
+
+
+def brute_force_rules(df, min_count, max_len):
+    """mlxtend 挖出全部频繁项集和规则，只保留后件为单个商品的规则"""
+    n = df['订单编号'].nunique()
+    itemsets = apriori(one_hot_encode(df), min_support=min_count / n, use_colnames=True, max_len=max_len)
+    rules = association_rules(itemsets, metric='confidence', min_threshold=0)
+    rules = rules[rules['consequents'].map(len) == 1].copy()
+    rules['单量'] = (rules['support'] * n).round().astype(int)
+    return rules
+
+
+@pytest.mark.parametrize('metric', ['confidence', 'lift'])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_brute_force(metric, seed):
+    df = random_orders(seed)
+    k, min_count, max_len = 25, 3, 3
+    rules, stats = mine_top_k_rules(df['订单编号'], df['商家编码'], k=k, metric=metric,
+                                    min_count=min_count, max_len=max_len)
+    expected = brute_force_rules(df, min_count, max_len)
+    expected = expected.sort_values([metric, '单量'], ascending=False).head(k)
+
+    assert len(rules) == k
+    assert stats['n_transactions'] == df['订单编号'].nunique()
+    # 第 K 名可能并列，比较排名键（指标, 单量）而不是具体规则
+    np.testing.assert_allclose(rules[metric].to_numpy(), expected[metric].to_numpy())
+    assert rules['单量'].tolist() == expected['单量'].tolist()
+
+    # 每条返回的规则及其指标都与穷举结果一致
+    all_rules = brute_force_rules(df, min_count, max_len)
+    by_rule = {(row['antecedents'], row['consequents']): row for _, row in all_rules.iterrows()}
+    assert len(by_rule) > k
+    for rule in rules.itertuples(index=False):
+        row = by_rule[(rule.antecedents, rule.consequents)]
+        assert rule.单量 == row['单量']
+        assert rule.confidence == pytest.approx(row['confidence'])
+        assert rule.lift == pytest.approx(row['lift'])
+        assert rule.support == pytest.approx(row['support'])
+
+
+def test_invalid_arguments():
+    df = random_orders(0, n_orders=10)
+    with pytest.raises(ValueError):
+        mine_top_k_rules(df['订单编号'], df['商家编码'], metric='support')
+    with pytest.raises(ValueError):
+        mine_top_k_rules(df['订单编号'], df['商家编码'], k=0)
+    with pytest.raises(ValueError):
+        mine_top_k_rules(df['订单编号'], df['商家编码'], max_len=1)
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from workbook_probe import describe_sheet, probe_workbook, sheet_names
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / '发货数据.xlsx'
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pd.DataFrame({'原始单号': ['A1', 'A2', 'A3'], '快递公司': ['顺丰', '中通', '顺丰'], '运费': [12.5, 8, 9]}) \
+            .to_excel(writer, sheet_name='佛山发货数据', index=False)
+        pd.DataFrame({'原始单号': ['B1'], '重量': [1.2]}).to_excel(writer, sheet_name='济南发货数据', index=False)
+        pd.DataFrame().to_excel(writer, sheet_name='空白', index=False)
+    return str(path)
+
+
+def test_sheet_names_match_excel_file(workbook):
+    assert sheet_names(workbook) == pd.ExcelFile(workbook).sheet_names
+
+
+def test_header_matches_read_excel(workbook):
+    infos = probe_workbook(workbook, header_rows=2)
+    for info in infos:
+        df = pd.read_excel(workbook, sheet_name=info['name'])
+        if df.empty and not len(df.columns):
+            assert info['header'] == []
+            continue
+        assert info['header'][0] == list(df.columns)
+        assert info['header'][1] == df.iloc[0].tolist()
+
+
+def test_dimension_from_sheet_xml(tmp_path):
+    path = tmp_path / 'dimension.xlsx'
+    book = Workbook()
+    sheet = book.active
+    sheet.title = '数据'
+    for row in range(1, 6):
+        sheet.append([f"r{row}c{col}" for col in range(1, 4)])
+    book.save(path)
+    info = probe_workbook(str(path))[0]
+    assert (info['dimension'], info['rows'], info['columns']) == ('A1:C5', 5, 3)
+    assert info['header'] == [['r1c1', 'r1c2', 'r1c3']]
+    assert describe_sheet(info) == '数据（5 行 × 3 列）：r1c1、r1c2、r1c3'
+
+
+def test_describe_sheet_without_size():
+    info = {'name': '佛山发货数据', 'rows': None, 'header': [[f"列{i}" for i in range(8)]]}
+    assert describe_sheet(info) == '佛山发货数据（行数未知）：列0、列1、列2、列3、列4、列5、…'
+
+
+def test_invalid_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        probe_workbook(str(tmp_path / 'missing.xlsx'))
+    broken = tmp_path / 'broken.xlsx'
+    broken.write_bytes(b'not a workbook')
+    with pytest.raises(ValueError):
+        probe_workbook(str(broken))
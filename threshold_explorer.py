@@ -0,0 +1,147 @@
+# threshold_explorer.py
+import numpy as np
+from mlxtend.frequent_patterns import association_rules
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QSlider,
+                             QTableWidget, QTableWidgetItem, QPushButton, QComboBox, QHeaderView)
+from PyQt5.QtCore import Qt
+
+# 探索模式下预先生成规则时使用的最低置信度，滑块只能在此之上调节
+EXPLORER_MIN_CONFIDENCE = 0.1
+
+
+class ThresholdExplorer(QDialog):
+    """阈值探索：基于一次挖掘得到的频繁项集，拖动滑块实时查看不同支持度、置信度、提升度下的结果"""
+
+    SUPPORT_STEPS = 1000
+    TOP_N = 20
+
+    def __init__(self, frequent_itemsets, item_name_mapping, n_transactions, floor_support,
+                 parent=None, min_confidence=EXPLORER_MIN_CONFIDENCE):
+        super().__init__(parent)
+        self.item_name_mapping = item_name_mapping
+        self.n_transactions = n_transactions
+        self.floor_support = floor_support
+        self.min_confidence = min_confidence
+
+        # 项集支持度升序排列，按阈值计数只需二分查找
+        self.itemset_supports = np.sort(frequent_itemsets['support'].to_numpy())
+        self.max_support = float(self.itemset_supports[-1]) if len(self.itemset_supports) else floor_support
+
+        # 在最低置信度下一次性生成全部规则，滑块移动时只做向量化过滤
+        has_pairs = not frequent_itemsets.empty and (frequent_itemsets['itemsets'].map(len) >= 2).any()
+        if has_pairs:
+            rules = association_rules(frequent_itemsets[['support', 'itemsets']],
+                                      metric="confidence", min_threshold=min_confidence)
+            self.rules = rules[['antecedents', 'consequents', 'support', 'confidence', 'lift']].reset_index(drop=True)
+        else:
+            self.rules = None
+        if self.rules is not None and not self.rules.empty:
+            self.rule_support = self.rules['support'].to_numpy()
+            self.rule_confidence = self.rules['confidence'].to_numpy()
+            self.rule_lift = self.rules['lift'].to_numpy()
+        else:
+            self.rule_support = self.rule_confidence = self.rule_lift = np.empty(0)
+        self.max_lift = float(self.rule_lift.max()) if len(self.rule_lift) else 1.0
+
+        self.initUI()
+        self.update_view()
+
+    def initUI(self):
+        self.setWindowTitle('阈值探索')
+        self.resize(900, 600)
+        layout = QVBoxLayout(self)
+
+        layout.addWidget(QLabel(
+            f'已在最小支持度 {self.floor_support:.4f}、最小置信度 {self.min_confidence:.2f} 下完成一次挖掘，'
+            f'共 {self.n_transactions} 个事务。拖动滑块实时查看结果。', self))
+
+        form_layout = QFormLayout()
+        self.support_slider = QSlider(Qt.Horizontal, self)
+        self.support_slider.setRange(0, self.SUPPORT_STEPS)
+        self.confidence_slider = QSlider(Qt.Horizontal, self)
+        self.confidence_slider.setRange(int(round(self.min_confidence * 100)), 100)
+        self.lift_slider = QSlider(Qt.Horizontal, self)
+        self.lift_slider.setRange(0, int(np.ceil(self.max_lift * 100)))
+        self.support_label = QLabel(self)
+        self.confidence_label = QLabel(self)
+        self.lift_label = QLabel(self)
+        for label, slider, value_label in (('最小支持度：', self.support_slider, self.support_label),
+                                           ('最小置信度：', self.confidence_slider, self.confidence_label),
+                                           ('最小提升度：', self.lift_slider, self.lift_label)):
+            row = QHBoxLayout()
+            row.addWidget(slider)
+            value_label.setMinimumWidth(80)
+            row.addWidget(value_label)
+            form_layout.addRow(label, row)
+            slider.valueChanged.connect(self.update_view)
+
+        self.sort_combo = QComboBox(self)
+        self.sort_combo.addItems(['按置信度排序', '按提升度排序'])
+        self.sort_combo.currentIndexChanged.connect(self.update_view)
+        form_layout.addRow('规则排序：', self.sort_combo)
+        layout.addLayout(form_layout)
+
+        self.summary_label = QLabel(self)
+        layout.addWidget(self.summary_label)
+
+        self.rules_table = QTableWidget(0, 6, self)
+        self.rules_table.setHorizontalHeaderLabels(['前件商品名称', '后件商品名称', '支持度', '置信度', '提升度', '单量'])
+        self.rules_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.rules_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.rules_table)
+
+        button_layout = QHBoxLayout()
+        self.apply_button = QPushButton('应用当前阈值', self)
+        self.apply_button.clicked.connect(self.accept)
+        self.close_button = QPushButton('关闭', self)
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(self.apply_button)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+    def current_thresholds(self):
+        """返回滑块对应的（支持度，置信度，提升度）；支持度使用对数刻度，便于在长尾分布中调节"""
+        ratio = self.support_slider.value() / self.SUPPORT_STEPS
+        if self.max_support > self.floor_support:
+            support = self.floor_support * (self.max_support / self.floor_support) ** ratio
+        else:
+            support = self.floor_support
+        confidence = self.confidence_slider.value() / 100
+        lift = self.lift_slider.value() / 100
+        return support, confidence, lift
+
+    def item_names(self, items):
+        return '、'.join(self.item_name_mapping.get(item, f"未知商品({item})") for item in items)
+
+    def update_view(self):
+        support, confidence, lift = self.current_thresholds()
+        self.support_label.setText(f'{support:.4f}')
+        self.confidence_label.setText(f'{confidence:.2f}')
+        self.lift_label.setText(f'{lift:.2f}')
+
+        n_itemsets = len(self.itemset_supports) - np.searchsorted(self.itemset_supports, support, side='left')
+        mask = (self.rule_support >= support) & (self.rule_confidence >= confidence) & (self.rule_lift >= lift)
+        selected = np.flatnonzero(mask)
+        self.summary_label.setText(f'频繁项集数：{n_itemsets}    关联规则数：{len(selected)}    '
+                                   f'（显示前 {min(self.TOP_N, len(selected))} 条）')
+
+        # 只对前 TOP_N 条规则排序和渲染
+        primary, secondary = ((self.rule_confidence, self.rule_lift) if self.sort_combo.currentIndex() == 0
+                              else (self.rule_lift, self.rule_confidence))
+        if len(selected) > self.TOP_N:
+            selected = selected[np.argpartition(-primary[selected], self.TOP_N - 1)[:self.TOP_N]]
+        selected = selected[np.lexsort((-secondary[selected], -primary[selected]))]
+
+        self.rules_table.setRowCount(len(selected))
+        for row, idx in enumerate(selected):
+            values = [
+                self.item_names(self.rules.at[idx, 'antecedents']),
+                self.item_names(self.rules.at[idx, 'consequents']),
+                f'{self.rule_support[idx]:.4f}',
+                f'{self.rule_confidence[idx]:.2f}',
+                f'{self.rule_lift[idx]:.2f}',
+                str(int(round(self.rule_support[idx] * self.n_transactions))),
+            ]
+            for col, value in enumerate(values):
+                self.rules_table.setItem(row, col, QTableWidgetItem(value))
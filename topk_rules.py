@@ -0,0 +1,166 @@
+# topk_rules.py
+"""Top-K 关联规则挖掘：不需要固定最小支持度，返回置信度或提升度最高的 K 条规则。
+
+规则形式为 X → y（后件为单个商品），按 (指标, 单量) 排序。搜索按商品频次从高到低做深度优先扩展前件，
+堆中第 K 条规则即为动态抬升的内部阈值：扩展前件后规则单量只会减少，置信度上界为 1，
+提升度上界为 总订单数/后件单量，上界达不到阈值的分支直接剪掉。内存只与 K 和最大项集长度有关。
+"""
+import heapq
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+TOP_K_METRICS = ('confidence', 'lift')
+
+
+def build_transaction_matrix(order_ids, item_codes):
+    """由订单编号和商家编码两列构造稀疏事务矩阵，列按商品频次降序排列。
+
+    返回 (csr 矩阵, 商家编码数组, 每个商品的订单数)。
+    """
+    order_idx, _ = pd.factorize(pd.Series(order_ids), sort=False)
+    item_idx, items = pd.factorize(pd.Series(item_codes), sort=False)
+    pairs = np.unique(np.stack([order_idx, item_idx], axis=1), axis=0)
+    n_orders, n_items = len(np.unique(order_idx)), len(items)
+    matrix = csr_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+                        shape=(n_orders, n_items))
+    item_counts = np.bincount(pairs[:, 1], minlength=n_items)
+    order = np.argsort(-item_counts, kind='stable')
+    return matrix[:, order].tocsr(), np.asarray(items)[order], item_counts[order]
+
+
+class _TopKMiner:
+    def __init__(self, matrix, item_counts, k, metric, min_count, max_len):
+        self.csr = matrix
+        self.csc = matrix.tocsc()
+        self.item_counts = item_counts
+        self.n_transactions = matrix.shape[0]
+        self.k = k
+        self.metric = metric
+        self.min_count = max(int(min_count), 1)
+        self.max_len = max_len
+        self.heap = []  # (指标, 单量, 序号, 前件, 后件, 前件单量)
+        self.seq = 0
+        self.nodes_visited = 0
+        # 单条规则的指标上界（与前件无关）
+        if metric == 'confidence':
+            self.metric_bound = np.ones(len(item_counts))
+        else:
+            self.metric_bound = self.n_transactions / np.maximum(item_counts, 1)
+
+    def threshold(self):
+        """当前内部阈值：堆满后为第 K 条规则的 (指标, 单量)"""
+        if len(self.heap) < self.k:
+            return None
+        return self.heap[0][0], self.heap[0][1]
+
+    def push(self, metric, count, antecedent, consequent, antecedent_count):
+        key = (metric, count)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (metric, count, -self.seq, antecedent, consequent, antecedent_count))
+        elif key > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, (metric, count, -self.seq, antecedent, consequent, antecedent_count))
+        self.seq += 1
+
+    def visit(self, antecedent, rows):
+        self.nodes_visited += 1
+        antecedent_count = len(rows)
+        co_counts = np.bincount(self.csr[rows].indices, minlength=len(self.item_counts))
+        co_counts[list(antecedent)] = 0
+        candidates = np.flatnonzero(co_counts >= self.min_count)
+        if len(candidates) == 0:
+            return
+
+        # 评估 X → y
+        counts = co_counts[candidates]
+        confidence = counts / antecedent_count
+        values = confidence if self.metric == 'confidence' else confidence * self.n_transactions / self.item_counts[candidates]
+        threshold = self.threshold()
+        if threshold is not None:
+            passing = (values > threshold[0]) | ((values == threshold[0]) & (counts > threshold[1]))
+        else:
+            passing = np.ones(len(candidates), dtype=bool)
+        for pos in np.flatnonzero(passing):
+            self.push(float(values[pos]), int(counts[pos]), antecedent, int(candidates[pos]), antecedent_count)
+
+        if len(antecedent) + 1 >= self.max_len:
+            return
+        # 扩展前件 X ∪ {j}（j 排在 X 之后，避免重复枚举）；规则 X∪{j} → y 的单量不超过 min(c(Xj), c(Xy))
+        extensions = candidates[candidates > antecedent[-1]]
+        for j in extensions:
+            threshold = self.threshold()
+            if threshold is not None:
+                bound = self.metric_bound[candidates]
+                bound_counts = np.minimum(co_counts[candidates], co_counts[j])
+                beats = (bound > threshold[0]) | ((bound == threshold[0]) & (bound_counts > threshold[1]))
+                beats &= candidates != j
+                if not beats.any():
+                    continue
+            col = self.csc.indices[self.csc.indptr[j]:self.csc.indptr[j + 1]]
+            child_rows = np.intersect1d(rows, col, assume_unique=True)
+            if len(child_rows) >= self.min_count:
+                self.visit(antecedent + (int(j),), child_rows)
+
+    def run(self):
+        for item in range(len(self.item_counts)):
+            if self.item_counts[item] < self.min_count:
+                break  # 商品按频次降序排列，后面的都不满足最小单量
+            threshold = self.threshold()
+            if threshold is not None:
+                # 以该商品为首的前件，规则单量不超过该商品的订单数
+                bound = self.metric_bound
+                if not ((bound > threshold[0]) | ((bound == threshold[0]) & (self.item_counts[item] > threshold[1]))).any():
+                    continue
+            rows = self.csc.indices[self.csc.indptr[item]:self.csc.indptr[item + 1]]
+            self.visit((item,), np.sort(rows))
+
+
+def mine_top_k_rules(order_ids, item_codes, k=100, metric='confidence', min_count=2, max_len=3):
+    """挖掘 Top-K 关联规则。
+
+    :param order_ids: 每行的订单编号
+    :param item_codes: 每行的商家编码
+    :param k: 返回的规则数量
+    :param metric: 排序指标，'confidence' 或 'lift'
+    :param min_count: 规则的最小单量（同时包含前件和后件的订单数）
+    :param max_len: 规则包含的最大商品数（前件 + 后件）
+    :return: (规则 DataFrame, 统计信息 dict)
+    """
+    if metric not in TOP_K_METRICS:
+        raise ValueError(f"不支持的排序指标: {metric}，可选 {', '.join(TOP_K_METRICS)}")
+    if k < 1:
+        raise ValueError("规则数量 K 必须大于 0")
+    if max_len < 2:
+        raise ValueError("最大项集长度必须至少为 2")
+
+    matrix, items, item_counts = build_transaction_matrix(order_ids, item_codes)
+    miner = _TopKMiner(matrix, item_counts, k, metric, min_count, max_len)
+    miner.run()
+
+    n = miner.n_transactions
+    ranked = sorted(miner.heap, key=lambda r: (r[0], r[1], r[2]), reverse=True)
+    records = []
+    for value, count, _, antecedent, consequent, antecedent_count in ranked:
+        confidence = count / antecedent_count
+        records.append({
+            'antecedents': frozenset(items[list(antecedent)]),
+            'consequents': frozenset([items[consequent]]),
+            'antecedent support': antecedent_count / n,
+            'consequent support': item_counts[consequent] / n,
+            'support': count / n,
+            'confidence': confidence,
+            'lift': confidence * n / item_counts[consequent],
+            '单量': count,
+        })
+    columns = ['antecedents', 'consequents', 'antecedent support', 'consequent support',
+               'support', 'confidence', 'lift', '单量']
+    rules = pd.DataFrame(records, columns=columns)
+    threshold = miner.threshold()
+    stats = {
+        'n_transactions': n,
+        'n_items': len(items),
+        'nodes_visited': miner.nodes_visited,
+        'final_threshold': threshold[0] if threshold else None,
+        'final_threshold_count': threshold[1] if threshold else None,
+    }
+    return rules, stats
@@ -0,0 +1,194 @@
+# workbook_probe.py
+"""不加载整个工作簿，快速读取 Excel 文件的 sheet 名称、数据范围和表头。
+
+pd.ExcelFile 会用 openpyxl 打开整个工作簿，发货数据这样的大文件需要几秒钟，而选择 sheet 时只需要名称。
+- xlsx：直接读取压缩包中的 xl/workbook.xml（sheet 名称）；数据范围和表头只读取各 sheet XML 开头的
+  <dimension> 和前几行（流式解析，读到即停止），表头中的共享字符串只解析到用到的编号为止；
+- xls：用 xlrd 的按需加载模式，打开时只读取工作簿开头的记录（sheet 名称），数据范围和表头才加载对应的 sheet。
+
+部分程序（例如 openpyxl、pandas）写出的 xlsx 没有 <dimension>，此时行数和列数为 None。
+"""
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from posixpath import join as zip_join, normpath as zip_normpath
+
+
+def _local(tag):
+    """去掉命名空间（严格模式的 xlsx 使用另一个命名空间）"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _column_index(ref):
+    """单元格引用（A1、AB12）的列号，从 0 开始"""
+    index = 0
+    for char in re.match(r'[A-Z]+', ref).group():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index - 1
+
+
+def _dimension_size(ref):
+    """数据范围（A1:G3001）的 (行数, 列数)，只有一个单元格时为 A1"""
+    match = re.fullmatch(r'\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?', ref or '')
+    if not match:
+        return None, None
+    first_col, first_row, last_col, last_row = match.groups()
+    last_col, last_row = last_col or first_col, last_row or first_row
+    return int(last_row) - int(first_row) + 1, _column_index(last_col) - _column_index(first_col) + 1
+
+
+def _is_xlsx(path):
+    return zipfile.is_zipfile(path)
+
+
+def _xlsx_sheets(archive):
+    """[(sheet 名称, 压缩包中的 XML 路径)]，按工作簿中的顺序"""
+    rels = {}
+    if 'xl/_rels/workbook.xml.rels' in archive.namelist():
+        for rel in ET.fromstring(archive.read('xl/_rels/workbook.xml.rels')):
+            target = rel.get('Target', '')
+            rels[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else zip_normpath(zip_join('xl', target))
+    sheets = []
+    for element in ET.fromstring(archive.read('xl/workbook.xml')).iter():
+        if _local(element.tag) == 'sheet':
+            rel_id = next((value for key, value in element.attrib.items() if _local(key) == 'id'), None)
+            sheets.append((element.get('name'), rels.get(rel_id)))
+    return sheets
+
+
+def _shared_strings(archive, indexes):
+    """只解析到用到的最大编号为止，返回 {编号: 文本}"""
+    if not indexes or 'xl/sharedStrings.xml' not in archive.namelist():
+        return {}
+    needed, last = set(indexes), max(indexes)
+    strings, position = {}, 0
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, element in ET.iterparse(f):
+            if _local(element.tag) != 'si':
+                continue
+            if position in needed:
+                strings[position] = _string_item_text(element)
+            element.clear()
+            if position >= last:
+                break
+            position += 1
+    return strings
+
+
+def _string_item_text(si):
+    """<si> 的文本：纯文本为 <t>，富文本由多个 <r><t> 组成；<rPh> 是注音，不计入"""
+    parts = []
+    for child in si:
+        tag = _local(child.tag)
+        if tag == 't':
+            parts.append(child.text or '')
+        elif tag == 'r':
+            parts.extend(t.text or '' for t in child if _local(t.tag) == 't')
+    return ''.join(parts)
+
+
+def _cell_value(cell):
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        return next((_string_item_text(child) for child in cell if _local(child.tag) == 'is'), None)
+    value = next((child.text for child in cell if _local(child.tag) == 'v'), None)
+    if value is None:
+        return None
+    if kind == 's':
+        return ('shared', int(value))
+    if kind == 'b':
+        return value == '1'
+    if kind == 'n':
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def _xlsx_sheet_head(archive, member, header_rows):
+    """读取 sheet XML 开头的 <dimension> 和前 header_rows 行，读到即停止"""
+    dimension, rows = None, []
+    with archive.open(member) as f:
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            tag = _local(element.tag)
+            if event == 'start':
+                if tag == 'dimension':
+                    dimension = element.get('ref')
+                continue
+            if tag == 'row':
+                values = {}
+                for position, cell in enumerate(c for c in element if _local(c.tag) == 'c'):
+                    ref = cell.get('r')
+                    values[_column_index(ref) if ref else position] = _cell_value(cell)
+                rows.append([values.get(i) for i in range(max(values) + 1)] if values else [])
+                element.clear()
+                if len(rows) >= header_rows:
+                    break
+            elif tag == 'sheetData':
+                break
+    return dimension, rows
+
+
+def _probe_xlsx(path, header_rows):
+    with zipfile.ZipFile(path) as archive:
+        sheets = _xlsx_sheets(archive)
+        if header_rows is None:
+            return [{'name': name} for name, _ in sheets]
+        infos, shared = [], set()
+        for name, member in sheets:
+            dimension, rows = _xlsx_sheet_head(archive, member, header_rows) if member in archive.namelist() else (None, [])
+            shared.update(value[1] for row in rows for value in row if isinstance(value, tuple))
+            n_rows, n_columns = _dimension_size(dimension)
+            infos.append({'name': name, 'dimension': dimension, 'rows': n_rows, 'columns': n_columns, 'header': rows})
+        strings = _shared_strings(archive, shared)
+        for info in infos:
+            info['header'] = [[strings.get(value[1]) if isinstance(value, tuple) else value for value in row]
+                              for row in info['header']]
+    return infos
+
+
+def _probe_xls(path, header_rows):
+    import xlrd  # pandas 读取 xls 同样需要 xlrd
+    try:
+        book = xlrd.open_workbook(path, on_demand=True)
+    except xlrd.XLRDError as e:
+        raise ValueError(f"{os.path.basename(path)} 不是有效的 Excel 文件: {e}")
+    try:
+        if header_rows is None:
+            return [{'name': name} for name in book.sheet_names()]
+        infos = []
+        for index, name in enumerate(book.sheet_names()):
+            sheet = book.sheet_by_index(index)
+            infos.append({'name': name, 'dimension': None, 'rows': sheet.nrows, 'columns': sheet.ncols,
+                          'header': [sheet.row_values(i) for i in range(min(header_rows, sheet.nrows))]})
+            book.unload_sheet(index)
+        return infos
+    finally:
+        book.release_resources()
+
+
+def probe_workbook(path, header_rows=1):
+    """返回各 sheet 的 {'name', 'dimension', 'rows', 'columns', 'header'}，header 为前 header_rows 行的值；
+    header_rows 为 None 时只返回 {'name'}"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"文件 {os.path.basename(path)} 不存在")
+    try:
+        if _is_xlsx(path):
+            return _probe_xlsx(path, header_rows)
+        return _probe_xls(path, header_rows)
+    except (KeyError, ET.ParseError, zipfile.BadZipFile) as e:
+        raise ValueError(f"{os.path.basename(path)} 不是有效的 Excel 文件: {e}")
+
+
+def sheet_names(path):
+    """只读取 sheet 名称"""
+    return [info['name'] for info in probe_workbook(path, header_rows=None)]
+
+
+def describe_sheet(info):
+    """sheet 的简要说明，例如：佛山发货数据（3000 行 × 7 列）：原始单号、快递公司、…"""
+    size = f"{info['rows']} 行 × {info['columns']} 列" if info.get('rows') is not None else '行数未知'
+    header = [str(value) for value in (info['header'][0] if info.get('header') else []) if value not in (None, '')]
+    if len(header) > 6:
+        header = header[:6] + ['…']
+    return f"{info['name']}（{size}）" + (f"：{'、'.join(header)}" if header else '')